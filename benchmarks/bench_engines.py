@@ -0,0 +1,39 @@
+"""
+Compare the throughput of the parser engines on a synthetic Squid access log.
+
+Usage: python benchmarks/bench_engines.py [--lines N] [--repeat R]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from analyzer.parsing import CSVParser, FastSquidParser
+from synthetic_log import write_synthetic_log
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--lines', type=int, default=1_000_000)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args()
+
+    parsers = {
+        'pandas': CSVParser(timestamp_unit='s', separator=r'\s+', on_bad_lines='warn'),
+        'fast': FastSquidParser(timestamp_unit='s', on_bad_lines='warn'),
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'access.log')
+        write_synthetic_log(path, args.lines)
+        for engine, parser in parsers.items():
+            best = float('inf')
+            for _ in range(args.repeat):
+                with open(path, encoding='utf-8') as file:
+                    start = time.perf_counter()
+                    parser.parse_files_to_dataframe([file])
+                    best = min(best, time.perf_counter() - start)
+            print(f'{engine:>8}: {args.lines / best:12,.0f} lines/sec ({best:.2f}s)')
+
+
+if __name__ == '__main__':
+    main()
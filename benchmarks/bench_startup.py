@@ -0,0 +1,57 @@
+"""
+Measure the wall time of whole command line runs, including the start of the interpreter and all imports: --help and
+small synthetic Squid access logs with every statistics engine, compared to an interpreter that does nothing.
+
+Usage: python benchmarks/bench_startup.py [--lines N [N ...]] [--repeat R]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+from synthetic_log import write_synthetic_log
+
+STATISTICS_OPTIONS = ['--mfip', '--lfip', '--eps', '--bytes', '--distinct-ips', '--no-cache']
+
+
+def best_time(args: List[str], repeat: int) -> float:
+    """
+    Returns the shortest wall time in seconds of repeat runs of the command line with args.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'from analyzer import main; main()', *args], check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--lines', type=int, nargs='+', default=[100, 10_000, 100_000])
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    best = float('inf')
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], check=True)
+        best = min(best, time.perf_counter() - start)
+    print(f'{"interpreter":>24}: {best:.3f}s')
+    print(f'{"--help":>24}: {best_time(["--help"], args.repeat):.3f}s')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for line_count in args.lines:
+            path = os.path.join(tmp_dir, f'access-{line_count}.log')
+            write_synthetic_log(path, line_count)
+            size = os.path.getsize(path) / (1024 * 1024)
+            for engine in ['auto', 'pandas', 'python']:
+                seconds = best_time([path, *STATISTICS_OPTIONS, '--statistics-engine', engine], args.repeat)
+                print(f'{f"{line_count:,} lines, {engine}":>24}: {seconds:.3f}s ({size:.1f} MiB)')
+
+
+if __name__ == '__main__':
+    main()
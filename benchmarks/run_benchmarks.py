@@ -0,0 +1,224 @@
+"""
+Measure throughput and peak memory of every pipeline stage on a synthetic Squid access log: reading the raw columns,
+cleaning them, each statistic and writing the result. Results can be stored as JSON and compared against a baseline
+of an earlier run. Stages that got slower than the baseline by more than the threshold are flagged as regressions.
+
+Usage: python benchmarks/run_benchmarks.py [--lines N] [--ips N] [--malformed-ratio R] [--time-span SECONDS]
+                                           [--seed S] [--engine ENGINE] [--repeat R] [--output FILE]
+                                           [--baseline FILE] [--threshold T] [--min-difference SECONDS]
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from analyzer.defaults import ENGINES
+from analyzer.output import JSONWriter
+from analyzer.parsing import COLUMNS, BaseParser, CSVParser, FastSquidParser
+from analyzer.statistics import LogStatistics
+from synthetic_log import write_synthetic_log
+
+STATISTICS: Dict[str, Callable[[LogStatistics], object]] = {
+    'mfip': LogStatistics.most_frequent_ip,
+    'lfip': LogStatistics.least_frequent_ip,
+    'eps': LogStatistics.events_per_second,
+    'bytes': LogStatistics.total_amount_of_bytes_exchanged,
+    'distinct_ips': LogStatistics.distinct_ip_count,
+    'eps_series': lambda log_statistics: log_statistics.eps_series('1min'),
+}
+RSS_SAMPLE_INTERVAL = 0.005
+
+
+class PeakMemorySampler:
+    """
+    Samples the resident set size of the process in a background thread to find the peak of a single stage. Falls
+    back to the peak of the whole process where /proc is not available.
+    """
+
+    def __init__(self):
+        self.peak_rss = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def __enter__(self) -> 'PeakMemorySampler':
+        self.peak_rss = self._current_rss()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak_rss = max(self.peak_rss, self._current_rss())
+
+    def _sample(self) -> None:
+        while not self._stop.wait(RSS_SAMPLE_INTERVAL):
+            self.peak_rss = max(self.peak_rss, self._current_rss())
+
+    @staticmethod
+    def _current_rss() -> int:
+        try:
+            with open('/proc/self/statm') as statm:
+                return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except OSError:
+            # ru_maxrss is in KiB on Linux and in bytes on macOS
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+
+def measure(stage: Callable[[], object], repeat: int, line_count: int, byte_count: Optional[int]) -> Dict:
+    """
+    Run a stage repeat times and return the best wall time, the resulting throughput and the peak RSS.
+    """
+    seconds = float('inf')
+    peak_rss = 0
+    for _ in range(repeat):
+        with PeakMemorySampler() as sampler:
+            start = time.perf_counter()
+            stage()
+            seconds = min(seconds, time.perf_counter() - start)
+        peak_rss = max(peak_rss, sampler.peak_rss)
+    result = {
+        'seconds': seconds,
+        'lines_per_second': line_count / seconds,
+        'peak_rss_mib': peak_rss / (1024 * 1024),
+    }
+    if byte_count is not None:
+        result['megabytes_per_second'] = byte_count / seconds / (1024 * 1024)
+    return result
+
+
+def create_parser(engine: str) -> BaseParser:
+    if engine == 'fast':
+        return FastSquidParser(timestamp_unit='s', on_bad_lines='skip', columns=COLUMNS)
+    return CSVParser(timestamp_unit='s', separator=r'\s+', on_bad_lines='skip', columns=COLUMNS)
+
+
+def run_benchmarks(path: str, line_count: int, engine: str, repeat: int) -> Dict[str, Dict]:
+    """
+    Returns the measurements of every stage on the log file at path.
+    """
+    parser = create_parser(engine)
+    byte_count = os.path.getsize(path)
+
+    def read() -> List[pd.DataFrame]:
+        with open(path, encoding='utf-8') as file:
+            return list(parser._read_columns(file, chunk_size=None))
+
+    def clean() -> pd.DataFrame:
+        # Cleaning changes its input, so every repetition cleans fresh copies.
+        return parser._concat([parser._clean_dataframe(dataframe.copy()) for dataframe in raw_dataframes])
+
+    results = {'read': measure(read, repeat, line_count, byte_count)}
+    raw_dataframes = read()
+    results['clean'] = measure(clean, repeat, line_count, byte_count)
+    log_statistics = LogStatistics(clean())
+    statistic_results = {}
+    for statistic, compute in STATISTICS.items():
+        def compute_statistic() -> None:
+            # Start every repetition without shared intermediate results
+            log_statistics._aggregates.clear()
+            log_statistics._ip_counts = None
+            statistic_results[statistic] = compute(log_statistics)
+
+        results[statistic] = measure(compute_statistic, repeat, len(log_statistics.log_dataframe), None)
+
+    def write() -> None:
+        output = io.StringIO()
+        output.name = 'benchmark'
+        JSONWriter(output=output, results=statistic_results).write()
+
+    results['write'] = measure(write, repeat, line_count, None)
+    return results
+
+
+def find_regressions(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float,
+                     min_difference: float) -> List[str]:
+    """
+    Returns a message for every stage that took more than (1 + threshold) times its time in the baseline and at least
+    min_difference seconds longer. The absolute difference keeps timer noise of very fast stages from being flagged.
+    """
+    regressions = []
+    for stage, result in results.items():
+        if stage not in baseline:
+            continue
+        ratio = result['seconds'] / baseline[stage]['seconds']
+        if ratio > 1 + threshold and result['seconds'] - baseline[stage]['seconds'] >= min_difference:
+            regressions.append(f'{stage}: {result["seconds"]:.3f}s vs. {baseline[stage]["seconds"]:.3f}s '
+                               f'in baseline ({ratio - 1:+.0%})')
+    return regressions
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description='Benchmark the pipeline stages on a synthetic Squid access log')
+    arg_parser.add_argument('--lines', type=int, default=1_000_000, help='Number of lines, default: %(default)s')
+    arg_parser.add_argument('--ips', type=int, default=10_000, help='Number of distinct IPs, default: %(default)s')
+    arg_parser.add_argument('--malformed-ratio', type=float, default=0.01,
+                            help='Fraction of malformed lines, default: %(default)s')
+    arg_parser.add_argument('--time-span', type=float, default=86_400.0,
+                            help='Seconds between first and last line, default: %(default)s')
+    arg_parser.add_argument('--seed', type=int, default=0, help='Seed of the log generator, default: %(default)s')
+    arg_parser.add_argument('--engine', choices=ENGINES, default='pandas', help='Parser engine, default: %(default)s')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='Runs per stage (best is kept), default: %(default)s')
+    arg_parser.add_argument('--output', help='Write the results as JSON to this file')
+    arg_parser.add_argument('--baseline', help='Compare the results against the JSON results of an earlier run')
+    arg_parser.add_argument('--threshold', type=float, default=0.1,
+                            help='Relative slowdown of a stage that is flagged as regression, default: %(default)s')
+    arg_parser.add_argument('--min-difference', type=float, default=0.01,
+                            help='Minimum slowdown in seconds that is flagged as regression, default: %(default)s')
+    args = arg_parser.parse_args()
+    # Malformed lines are expected, so their warnings are not shown.
+    logging.getLogger('analyzer').setLevel(logging.ERROR)
+
+    config = {
+        'lines': args.lines,
+        'ips': args.ips,
+        'malformed_ratio': args.malformed_ratio,
+        'time_span': args.time_span,
+        'seed': args.seed,
+        'engine': args.engine,
+        'repeat': args.repeat,
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'access.log')
+        write_synthetic_log(path, args.lines, args.ips, args.malformed_ratio, args.time_span, args.seed)
+        stages = run_benchmarks(path, args.lines, args.engine, args.repeat)
+
+    print(f'{"stage":>12} {"seconds":>9} {"lines/sec":>14} {"MB/sec":>8} {"peak RSS MiB":>13}')
+    for stage, result in stages.items():
+        megabytes_per_second = f'{result["megabytes_per_second"]:8.1f}' if 'megabytes_per_second' in result else ' ' * 8
+        print(f'{stage:>12} {result["seconds"]:9.3f} {result["lines_per_second"]:14,.0f} {megabytes_per_second} '
+              f'{result["peak_rss_mib"]:13.1f}')
+
+    results = {
+        'config': config,
+        'environment': {'python': platform.python_version(), 'pandas': pd.__version__, 'machine': platform.machine()},
+        'stages': stages,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline['config'] != config:
+            print(f'Warning: the baseline was measured with a different configuration: {baseline["config"]}')
+        regressions = find_regressions(stages, baseline['stages'], args.threshold, args.min_difference)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+        print(f'No stage is more than {args.threshold:.0%} slower than the baseline')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Deterministic generator of synthetic Squid access logs for benchmarks.
+
+Usage: python benchmarks/synthetic_log.py OUTPUT [--lines N] [--ips N] [--malformed-ratio R] [--time-span SECONDS]
+                                                 [--seed S]
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+METHODS = np.array(['GET', 'POST', 'CONNECT', 'HEAD'])
+RESULT_CODES = np.array(['TCP_MISS/200', 'TCP_HIT/200', 'TCP_REFRESH_HIT/304', 'TCP_DENIED/403'])
+CONTENT_TYPES = np.array(['text/html', 'image/gif', 'application/json', '-'])
+START_TIMESTAMP = 1157689312.0
+
+
+def generate_lines(line_count: int, ip_count: int = 10_000, malformed_ratio: float = 0.0,
+                   time_span: float = 86_400.0, seed: int = 0) -> pd.Series:
+    """
+    Returns line_count log lines in Squid format. The same arguments always produce the same lines.
+
+    Parameters:
+        line_count: Number of lines.
+        ip_count: Number of distinct client IPs. IP frequencies follow a Zipf-like distribution, like real traffic.
+        malformed_ratio: Fraction of lines that are malformed: a non-numeric timestamp or size, or missing fields.
+        time_span: Seconds between the first and the last timestamp.
+        seed: Seed of the random generator.
+    """
+    rng = np.random.default_rng(seed)
+    timestamps = START_TIMESTAMP + np.sort(rng.uniform(0, time_span, line_count))
+    timestamps[[0, -1]] = [START_TIMESTAMP, START_TIMESTAMP + time_span]
+    ip_numbers = np.minimum(rng.zipf(1.2, line_count), ip_count) - 1
+    ip_numbers = rng.permutation(ip_count)[ip_numbers]
+    client_ips = pd.Series(ip_numbers // 65536 % 256).astype(str).radd('10.').str.cat(
+        [pd.Series(ip_numbers // 256 % 256).astype(str), pd.Series(ip_numbers % 256).astype(str)], sep='.')
+
+    fields = pd.DataFrame({
+        'timestamp': pd.Series(np.round(timestamps, 3)).map('{:.3f}'.format),
+        'response_header_size': rng.integers(0, 20_000, line_count).astype(str),
+        'client_ip': client_ips,
+        'response_code': RESULT_CODES[rng.integers(0, len(RESULT_CODES), line_count)],
+        'response_size': rng.integers(-1, 100_000, line_count).astype(str),
+        'request_method': METHODS[rng.integers(0, len(METHODS), line_count)],
+        'url': pd.Series(rng.integers(0, 1000, line_count)).astype(str).radd('http://www.example').add('.com/'),
+        'username': '-',
+        'access_destination_ip': 'DIRECT/207.58.145.61',
+        'response_type': CONTENT_TYPES[rng.integers(0, len(CONTENT_TYPES), line_count)],
+    })
+
+    malformed = np.flatnonzero(rng.random(line_count) < malformed_ratio)
+    malformed_kinds = rng.integers(0, 3, len(malformed))
+    fields.loc[malformed[malformed_kinds == 0], 'timestamp'] = '1157689320.ABC'
+    fields.loc[malformed[malformed_kinds == 1], 'response_size'] = 'ABC'
+    lines = fields.iloc[:, 0].str.cat([fields[column] for column in fields.columns[1:]], sep=' ')
+    truncated = malformed[malformed_kinds == 2]
+    if len(truncated) > 0:
+        lines.iloc[truncated] = fields.iloc[truncated, :4].apply(' '.join, axis=1)
+    return lines
+
+
+def write_synthetic_log(path: str, line_count: int, ip_count: int = 10_000, malformed_ratio: float = 0.0,
+                        time_span: float = 86_400.0, seed: int = 0) -> None:
+    """
+    Write a synthetic log file, see generate_lines.
+    """
+    lines = generate_lines(line_count, ip_count, malformed_ratio, time_span, seed)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('\n'.join(lines))
+        file.write('\n')
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description='Write a synthetic Squid access log')
+    arg_parser.add_argument('output', help='Path to the log file')
+    arg_parser.add_argument('--lines', type=int, default=1_000_000, help='Number of lines, default: %(default)s')
+    arg_parser.add_argument('--ips', type=int, default=10_000, help='Number of distinct IPs, default: %(default)s')
+    arg_parser.add_argument('--malformed-ratio', type=float, default=0.0,
+                            help='Fraction of malformed lines, default: %(default)s')
+    arg_parser.add_argument('--time-span', type=float, default=86_400.0,
+                            help='Seconds between first and last line, default: %(default)s')
+    arg_parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator, default: %(default)s')
+    args = arg_parser.parse_args()
+
+    write_synthetic_log(args.output, args.lines, args.ips, args.malformed_ratio, args.time_span, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,27 +1,287 @@
 import argparse
+import math
 import sys
+from io import TextIOWrapper
+from typing import TYPE_CHECKING
 
-from analyzer.analysis import LogAnalyzer
+from analyzer.analysis import DEFAULT_CHUNK_SIZE, DEFAULT_SNAPSHOT_INTERVAL, LogAnalyzer
+from analyzer.defaults import (DEFAULT_CACHE_MAX_SIZE, DEFAULT_DISTINCT_ERROR, DEFAULT_PERCENTILE_ERROR,
+                               DEFAULT_TOP_K_ERROR, ENGINES, default_cache_dir)
+from analyzer.engine import (DIMENSIONS, GROUP_METRICS, PERCENTILE_DIMENSIONS, PERCENTILES, SMALL_INPUT_SIZE,
+                             STATISTICS_ENGINES)
+from analyzer.files import file_path, is_compressed, open_log_file
+from analyzer.formats import INPUT_FORMATS
 from analyzer.log import init_logging
+from analyzer.output import WRITERS
+
+# Only modules that do not import pandas are imported here, so the command line starts fast (e.g., for --help). pandas
+# is imported once an option or the statistics engine needs it.
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def log_file(path: str) -> TextIOWrapper:
+    """
+    Argument type for input log files. Like argparse.FileType('r'), but decompresses compressed files on the fly.
+    """
+    try:
+        return open_log_file(path)
+    except (OSError, ValueError) as error:
+        raise argparse.ArgumentTypeError(f"can't open '{path}': {error}")
+
+
+def time_bucket(bucket: str) -> str:
+    """
+    Argument type for time bucket sizes like '1s', '1min' or '1h'.
+    """
+    import pandas as pd
+
+    try:
+        is_positive = pd.Timedelta(bucket) > pd.Timedelta(0)
+    except ValueError:
+        is_positive = False
+    if not is_positive:
+        raise argparse.ArgumentTypeError(f"invalid time bucket: '{bucket}'")
+    return bucket
+
+
+def positive_int(value: str) -> int:
+    """
+    Argument type for positive integers, e.g., sizes and counts.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"invalid positive integer: '{value}'")
+    return number
+
+
+def sample_fraction(value: str) -> float:
+    """
+    Argument type for sample fractions in (0, 1].
+    """
+    try:
+        fraction = float(value)
+    except ValueError:
+        fraction = math.nan
+    if not 0 < fraction <= 1:
+        raise argparse.ArgumentTypeError(f"invalid sample fraction: '{value}' (must be in (0, 1])")
+    return fraction
+
+
+def reject_ratio(value: str) -> float:
+    """
+    Argument type for maximum reject ratios in [0, 1].
+    """
+    try:
+        ratio = float(value)
+    except ValueError:
+        ratio = math.nan
+    if not 0 <= ratio <= 1:
+        raise argparse.ArgumentTypeError(f"invalid reject ratio: '{value}' (must be in [0, 1])")
+    return ratio
+
+
+def error_fraction(value: str) -> float:
+    """
+    Argument type for error bounds of approximations in (0, 1), as a fraction (e.g., 0.01 for 1%).
+    """
+    try:
+        fraction = float(value)
+    except ValueError:
+        fraction = math.nan
+    if not 0 < fraction < 1:
+        raise argparse.ArgumentTypeError(f"invalid error: '{value}' (must be in (0, 1))")
+    return fraction
+
+
+def point_in_time(value: str) -> 'pd.Timestamp':
+    """
+    Argument type for points in time: Unix timestamps in seconds or ISO 8601 dates and times, which are UTC unless
+    they have a UTC offset.
+    """
+    import pandas as pd
+
+    try:
+        timestamp = pd.Timestamp(float(value), unit='s')
+    except ValueError:
+        try:
+            timestamp = pd.Timestamp(value)
+        except ValueError:
+            timestamp = pd.NaT
+    if pd.isna(timestamp):
+        raise argparse.ArgumentTypeError(f"invalid point in time: '{value}'")
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert('UTC').tz_localize(None)
+    return timestamp
 
 
 def main():
+    if sys.argv[1:2] == ['serve']:
+        from analyzer.server import main as serve
+        serve(sys.argv[2:])
+        return
+
     init_logging()
 
-    arg_parser = argparse.ArgumentParser(description='Analyze log files')
-    arg_parser.add_argument('input', nargs='+', type=argparse.FileType('r', encoding='utf-8'),
-                            help='Path to one or more log files')
+    arg_parser = argparse.ArgumentParser(description='Analyze log files. See "analyzer serve --help" for the query '
+                                                 'server, which keeps parsed log files in memory')
+    arg_parser.add_argument('input', nargs='+', type=log_file,
+                            help='Path to one or more log files, which may be compressed (gzip, bz2, xz, zstd)')
     arg_parser.add_argument('-o', '--output', nargs='?', type=argparse.FileType('w', encoding='utf-8'),
                             default=sys.stdout, help='Path to the output file, default: stdout')
+    arg_parser.add_argument('--format', choices=WRITERS, default='json',
+                            help='Output format. ndjson, csv and parquet write large tables of results (e.g., of '
+                                 '--group-by) in batches, default: %(default)s')
     arg_parser.add_argument('--mfip', action='store_true', help='Calculate most frequent IP')
     arg_parser.add_argument('--lfip', action='store_true', help='Calculate least frequent IP')
     arg_parser.add_argument('--eps', action='store_true', help='Calculate events per second')
     arg_parser.add_argument('--bytes', action='store_true', help='Total amount of bytes exchanged')
+    arg_parser.add_argument('--distinct-ips', action='store_true', help='Calculate number of distinct IPs')
+    arg_parser.add_argument('--eps-series', type=time_bucket, metavar='BUCKET',
+                            help='Calculate events and bytes per time bucket (e.g., 1s, 1min, 1h) and peak and '
+                                 'percentiles of the events per second')
+    arg_parser.add_argument('--group-by', action='append', choices=DIMENSIONS, metavar='DIMENSION',
+                            help='Calculate requests and bytes per key of DIMENSION, one of '
+                                 f'{", ".join(DIMENSIONS)} (host of the URL). Can be given several times')
+    arg_parser.add_argument('--top', type=positive_int, metavar='N',
+                            help='Only output the top N keys per --group-by dimension')
+    arg_parser.add_argument('--top-by', choices=GROUP_METRICS, default='requests',
+                            help='Order the keys of --group-by by this metric, default: %(default)s')
+    arg_parser.add_argument('--percentiles', action='store_true',
+                            help=f'Calculate percentiles ({", ".join(f"p{value:g}" for value in PERCENTILES)}) and '
+                                 'maximum of the elapsed time (ms) and the response size. Exact when the input is '
+                                 'loaded at once, estimated with --stream, --workers, --follow, --approximate and '
+                                 '--max-memory (which select the pandas statistics engine)')
+    arg_parser.add_argument('--percentiles-by', choices=PERCENTILE_DIMENSIONS, metavar='DIMENSION',
+                            help='Also calculate the percentiles per key of DIMENSION, one of '
+                                 f'{", ".join(PERCENTILE_DIMENSIONS)}. Implies --percentiles')
+    arg_parser.add_argument('--percentile-error', type=error_fraction, default=DEFAULT_PERCENTILE_ERROR,
+                            help='Maximum relative error of the percentiles when they are estimated, default: '
+                                 '%(default)s')
+    arg_parser.add_argument('--stream', action='store_true',
+                            help='Parse the input in chunks with constant memory instead of loading it at once')
+    arg_parser.add_argument('--chunk-size', type=positive_int, default=DEFAULT_CHUNK_SIZE,
+                            help=f'Number of log lines per chunk with --stream, default: {DEFAULT_CHUNK_SIZE}')
+    arg_parser.add_argument('--workers', type=int, default=1,
+                            help='Number of worker processes that parse the input in parallel, default: 1')
+    arg_parser.add_argument('--cache-dir', default=default_cache_dir(),
+                            help='Directory of the cache for parsed log files, default: %(default)s')
+    arg_parser.add_argument('--cache-max-size', type=int, default=DEFAULT_CACHE_MAX_SIZE // (1024 * 1024),
+                            help='Maximum size of the cache in MiB, default: %(default)s')
+    arg_parser.add_argument('--no-cache', action='store_true', help='Do not read or write the cache')
+    arg_parser.add_argument('--engine', choices=ENGINES, default='pandas',
+                            help='Parser engine, "fast" parses numeric fields directly from bytes, default: '
+                                 '%(default)s')
+    arg_parser.add_argument('--input-format', choices=INPUT_FORMATS, default='auto',
+                            help='Format of the input files: Squid access log, Apache/Nginx combined log or JSON '
+                                 'lines. "auto" detects the format of every file from its first lines, default: '
+                                 '%(default)s')
+    arg_parser.add_argument('--statistics-engine', choices=STATISTICS_ENGINES, default='auto',
+                            help='Engine that computes the statistics. "python" analyzes the log lines one by one '
+                                 'without loading pandas, which is faster for small inputs, "auto" chooses it for up '
+                                 f'to {SMALL_INPUT_SIZE // (1024 * 1024)} MiB of uncompressed input files unless an '
+                                 'option that only "pandas" supports is set (e.g., --stream or --engine fast), '
+                                 'default: %(default)s')
+    arg_parser.add_argument('--follow', action='store_true',
+                            help='Follow the input files as they grow and write updated statistics until interrupted')
+    arg_parser.add_argument('--snapshot-interval', type=float, default=DEFAULT_SNAPSHOT_INTERVAL,
+                            help='Seconds between two snapshots with --follow, default: %(default)s')
+    arg_parser.add_argument('--snapshot-lines', type=int,
+                            help='Also write a snapshot with --follow after this number of new log lines')
+    arg_parser.add_argument('--approximate', action='store_true',
+                            help='Approximate --mfip and --distinct-ips with sketches of bounded memory')
+    arg_parser.add_argument('--top-k-error', type=error_fraction, default=DEFAULT_TOP_K_ERROR,
+                            help='Maximum count error of --mfip with --approximate, as a fraction of all log lines, '
+                                 'default: %(default)s')
+    arg_parser.add_argument('--distinct-error', type=error_fraction, default=DEFAULT_DISTINCT_ERROR,
+                            help='Relative standard error of --distinct-ips with --approximate, default: %(default)s')
+    arg_parser.add_argument('--profile', nargs='?', const='-', metavar='FILE',
+                            help='Report time, rows, bytes and peak memory per pipeline stage and dropped lines by '
+                                 'reason, as JSON to FILE or as a table to stderr')
+    arg_parser.add_argument('--cprofile', metavar='FILE',
+                            help='Run the analysis under cProfile and dump the statistics to FILE')
+    arg_parser.add_argument('--since', type=point_in_time, metavar='TIME',
+                            help='Only analyze log lines at or after TIME (Unix timestamp or ISO 8601, UTC by default)')
+    arg_parser.add_argument('--until', type=point_in_time, metavar='TIME',
+                            help='Only analyze log lines before TIME (Unix timestamp or ISO 8601, UTC by default)')
+    arg_parser.add_argument('--time-index', action='store_true',
+                            help='Keep a sparse timestamp index next to each log file (FILE.tsidx) to speed up '
+                                 'repeated --since/--until queries')
+    arg_parser.add_argument('--sample', type=sample_fraction, metavar='FRACTION',
+                            help='Only parse a random sample of FRACTION of the input (e.g., 0.01) and extrapolate the '
+                                 'statistics, with confidence intervals of --eps and --bytes')
+    arg_parser.add_argument('--sample-seed', type=int, metavar='SEED',
+                            help='Seed of the random sample with --sample, default: a random seed, which is added to '
+                                 'the output')
+    arg_parser.add_argument('--rejects', metavar='FILE',
+                            help='Write the log lines that are rejected as malformed to FILE as CSV, with their source '
+                                 'file, line number and reason')
+    arg_parser.add_argument('--max-reject-ratio', type=reject_ratio, metavar='RATIO',
+                            help='Abort without writing results as soon as more than RATIO of the log lines (e.g., '
+                                 '0.05) are rejected as malformed')
+    arg_parser.add_argument('--max-memory', type=int, metavar='MIB',
+                            help='Keep the exact counts per client IP within about MIB MiB of memory by spilling them '
+                                 'to temporary files, e.g., for --mfip over months of logs. Implies --stream')
     args = arg_parser.parse_args()
-
-    LogAnalyzer(input_files=args.input,
-                mfip=args.mfip,
-                lfip=args.lfip,
-                eps=args.eps,
-                bytes=args.bytes,
-                output=args.output).analyze_log_files()
+    if args.since is not None and args.until is not None and args.since >= args.until:
+        arg_parser.error('--since must be earlier than --until')
+    if args.sample is not None:
+        conflicts = [option for option, value in [('--eps-series', args.eps_series), ('--follow', args.follow),
+                                                  ('--approximate', args.approximate),
+                                                  ('--max-memory', args.max_memory is not None)] if value]
+        if conflicts:
+            arg_parser.error(f'--sample cannot be combined with {", ".join(conflicts)}')
+        paths = [file_path(file) for file in args.input]
+        if None in paths or any(is_compressed(path) for path in paths):
+            arg_parser.error('--sample requires regular, uncompressed input files')
+    if args.rejects is not None and (args.sample is not None or args.follow):
+        arg_parser.error('--rejects cannot be combined with --sample or --follow')
+    if args.format == 'parquet' and args.follow:
+        arg_parser.error('--format parquet cannot be combined with --follow')
+    log_analyzer = LogAnalyzer(input_files=args.input,
+                               mfip=args.mfip,
+                               lfip=args.lfip,
+                               eps=args.eps,
+                               bytes=args.bytes,
+                               distinct_ips=args.distinct_ips,
+                               eps_series=args.eps_series,
+                               stream=args.stream,
+                               chunk_size=args.chunk_size,
+                               workers=args.workers,
+                               cache_dir=None if args.no_cache else args.cache_dir,
+                               cache_max_size=args.cache_max_size * 1024 * 1024,
+                               engine=args.engine,
+                               follow=args.follow,
+                               snapshot_interval=args.snapshot_interval,
+                               snapshot_lines=args.snapshot_lines,
+                               approximate=args.approximate,
+                               top_k_error=args.top_k_error,
+                               distinct_error=args.distinct_error,
+                               profile=args.profile,
+                               cprofile=args.cprofile,
+                               since=args.since,
+                               until=args.until,
+                               time_index=args.time_index,
+                               group_by=args.group_by,
+                               top=args.top,
+                               top_by=args.top_by,
+                               sample=args.sample,
+                               sample_seed=args.sample_seed,
+                               output_format=args.format,
+                               rejects=args.rejects,
+                               max_reject_ratio=args.max_reject_ratio,
+                               max_memory=None if args.max_memory is None else args.max_memory * 1024 * 1024,
+                               statistics_engine=args.statistics_engine,
+                               input_format=args.input_format,
+                               percentiles=args.percentiles or args.percentiles_by is not None,
+                               percentiles_by=args.percentiles_by,
+                               percentile_error=args.percentile_error,
+                               output=args.output)
+    try:
+        log_analyzer.check_statistics_engine()
+    except ValueError as error:
+        arg_parser.error(str(error))
+    log_analyzer.analyze_log_files()
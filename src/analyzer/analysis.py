@@ -1,13 +1,36 @@
+import cProfile
+import functools
 import logging
-from io import TextIOWrapper
-from typing import Sequence
+import os
+import time
+from io import BytesIO, TextIOWrapper
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence, Tuple
 
-from analyzer.output import JSONWriter
-from analyzer.parsing import CSVParser
-from analyzer.statistics import LogStatistics
+from analyzer.defaults import (DEFAULT_CACHE_MAX_SIZE, DEFAULT_DISTINCT_ERROR, DEFAULT_PERCENTILE_ERROR,
+                               DEFAULT_TOP_K_ERROR)
+from analyzer.engine import SMALL_INPUT_SIZE, STATISTICS, STATISTICS_ENGINES, StatisticsEngine, StatisticsPlan
+from analyzer.files import file_path, is_compressed, open_byte_range, peek_text
+from analyzer.follow import FOLLOW_POLL_INTERVAL, LogFollower
+from analyzer.formats import FORMAT_SAMPLE_SIZE, detect_input_format
+from analyzer.output import WRITERS
+from analyzer.profiling import profiler
+from analyzer.rejects import reject_log
+
+# The modules of the pandas engine are imported when the pandas engine is used, so small inputs that the python engine
+# analyzes (see PythonLogStatistics) do not import pandas at all.
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from analyzer.parsing import BaseParser
+    from analyzer.pure import PythonLogStatistics
+    from analyzer.sampling import SampledLogStatistics
+    from analyzer.statistics import LogStatisticsAccumulator
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_CHUNK_SIZE = 100_000
+DEFAULT_SNAPSHOT_INTERVAL = 10.0
+
 
 class LogAnalyzer:
     """
@@ -20,6 +43,79 @@ class LogAnalyzer:
         lfip: If true, calculate least frequent IP.
         eps: If true, calculate events per second.
         bytes: If true, calculate total amount of bytes exchanged.
+        distinct_ips: If true, calculate the number of distinct IPs.
+        eps_series: If set, calculate the number of events and bytes per time bucket of this size (e.g., '1s', '1min',
+        '1h') and the peak and percentiles of the events per second per bucket.
+        stream: If true, parse the log files in chunks and accumulate the statistics chunk by chunk instead of
+        loading all log entries into memory.
+        chunk_size: Maximum number of log lines per chunk in stream mode.
+        workers: Number of worker processes. With more than one worker, the log files are sharded and parsed in
+        parallel. Requires all input files to be regular files on disk.
+        cache_dir: Directory of the parse cache. If set, parsed log files are cached on disk and reused on later runs
+        as long as the files are unchanged. The cache is not used when parsing in parallel.
+        cache_max_size: Maximum size of the parse cache in bytes.
+        engine: Parser engine for the log files. 'pandas' reads all fields as strings and converts them afterwards,
+        'fast' parses numeric fields directly from the raw bytes. Both produce identical dataframes.
+        follow: If true, follow the log files like tail -F: parse newly appended lines as they arrive and write a fresh
+        snapshot of the statistics to the output from time to time, until interrupted. Requires all input files to be
+        regular files on disk. Rotated and truncated files are followed from their start.
+        snapshot_interval: Minimum number of seconds between two snapshots in follow mode.
+        snapshot_lines: If set, a snapshot is also written in follow mode as soon as this number of log lines was
+        parsed since the last snapshot.
+        approximate: If true, answer the most frequent IP and the number of distinct IPs from sketches of bounded size
+        (see ApproximateLogStatisticsAccumulator) and add their error bounds to the results. Log files are parsed in
+        chunks like in stream mode.
+        top_k_error: Maximum overestimation of the count of the most frequent IP in approximate mode, as a fraction of
+        all log entries.
+        distinct_error: Relative standard error of the number of distinct IPs in approximate mode.
+        profile: If set, measure wall time, CPU time, rows in and out, bytes read and peak memory of every pipeline
+        stage and count dropped log lines by reason (see Profiler). The report is written as JSON to this path, or as a
+        table to stderr if it is '-'.
+        cprofile: If set, run the analysis under cProfile and dump the statistics to this path (readable with pstats).
+        since: If set, only analyze log entries at or after this (UTC) time.
+        until: If set, only analyze log entries before this (UTC) time. With since or until, only the byte range of
+        each uncompressed log file that holds the time range is parsed, found by a binary search over the timestamps
+        of sampled lines. Files that turn out not to be ordered by timestamp, compressed files and stdin are scanned
+        completely.
+        time_index: If true, keep a sparse index from timestamps to byte offsets next to each log file (see TimeIndex),
+        so repeated time range searches in the same file only read a single interval of it.
+        group_by: If set, calculate the number of requests and bytes exchanged per key of each of these dimensions
+        (see GROUP_BY_DIMENSIONS), e.g., per client IP or per host.
+        top: If set, only output the top keys per dimension of group_by.
+        top_by: Metric that the keys of group_by are ordered by: 'requests' or 'bytes'.
+        sample: If set, only parse a random sample of about this fraction of each memory-mapped log file, in blocks of
+        whole lines, and extrapolate the statistics from it (see LogSample). The results are marked as approximate and
+        hold confidence intervals of eps and bytes. Requires regular, uncompressed input files and cannot be combined
+        with eps_series.
+        sample_seed: Seed of the random sample. If None, a random seed is chosen and added to the results.
+        output_format: Format of the output, see WRITERS: 'json' writes all results as one JSON object, while 'ndjson',
+        'csv' and 'parquet' stream large tables of results (e.g., of group_by) in batches. 'parquet' cannot be
+        combined with follow.
+        rejects: If set, write every log line that the parser rejects to a CSV file at this path, with its source file,
+        line number and reason (see RejectLog). Cannot be combined with sample or follow, whose line numbers are not
+        those of the log files. The parse cache is not used, as it does not hold rejected lines.
+        max_reject_ratio: If set, abort the run with a ValueError as soon as more than this fraction of the log lines
+        was rejected, and before any results are written. The parse cache is not used.
+        max_memory: If set, the exact counts per client IP are spilled to temporary files on local disk whenever they
+        take more than about this number of bytes in memory, and mfip, lfip and distinct_ips are computed exactly from
+        the spilled counts, one hash partition at a time (see SpilledCounts). Implies parsing in chunks like in stream
+        mode, and cannot be combined with sample. The spilled counts are removed when the analysis ends or fails.
+        statistics_engine: Engine that computes the statistics, see STATISTICS_ENGINES: 'pandas' parses the log files
+        into dataframes with one of the parser engines (see engine), 'python' parses and aggregates them line by line
+        in pure Python without importing pandas (see PythonLogStatistics), which is faster for small inputs but does
+        not support the fast parser engine, eps_series, stream, follow, sample, approximate, max_memory, since, until,
+        more than one worker or input formats other than squid (see python_engine_conflicts). 'auto' chooses 'python'
+        if the input files are regular, uncompressed files of at most SMALL_INPUT_SIZE bytes in total and no unsupported
+        option is set, and 'pandas' otherwise. The python engine does not use the parse cache.
+        input_format: Format of the log files, see INPUT_FORMATS: 'squid', 'combined' (Apache and Nginx) or 'jsonl'
+        (see PARSERS), or 'auto' to detect the format of every file from its first lines. The python statistics engine
+        only parses the squid format.
+        percentiles: If true, calculate the percentiles (see PERCENTILES) and maximum of the elapsed time and the
+        response size. They are exact when the log entries are loaded into memory, and are estimated from mergeable
+        sketches within percentile_error (relative to the exact percentiles) when the log files are parsed in chunks
+        or in parallel.
+        percentiles_by: If set, also calculate the percentiles per key of this dimension, see PERCENTILE_DIMENSIONS.
+        percentile_error: Maximum relative error of the estimated percentiles.
     """
 
     def __init__(self,
@@ -29,43 +125,448 @@ class LogAnalyzer:
                  lfip: bool,
                  eps: bool,
                  bytes: bool,
+                 distinct_ips: bool = False,
+                 eps_series: Optional[str] = None,
+                 stream: bool = False,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 workers: int = 1,
+                 cache_dir: Optional[str] = None,
+                 cache_max_size: int = DEFAULT_CACHE_MAX_SIZE,
+                 engine: str = 'pandas',
+                 follow: bool = False,
+                 snapshot_interval: float = DEFAULT_SNAPSHOT_INTERVAL,
+                 snapshot_lines: Optional[int] = None,
+                 approximate: bool = False,
+                 top_k_error: float = DEFAULT_TOP_K_ERROR,
+                 distinct_error: float = DEFAULT_DISTINCT_ERROR,
+                 profile: Optional[str] = None,
+                 cprofile: Optional[str] = None,
+                 since: Optional['pd.Timestamp'] = None,
+                 until: Optional['pd.Timestamp'] = None,
+                 time_index: bool = False,
+                 group_by: Optional[Sequence[str]] = None,
+                 top: Optional[int] = None,
+                 top_by: str = 'requests',
+                 sample: Optional[float] = None,
+                 sample_seed: Optional[int] = None,
+                 output_format: str = 'json',
+                 rejects: Optional[str] = None,
+                 max_reject_ratio: Optional[float] = None,
+                 max_memory: Optional[int] = None,
+                 statistics_engine: str = 'auto',
+                 input_format: str = 'auto',
+                 percentiles: bool = False,
+                 percentiles_by: Optional[str] = None,
+                 percentile_error: float = DEFAULT_PERCENTILE_ERROR,
                  ):
         self.input_files = input_files
         self.mfip = mfip
         self.lfip = lfip
         self.eps = eps
         self.bytes = bytes
+        self.distinct_ips = distinct_ips
+        self.eps_series = eps_series
         self.output = output
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.cache_dir = cache_dir
+        self.cache_max_size = cache_max_size
+        self.engine = engine
+        self.follow = follow
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_lines = snapshot_lines
+        self.approximate = approximate
+        self.top_k_error = top_k_error
+        self.distinct_error = distinct_error
+        self.profile = profile
+        self.cprofile = cprofile
+        self.since = since
+        self.until = until
+        self.time_index = time_index
+        self.group_by = group_by
+        self.top = top
+        self.top_by = top_by
+        self.sample = sample
+        self.sample_seed = sample_seed
+        self.output_format = output_format
+        self.rejects = rejects
+        self.max_reject_ratio = max_reject_ratio
+        self.max_memory = max_memory
+        self.statistics_engine = statistics_engine
+        self.input_format = input_format
+        self.percentiles = percentiles
+        self.percentiles_by = percentiles_by
+        self.percentile_error = percentile_error
 
     def analyze_log_files(self) -> None:
         """
-        Parse log files into a dataframe and generate statistics over this dataframe based on the boolean flags
-        on the object. Write result to output. Currently, parses logs as CSV and writes results as JSON.
+        Parse log files in the input_format and generate statistics over them based on the boolean flags on the
+        object, with the statistics_engine. Write the results to output in the output_format (see WRITERS).
         """
-        # Configuration values for the Parser could be added as options to the CLI. For different input types, different
-        # Parsers could be implemented.
-        log_dataframe = CSVParser(timestamp_unit='s', separator=r'\s+', on_bad_lines='warn').parse_files_to_dataframe(
-            self.input_files)
+        if self.rejects is not None and (self.sample is not None or self.follow):
+            raise ValueError('Rejected lines (--rejects) cannot be written with --sample or --follow')
+        if self.profile is not None:
+            profiler.enable()
+        if self.rejects is not None or self.max_reject_ratio is not None:
+            reject_log.enable(self.rejects, self.max_reject_ratio)
+        cprofile = cProfile.Profile() if self.cprofile is not None else None
+        if cprofile is not None:
+            cprofile.enable()
+        try:
+            self._analyze_log_files()
+        finally:
+            if cprofile is not None:
+                cprofile.disable()
+                cprofile.dump_stats(self.cprofile)
+                logger.info(f'Wrote cProfile statistics to {self.cprofile}')
+            if self.profile is not None:
+                profiler.write_report(self.profile)
+                profiler.disable()
+            reject_log.disable()
 
-        if len(log_dataframe) == 0:
+    def _analyze_log_files(self) -> None:
+        if self._uses_python_engine():
+            log_statistics = self._python_statistics()
+        else:
+            parser = self._parser()
+            if self.follow:
+                self._follow_log_files(parser)
+                return
+            log_statistics = self._compute_statistics(parser)
+        if log_statistics is None:
             logger.warning('No log entries to analyze. Exiting')
             return
+        try:
+            reject_log.check()
+            results = self._collect_results(log_statistics)
+            with profiler.stage('write'):
+                WRITERS[self.output_format](output=self.output, results=results).write()
+        finally:
+            log_statistics.close()
 
-        log_statistics = LogStatistics(log_dataframe)
-        results = {}
+    def _parser(self) -> 'BaseParser':
+        from analyzer.parsing import create_parser
+        from analyzer.timerange import TimeRange
+
+        time_range = TimeRange(self.since, self.until) if self.since is not None or self.until is not None else None
+        return create_parser(self.input_format, self.engine, on_bad_lines='warn', columns=self._required_columns(),
+                             time_range=time_range)
+
+    def python_engine_conflicts(self) -> List[str]:
+        """
+        Returns the options that are set but not supported by the python statistics engine. With --stream, the pandas
+        engine is used, which parses the log files in chunks, and another parser --engine than pandas is only used by
+        the pandas engine.
+        """
+        return [option for option, value in [
+            ('--engine', self.engine != 'pandas'), ('--eps-series', self.eps_series is not None),
+            ('--stream', self.stream), ('--follow', self.follow),
+            ('--sample', self.sample is not None), ('--approximate', self.approximate),
+            ('--max-memory', self.max_memory is not None), ('--since', self.since is not None),
+            ('--until', self.until is not None), ('--workers', self.workers > 1),
+            ('--input-format', self.input_format not in ('auto', 'squid'))] if value]
+
+    def check_statistics_engine(self) -> None:
+        """
+        Raises:
+            ValueError: If the statistics engine is unknown, or if the python engine is requested with an option that it
+            does not support.
+        """
+        if self.statistics_engine not in STATISTICS_ENGINES:
+            raise ValueError(f'Unknown statistics engine: {self.statistics_engine}')
+        unsupported_options = self.python_engine_conflicts()
+        if self.statistics_engine == 'python' and unsupported_options:
+            raise ValueError(f'The python statistics engine does not support {", ".join(unsupported_options)}')
+
+    def _uses_python_engine(self) -> bool:
+        """
+        Returns whether the statistics are computed by the python engine, see statistics_engine.
+
+        Raises:
+            ValueError: If the statistics engine is unknown, if the python engine is requested with an option that it
+            does not support, or if it is requested for input files in another format than squid.
+        """
+        self.check_statistics_engine()
+        if self.statistics_engine == 'pandas':
+            return False
+        if self.statistics_engine == 'python':
+            if self.input_format == 'auto' and not self._is_squid_input():
+                raise ValueError('The python statistics engine only parses the squid input format')
+            return True
+        if self.python_engine_conflicts():
+            return False
+        input_size = self._input_size()
+        if input_size is None or input_size > SMALL_INPUT_SIZE or not self._is_squid_input():
+            return False
+        logger.info(f'Using the python statistics engine for {input_size} bytes of input')
+        return True
+
+    def _input_size(self) -> Optional[int]:
+        """
+        Returns the total size of the input files in bytes, or None if it is not known in advance, i.e., if an input
+        file is not a regular file on disk or is compressed.
+        """
+        paths = [file_path(file) for file in self.input_files]
+        if None in paths or any(is_compressed(path) for path in paths):
+            return None
+        return sum(os.path.getsize(path) for path in paths)
 
-        if self.mfip:
-            results['mfip'] = log_statistics.most_frequent_ip()
-            logger.info('Adding most frequent IP (--mfip) to result')
+    def _is_squid_input(self) -> bool:
+        """
+        Returns whether all input files are in the squid format, as detected from their first lines (see
+        detect_input_format) unless input_format is set.
+        """
+        if self.input_format != 'auto':
+            return self.input_format == 'squid'
+        return all(detect_input_format(peek_text(file, FORMAT_SAMPLE_SIZE)) == 'squid' for file in self.input_files)
+
+    def _python_statistics(self) -> Optional['PythonLogStatistics']:
+        """
+        Returns the statistics over all log files, parsed and aggregated by the python engine, or None if there are no
+        log entries to analyze.
+        """
+        from analyzer.pure import PythonLogStatistics
+
+        log_statistics = PythonLogStatistics(self._plan().primitives)
+        for file in self.input_files:
+            log_statistics.update(file)
+        logger.info(f'Parsed {log_statistics.row_count} log lines')
+        return log_statistics if log_statistics.row_count > 0 else None
+
+    def _compute_statistics(self, parser: 'BaseParser') -> Optional[StatisticsEngine]:
+        """
+        Returns the statistics over all log files, or None if there are no log entries to analyze. Depending on the
+        options, log files are loaded into a single dataframe, streamed in chunks or parsed in parallel.
+        """
+        from analyzer.cache import CachingParser, ParseCache
+        from analyzer.parallel import ParallelAnalyzer
+        from analyzer.statistics import LogStatistics
+
+        if self.sample is not None:
+            return self._sample_statistics(parser)
+
+        input_paths = self._input_paths() if self.workers > 1 else None
+        if input_paths is not None:
+            byte_ranges = [self._time_range_bytes(path, parser) for path in input_paths]
+            log_statistics = ParallelAnalyzer(parser=parser, workers=self.workers, chunk_size=self.chunk_size,
+                                              statistics_factory=self._statistics_factory()).analyze_files(input_paths,
+                                                                                                          byte_ranges)
+            logger.info(f'Parsed {log_statistics.row_count} log lines')
+            return log_statistics if log_statistics.row_count > 0 else None
+
+        input_files = self._time_range_files(parser)
+        if self.cache_dir is not None and reject_log.enabled:
+            logger.info('Not using the parse cache, which does not hold rejected log lines')
+        elif self.cache_dir is not None:
+            parser = CachingParser(parser, ParseCache(self.cache_dir, self.cache_max_size))
+
+        if self.stream or self.approximate or self.max_memory is not None:
+            log_statistics = self._statistics_factory()()
+            for chunk in parser.parse_files_to_chunks(input_files, self.chunk_size):
+                with profiler.stage('accumulate', rows_in=len(chunk)):
+                    log_statistics.update(chunk)
+        else:
+            log_dataframe = parser.parse_files_to_dataframe(input_files)
+            memory_usage = log_dataframe.memory_usage(deep=True).sum() / (1024 * 1024)
+            logger.info(f'Loaded columns {list(log_dataframe.columns)} into {memory_usage:.1f} MiB')
+            if len(log_dataframe) == 0:
+                return None
+            log_statistics = LogStatistics(log_dataframe)
+            plan = self._plan()
+            with profiler.stage('aggregate', rows_in=len(log_dataframe)):
+                log_statistics.aggregate(plan.primitives, plan.eps_bucket)
+            return log_statistics
+
+        logger.info(f'Parsed {log_statistics.row_count} log lines')
+        return log_statistics if log_statistics.row_count > 0 else None
+
+    def _sample_statistics(self, parser: 'BaseParser') -> Optional['SampledLogStatistics']:
+        """
+        Returns the statistics extrapolated from a random sample of the log files, or None if the sample holds no log
+        entries.
+        """
+        from analyzer.sampling import LogSample
+
+        input_paths = [file_path(file) for file in self.input_files]
+        if None in input_paths or any(is_compressed(path) for path in input_paths):
+            raise ValueError('Sampling requires regular, uncompressed input files')
+        if self.eps_series is not None:
+            raise ValueError('The events per time bucket (--eps-series) cannot be estimated from a sample')
+        if self.max_memory is not None:
+            raise ValueError('A sample is analyzed in memory and cannot be spilled to disk (--max-memory)')
+        if self.mfip or self.lfip or self.distinct_ips:
+            logger.warning('The most and least frequent IPs (--mfip, --lfip) and the number of distinct IPs '
+                           '(--distinct-ips) cannot be extrapolated from a sample. They are those of the sample')
+        with profiler.stage('sample'):
+            log_sample = LogSample(input_paths, self.sample, self.sample_seed)
+        log_statistics = log_sample.parse(parser)
+        if log_statistics is None:
+            return None
+        plan = self._plan()
+        with profiler.stage('aggregate', rows_in=len(log_statistics.log_dataframe)):
+            log_statistics.aggregate(plan.primitives, plan.eps_bucket)
+        return log_statistics
+
+    def _follow_log_files(self, parser: 'BaseParser') -> None:
+        """
+        Follow the log files and update the statistics with every batch of appended lines. A snapshot is written
+        whenever new log entries were parsed and snapshot_interval seconds have passed (or snapshot_lines log lines
+        were parsed) since the last snapshot. Runs until interrupted, then writes a final snapshot.
+        """
+        input_paths = [file_path(file) for file in self.input_files]
+        if None in input_paths:
+            raise ValueError('Follow mode requires regular input files')
+        if any(is_compressed(path) for path in input_paths):
+            raise ValueError('Follow mode does not support compressed input files')
+        followers = [LogFollower(path) for path in input_paths]
+
+        log_statistics = self._statistics_factory()()
+        snapshot_row_count = 0
+        snapshot_time = time.monotonic()
+        try:
+            while True:
+                appended_lines = [follower.read_lines() for follower in followers]
+                for lines in appended_lines:
+                    # Blank lines only would make pandas fail to find any column.
+                    if lines.strip():
+                        chunks = parser.parse_files_to_chunks([TextIOWrapper(BytesIO(lines), encoding='utf-8')],
+                                                              self.chunk_size)
+                        for chunk in chunks:
+                            with profiler.stage('accumulate', rows_in=len(chunk)):
+                                log_statistics.update(chunk)
+
+                new_row_count = log_statistics.row_count - snapshot_row_count
+                if new_row_count > 0 and (time.monotonic() - snapshot_time >= self.snapshot_interval
+                                          or self.snapshot_lines is not None and new_row_count >= self.snapshot_lines):
+                    if self._write_snapshot(log_statistics):
+                        snapshot_row_count = log_statistics.row_count
+                        snapshot_time = time.monotonic()
+
+                if not any(appended_lines):
+                    time.sleep(FOLLOW_POLL_INTERVAL)
+        except KeyboardInterrupt:
+            logger.info('Stopped following the log files')
+            if log_statistics.row_count > snapshot_row_count:
+                self._write_snapshot(log_statistics)
+        finally:
+            for follower in followers:
+                follower.close()
+            log_statistics.close()
+
+    def _write_snapshot(self, log_statistics: 'LogStatisticsAccumulator') -> bool:
+        """
+        Write the current statistics to the output. A seekable output (i.e., a file) is overwritten, so it always holds
+        the latest snapshot. Otherwise, snapshots are written one per line. Returns False if the statistics cannot be
+        computed yet.
+        """
+        try:
+            results = self._collect_results(log_statistics)
+        except ZeroDivisionError:
+            logger.info('All log entries are from the same second. Waiting for more log entries')
+            return False
+
+        with profiler.stage('write'):
+            if self.output.seekable():
+                self.output.seek(0)
+                self.output.truncate()
+            WRITERS[self.output_format](output=self.output, results=results).write()
+            if self.output_format == 'json' and not self.output.seekable():
+                self.output.write('\n')
+            self.output.flush()
+        return True
+
+    def _statistics_factory(self) -> Callable[[], 'LogStatisticsAccumulator']:
+        """
+        Returns a picklable factory of empty accumulators, so worker processes create the same kind of accumulator.
+        """
+        from analyzer.statistics import ApproximateLogStatisticsAccumulator, LogStatisticsAccumulator
+
+        primitives = self._plan().primitives
+        if not self.approximate:
+            return functools.partial(LogStatisticsAccumulator, eps_bucket=self.eps_series, primitives=primitives,
+                                     max_memory=self.max_memory, percentile_error=self.percentile_error)
         if self.lfip:
-            results['lfip'] = log_statistics.least_frequent_ip()
-            logger.info('Adding least frequent IP (--lfip) to result')
-        if self.eps:
-            results['eps'] = log_statistics.events_per_second()
-            logger.info('Adding events per second (--eps) to result')
-        if self.bytes:
-            results['bytes'] = log_statistics.total_amount_of_bytes_exchanged()
-            logger.info('Adding total amount of bytes exchanged (--bytes) to result')
-
-        # For different output types, different Writers could be implemented.
-        JSONWriter(output=self.output, results=results).write()
+            logger.warning('The least frequent IP (--lfip) cannot be approximated. It is computed from exact IP '
+                           'counts, which need memory proportional to the number of distinct IPs')
+        return functools.partial(ApproximateLogStatisticsAccumulator, top_k_error=self.top_k_error,
+                                 distinct_error=self.distinct_error, exact_ip_counts=self.lfip,
+                                 eps_bucket=self.eps_series, primitives=primitives, max_memory=self.max_memory,
+                                 percentile_error=self.percentile_error)
+
+    def _plan(self) -> StatisticsPlan:
+        """
+        Returns the plan of the requested statistics, in the order they are added to the result.
+        """
+        return StatisticsPlan([statistic for statistic in STATISTICS if getattr(self, statistic)], self.eps_series,
+                              self.group_by or (), self.top, self.top_by, self.percentiles_by)
+
+    def _required_columns(self) -> List[str]:
+        """
+        Returns the log columns that the primitives of the requested statistics read. Only these are parsed.
+        """
+        return self._plan().columns
+
+    def _time_range_files(self, parser: 'BaseParser') -> List[TextIOWrapper]:
+        """
+        Returns the input files, with every file that can be searched by time replaced by the byte range of the file
+        that holds the time range of the parser.
+        """
+        input_files = []
+        for file in self.input_files:
+            path = file_path(file)
+            byte_range = None if path is None else self._time_range_bytes(path, parser)
+            if byte_range is None:
+                input_files.append(file)
+            else:
+                file.close()
+                input_files.append(TextIOWrapper(open_byte_range(path, *byte_range), encoding='utf-8'))
+        return input_files
+
+    def _time_range_bytes(self, path: str, parser: 'BaseParser') -> Optional[Tuple[int, int]]:
+        """
+        Returns the byte range of a log file that holds the time range of the parser, or None if the whole file needs to
+        be parsed.
+        """
+        if parser.time_range is None:
+            return None
+        if is_compressed(path):
+            logger.info(f'{path} is compressed and cannot be searched by time. Scanning it completely')
+            return None
+        with profiler.stage('seek'):
+            byte_range = parser.time_range.find_byte_range(path, parser.line_timestamp, self.time_index)
+        if byte_range is None:
+            logger.warning(f'{path} is not ordered by timestamp. Scanning it completely')
+        else:
+            logger.info(f'Parsing bytes {byte_range[0]} to {byte_range[1]} of {path} for the time range')
+        return byte_range
+
+    def _input_paths(self) -> Optional[List[str]]:
+        paths = [file_path(file) for file in self.input_files]
+        if None in paths:
+            logger.warning('Parallel parsing requires regular input files. Falling back to a single process')
+            return None
+        return paths
+
+    def _collect_results(self, log_statistics: StatisticsEngine) -> Dict:
+        results = {}
+
+        plan = self._plan()
+        for statistic in plan.statistics:
+            with profiler.stage(statistic):
+                results[statistic] = plan.compute(statistic, log_statistics)
+            logger.info(f'Adding {STATISTICS[statistic].description} to result')
+        error_bounds = {statistic: bounds for statistic, bounds in log_statistics.error_bounds().items()
+                        if getattr(self, statistic)}
+        if error_bounds:
+            results['error_bounds'] = error_bounds
+            logger.info('Adding error bounds of approximate statistics to result')
+        description = log_statistics.description()
+        if description is not None:
+            if 'from_sample' in description:
+                description['from_sample'] = [statistic for statistic in description['from_sample']
+                                              if getattr(self, statistic)]
+            results['approximate'] = description
+            logger.info('Adding description of the sample (--sample) that the statistics are estimated from to result')
+
+        return results
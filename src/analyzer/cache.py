@@ -0,0 +1,304 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import uuid
+from io import TextIOWrapper
+from typing import BinaryIO, Dict, Iterator, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from analyzer.defaults import DEFAULT_CACHE_MAX_SIZE
+from analyzer.files import file_identity, file_path
+from analyzer.parsing import BaseParser
+from analyzer.profiling import profiler
+
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT_VERSION = 1
+META_FILE = 'meta.json'
+
+
+class CacheEntryWriter:
+    """
+    Writes the cleaned dataframes of one log file into a new cache entry, chunk by chunk. Timestamps and numeric columns
+    are written as raw int64 or float64 arrays, string columns as int32 codes plus a list of categories in order of
+    first appearance. The entry only becomes visible on commit.
+
+    Parameters:
+        cache: The cache that the entry is written to.
+        key: Key of the entry.
+        meta: Identity of the file stored with the entry.
+    """
+
+    def __init__(self, cache: 'ParseCache', key: str, meta: Dict):
+        self.cache = cache
+        self.key = key
+        self.meta = meta
+        self.row_count = 0
+        self.dtypes: Dict[str, str] = {}
+        self.categories: Dict[str, pd.Index] = {}
+        self.consistent = True
+        self.directory = os.path.join(cache.cache_dir, f'.tmp-{uuid.uuid4().hex}')
+        os.makedirs(self.directory)
+        self._column_files: Dict[str, BinaryIO] = {}
+
+    def append(self, dataframe: pd.DataFrame) -> None:
+        """
+        Append a cleaned dataframe to the entry.
+        """
+        for column in dataframe.columns:
+            series = dataframe[column]
+            if column not in self._column_files:
+                self._column_files[column] = open(os.path.join(self.directory, f'{column}.bin'), 'wb')
+            dtype = self.dtypes.setdefault(column, str(series.dtype))
+            if dtype != str(series.dtype):
+                # Chunks of one file can be parsed to different numeric dtypes (e.g., Int64 and Float64). Such files
+                # are not cached rather than storing columns with mixed types.
+                self.consistent = False
+                return
+            self._column_files[column].write(self._encode(column, series).tobytes())
+        self.row_count += len(dataframe)
+
+    def commit(self) -> None:
+        """
+        Make the entry visible in the cache, replacing an existing entry with the same key.
+        """
+        if not self.consistent:
+            logger.info(f'Not caching {self.meta["identity"]} because its columns have inconsistent types')
+            self.abort()
+            return
+        self._close_column_files()
+        for column, categories in self.categories.items():
+            with open(os.path.join(self.directory, f'{column}.categories'), 'w', encoding='utf-8') as categories_file:
+                # Fields of line based logs cannot contain a newline, so it is safe to use as delimiter.
+                categories_file.write('\n'.join(categories))
+        self.meta.update(row_count=self.row_count, dtypes=self.dtypes,
+                         size_bytes=sum(entry.stat().st_size for entry in os.scandir(self.directory)))
+        with open(os.path.join(self.directory, META_FILE), 'w') as meta_file:
+            json.dump(self.meta, meta_file)
+        self.cache.replace_entry(self.key, self.directory)
+
+    def abort(self) -> None:
+        """
+        Discard the entry.
+        """
+        self._close_column_files()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _encode(self, column: str, series: pd.Series) -> np.ndarray:
+        if column == 'timestamp':
+            return series.to_numpy(dtype='datetime64[ns]').view('int64')
+        if pd.api.types.is_numeric_dtype(series):
+            return series.to_numpy(dtype=storage_dtype(str(series.dtype)))
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes, series_categories = series.cat.codes.to_numpy(), series.cat.categories
+        else:
+            codes, series_categories = pd.factorize(series)
+        categories = pd.Index(series_categories, dtype=object)
+        if column in self.categories:
+            categories = self.categories[column].append(categories.difference(self.categories[column], sort=False))
+        self.categories[column] = categories
+        return categories.get_indexer(series_categories).astype('int32')[codes]
+
+    def _close_column_files(self) -> None:
+        for column_file in self._column_files.values():
+            column_file.close()
+
+
+def storage_dtype(dtype: str) -> str:
+    """
+    Returns the NumPy dtype a column of the given pandas dtype is stored as.
+    """
+    if dtype.startswith('datetime64'):
+        return 'int64'
+    if pd.api.types.is_float_dtype(pd.api.types.pandas_dtype(dtype)):
+        return 'float64'
+    if pd.api.types.is_numeric_dtype(pd.api.types.pandas_dtype(dtype)):
+        return 'int64'
+    return 'int32'
+
+
+class ParseCache:
+    """
+    On-disk cache of cleaned log dataframes, one entry per log file. Entries are keyed by the file path and validated
+    against the file size, modification time and a content fingerprint, so entries of files that have been appended to
+    or replaced are never used. Columns are memory-mapped when an entry is read. If the cache grows beyond its maximum
+    size, the least recently used entries are evicted.
+
+    Parameters:
+        cache_dir: Directory holding the cache entries. Created if it does not exist.
+        max_size: Maximum size of all entries in bytes.
+    """
+
+    def __init__(self, cache_dir: str, max_size: int = DEFAULT_CACHE_MAX_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def entry_key(self, path: str, parser_config: str) -> str:
+        return hashlib.blake2b(f'{os.path.abspath(path)}|{parser_config}'.encode(), digest_size=16).hexdigest()
+
+    def lookup(self, key: str, identity: Dict) -> Optional[Dict]:
+        """
+        Returns the metadata of a valid entry for the given file identity, or None.
+        """
+        meta_path = os.path.join(self.cache_dir, key, META_FILE)
+        try:
+            with open(meta_path) as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+        if meta.get('version') != CACHE_FORMAT_VERSION or meta.get('identity') != identity:
+            return None
+        # The modification time of the metadata file tracks the last use of an entry for the LRU eviction.
+        os.utime(meta_path)
+        return meta
+
+    def writer(self, key: str, identity: Dict) -> CacheEntryWriter:
+        return CacheEntryWriter(self, key, {'version': CACHE_FORMAT_VERSION, 'identity': identity})
+
+    def read_chunks(self, key: str, meta: Dict, chunk_size: int) -> Iterator[pd.DataFrame]:
+        """
+        Read an entry as dataframes with at most chunk_size rows each. Columns are memory-mapped, so only the rows of
+        the current chunk are loaded.
+        """
+        directory = os.path.join(self.cache_dir, key)
+        row_count = meta['row_count']
+        dtypes = meta['dtypes']
+        columns = {column: self._map_column(directory, column, dtype, row_count) for column, dtype in dtypes.items()}
+        categories = {}
+        for column in dtypes:
+            if storage_dtype(dtypes[column]) == 'int32' and row_count > 0:
+                with open(os.path.join(directory, f'{column}.categories'), encoding='utf-8') as categories_file:
+                    categories[column] = np.array(categories_file.read().split('\n'), dtype=object)
+
+        for start in range(0, max(row_count, 1), chunk_size):
+            end = min(start + chunk_size, row_count)
+            yield pd.DataFrame({column: self._decode(dtypes[column], columns[column][start:end], categories.get(column))
+                                for column in dtypes})
+
+    def replace_entry(self, key: str, directory: str) -> None:
+        entry_directory = os.path.join(self.cache_dir, key)
+        shutil.rmtree(entry_directory, ignore_errors=True)
+        os.replace(directory, entry_directory)
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Remove the least recently used entries until the cache fits into its maximum size.
+        """
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            meta_path = os.path.join(entry.path, META_FILE)
+            if entry.name.startswith('.') or not os.path.exists(meta_path):
+                continue
+            with open(meta_path) as meta_file:
+                size = json.load(meta_file).get('size_bytes', 0)
+            entries.append((os.stat(meta_path).st_mtime_ns, size, entry.path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total_size -= size
+            logger.info(f'Evicted cache entry {path}')
+
+    @staticmethod
+    def _map_column(directory: str, column: str, dtype: str, row_count: int) -> np.ndarray:
+        if row_count == 0:
+            return np.empty(0, dtype=storage_dtype(dtype))
+        return np.memmap(os.path.join(directory, f'{column}.bin'), dtype=storage_dtype(dtype), mode='r',
+                         shape=(row_count,))
+
+    @staticmethod
+    def _decode(dtype: str, values: np.ndarray, categories: Optional[np.ndarray]) -> pd.Series:
+        if dtype.startswith('datetime64'):
+            return pd.Series(np.asarray(values).view(dtype))
+        if storage_dtype(dtype) != 'int32':
+            return pd.Series(np.asarray(values), dtype=dtype)
+        if categories is None:
+            return pd.Series([], dtype=dtype)
+        return pd.Series(categories[values], dtype=dtype)
+
+
+class CachingParser(BaseParser):
+    """
+    Parser that serves log files from a ParseCache and delegates to another parser on a cache miss. The result of the
+    other parser is written to the cache. Inputs that are not regular files on disk (e.g., stdin) bypass the cache.
+
+    Parameters:
+        parser: The parser used on a cache miss.
+        cache: The cache.
+    """
+
+    def __init__(self, parser: BaseParser, cache: ParseCache):
+        self.parser = parser
+        self.cache = cache
+        super().__init__(parser.timestamp_unit)
+
+    def parse_files_to_dataframe(self, files: Sequence[TextIOWrapper]) -> pd.DataFrame:
+        """
+        Parse log files to a single dataframe, reading cached files from the cache.
+        """
+        log_dataframe = self._concat([chunk for file in files for chunk in self._parse_file(file, chunk_size=None)])
+        logger.info(f'Parsed {len(log_dataframe)} log lines')
+
+        return log_dataframe
+
+    def parse_files_to_chunks(self, files: Sequence[TextIOWrapper], chunk_size: int) -> Iterator[pd.DataFrame]:
+        """
+        Parse log files to a sequence of dataframes with at most chunk_size rows each, reading cached files from the
+        cache.
+        """
+        for file in files:
+            yield from self._parse_file(file, chunk_size)
+
+    def _parse_file(self, file: TextIOWrapper, chunk_size: Optional[int]) -> Iterator[pd.DataFrame]:
+        path = file_path(file)
+        if path is None:
+            yield from self._parse_with_parser(self.parser, file, chunk_size)
+            return
+
+        # Parsers of different input formats can have the same attributes, so the type of the parser that parses the
+        # file is part of the key.
+        parser = self.parser.file_parser(file)
+        key = self.cache.entry_key(path, f'{type(parser).__qualname__}|{vars(parser)!r}')
+        identity = file_identity(path)
+        meta = self.cache.lookup(key, identity)
+        if meta is not None:
+            logger.info(f'Reading {meta["row_count"]} cached log lines of {path}')
+            chunks = self.cache.read_chunks(key, meta, chunk_size or max(meta['row_count'], 1))
+            while True:
+                with profiler.stage('cache_read') as stage:
+                    dataframe = next(chunks, None)
+                    stage.record(rows_out=0 if dataframe is None else len(dataframe))
+                if dataframe is None:
+                    return
+                yield dataframe
+
+        writer = self.cache.writer(key, identity)
+        try:
+            for dataframe in self._parse_with_parser(parser, file, chunk_size):
+                with profiler.stage('cache_write', rows_in=len(dataframe)):
+                    writer.append(dataframe)
+                yield dataframe
+        except BaseException:
+            writer.abort()
+            raise
+        if file_identity(path) == identity:
+            writer.commit()
+        else:
+            logger.warning(f'{path} changed while it was parsed. Not caching it')
+            writer.abort()
+
+    @staticmethod
+    def _parse_with_parser(parser: BaseParser, file: TextIOWrapper,
+                           chunk_size: Optional[int]) -> Iterator[pd.DataFrame]:
+        if chunk_size is None:
+            yield parser.parse_files_to_dataframe([file])
+        else:
+            yield from parser.parse_files_to_chunks([file], chunk_size)
@@ -0,0 +1,19 @@
+import os
+
+# Defaults of the options of the command line. They are kept apart from the modules that use them, which import pandas,
+# so the command line can build its argument parser (e.g., for --help) without importing pandas.
+
+# Parser engines (--engine), see analyzer.parsing
+ENGINES = ['pandas', 'fast']
+DEFAULT_CACHE_MAX_SIZE = 1024 * 1024 * 1024
+DEFAULT_TOP_K_ERROR = 0.0001
+DEFAULT_DISTINCT_ERROR = 0.01
+DEFAULT_PERCENTILE_ERROR = 0.01
+
+
+def default_cache_dir() -> str:
+    """
+    Returns the default cache directory, following the XDG base directory specification.
+    """
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'log-analyzer')
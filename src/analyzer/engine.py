@@ -0,0 +1,225 @@
+import abc
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Union
+
+# This module is imported by the command line before any statistics are computed, so it must not import pandas or
+# numpy (see analyzer.statistics for the pandas engine).
+
+COLUMNS = ['timestamp', 'response_header_size', 'client_ip', 'response_code', 'response_size', 'request_method', 'url',
+           'username', 'access_destination_ip', 'response_type']
+NUMERIC_COLUMNS = ['timestamp', 'response_header_size', 'response_size']
+GROUP_METRICS = ['requests', 'bytes']
+# Dimensions that log entries can be grouped by (--group-by), see analyzer.statistics.GROUP_BY_DIMENSIONS
+DIMENSIONS = ['client_ip', 'response_code', 'request_method', 'username', 'host']
+# Host of a URL, with or without scheme and user info (e.g., 'login.yahoo.com' for 'login.yahoo.com:443').
+URL_HOST_PATTERN = r'^(?:[A-Za-z][A-Za-z0-9+.-]*://)?(?:[^@/]*@)?([^/:?#]*)'
+# Engines that compute the statistics: 'pandas' parses the log files into dataframes (see analyzer.statistics),
+# 'python' aggregates their lines one by one without importing pandas (see analyzer.pure), and 'auto' chooses 'python'
+# for inputs of at most SMALL_INPUT_SIZE bytes that it supports.
+# Measured with benchmarks/bench_startup.py, the two engines break even at about 10 MiB (e.g., 1.0 s and 1.3 s for 9
+# MiB), so 'auto' switches to 'pandas' above 8 MiB to stay on the safe side of the break-even point.
+STATISTICS_ENGINES = ['auto', 'pandas', 'python']
+SMALL_INPUT_SIZE = 8 * 1024 * 1024
+# Percentiles (--percentiles) of the elapsed time in milliseconds (which Squid logs in the field that is called
+# response_header_size here) and of the response size. They can be broken down by the keys of a dimension with few
+# distinct keys (--percentiles-by).
+PERCENTILES = [50, 90, 99, 99.9]
+PERCENTILE_COLUMNS = ['response_header_size', 'response_size']
+PERCENTILE_DIMENSIONS = ['response_code', 'request_method']
+
+
+class StatisticsEngine(abc.ABC):
+    """
+    Interface of the engines that compute the statistics of a StatisticsPlan (see STATISTICS) once all log entries have
+    been aggregated. Engines that approximate statistics describe their error bounds and how they approximate them.
+
+    Raises:
+        ValueError: If a statistic is requested that the engine has not aggregated.
+        ZeroDivisionError: If events_per_second is requested and all log entries are from the same second.
+    """
+
+    @abc.abstractmethod
+    def most_frequent_ip(self) -> str:
+        pass
+
+    @abc.abstractmethod
+    def least_frequent_ip(self) -> str:
+        pass
+
+    @abc.abstractmethod
+    def distinct_ip_count(self) -> int:
+        pass
+
+    @abc.abstractmethod
+    def events_per_second(self) -> float:
+        pass
+
+    @abc.abstractmethod
+    def total_amount_of_bytes_exchanged(self) -> int:
+        pass
+
+    @abc.abstractmethod
+    def eps_series(self, bucket: str) -> Dict:
+        pass
+
+    @abc.abstractmethod
+    def group_breakdown(self, dimension: str, top: Optional[int] = None, top_by: str = 'requests') -> List[Dict]:
+        pass
+
+    @abc.abstractmethod
+    def percentiles(self, by: Optional[str] = None) -> Dict:
+        pass
+
+    def error_bounds(self) -> Dict[str, Dict]:
+        """
+        Returns the error bounds of approximated statistics by statistic, or an empty dict if all are exact.
+        """
+        return {}
+
+    def description(self) -> Optional[Dict]:
+        """
+        Returns a description of how the statistics were approximated (e.g., of the sample they were estimated from),
+        or None if they are exact.
+        """
+        return None
+
+    def close(self) -> None:
+        """
+        Release the resources of the engine, e.g., temporary files.
+        """
+
+
+def group_primitive(dimension: str) -> str:
+    """
+    Returns the name of the primitive with the group totals of a dimension.
+    """
+    return f'group_totals:{dimension}'
+
+
+def percentile_primitive(dimension: Optional[str] = None) -> str:
+    """
+    Returns the name of the primitive with the percentiles of the PERCENTILE_COLUMNS, overall or per key of a dimension.
+    """
+    return 'size_quantiles' if dimension is None else f'size_quantiles:{dimension}'
+
+
+def percentile_rank(count: int, percentile: float) -> int:
+    """
+    Returns the rank (from 0) in ascending order of the value that is reported as a percentile of count values:
+    floor(percentile / 100 * (count - 1)), like the 'lower' method of np.percentile, but in exact integer arithmetic
+    so that all statistics engines agree.
+    """
+    return (count - 1) * round(percentile * 1000) // 100000
+
+
+def percentile_summary(values: Optional[Sequence[Union[int, float]]]) -> Dict[str, Optional[Union[int, float]]]:
+    """
+    Returns the values at the ranks of the PERCENTILES followed by the maximum by name (e.g., 'p99.9' and 'max'), with
+    whole numbers as int. All values are None if there are no values (None).
+    """
+    names = [f'p{percentile:g}' for percentile in PERCENTILES] + ['max']
+    if values is None:
+        return dict.fromkeys(names)
+    return {name: int(value) if float(value).is_integer() else float(value) for name, value in zip(names, values)}
+
+
+class Statistic(NamedTuple):
+    """
+    A statistic that can be requested from the analyzer.
+
+    Parameters:
+        primitives: Names of the primitive aggregates (see analyzer.statistics.PRIMITIVES) that the statistic is
+        computed from.
+        compute: Computes the statistic from a StatisticsEngine, given the plan.
+        description: Description used in log messages.
+    """
+    primitives: List[str]
+    compute: Callable[[StatisticsEngine, 'StatisticsPlan'], Any]
+    description: str
+
+
+# New statistics are added here, declaring the primitives they depend on.
+STATISTICS: Dict[str, Statistic] = {
+    'mfip': Statistic(['ip_counts'], lambda log_statistics, plan: log_statistics.most_frequent_ip(),
+                      'most frequent IP (--mfip)'),
+    'lfip': Statistic(['ip_counts'], lambda log_statistics, plan: log_statistics.least_frequent_ip(),
+                      'least frequent IP (--lfip)'),
+    'eps': Statistic(['row_count', 'timestamp_range'], lambda log_statistics, plan: log_statistics.events_per_second(),
+                     'events per second (--eps)'),
+    'bytes': Statistic(['size_sums'], lambda log_statistics, plan: log_statistics.total_amount_of_bytes_exchanged(),
+                       'total amount of bytes exchanged (--bytes)'),
+    'distinct_ips': Statistic(['ip_counts'], lambda log_statistics, plan: log_statistics.distinct_ip_count(),
+                              'number of distinct IPs (--distinct-ips)'),
+    'eps_series': Statistic(['bucket_counts'], lambda log_statistics, plan: log_statistics.eps_series(plan.eps_bucket),
+                            'events and bytes per time bucket (--eps-series)'),
+    # The primitives of group_by depend on the requested dimensions, see StatisticsPlan.
+    'group_by': Statistic([], lambda log_statistics, plan: {
+        dimension: log_statistics.group_breakdown(dimension, plan.top, plan.top_by) for dimension in plan.group_by},
+                          'requests and bytes per group (--group-by)'),
+    # The primitives of the breakdown of percentiles depend on the requested dimension, see StatisticsPlan.
+    'percentiles': Statistic([percentile_primitive()],
+                             lambda log_statistics, plan: log_statistics.percentiles(plan.percentiles_by),
+                             'percentiles of elapsed times and response sizes (--percentiles)'),
+}
+
+
+class StatisticsPlan:
+    """
+    Plan of the primitive aggregates that the requested statistics are computed from. A primitive that several
+    statistics depend on (e.g., the IP counts of the most and least frequent IP) is computed only once, and only the
+    primitives of the requested statistics are computed at all.
+
+    Parameters:
+        statistics: Names of the requested statistics, see STATISTICS.
+        eps_bucket: Bucket size of eps_series (e.g., '1min'). Required if eps_series is requested.
+        group_by: Dimensions of group_by, see DIMENSIONS. Required if group_by is requested.
+        top: If set, group_by only returns this number of keys per dimension.
+        top_by: Metric by which group_by orders the keys: 'requests' or 'bytes'.
+        percentiles_by: If set, percentiles are also broken down by the keys of this dimension, see
+        PERCENTILE_DIMENSIONS.
+    Raises:
+        ValueError: If a statistic, dimension or metric is unknown, or if eps_series or group_by is requested without
+        its parameters.
+    """
+
+    def __init__(self, statistics: Sequence[str], eps_bucket: Optional[str] = None, group_by: Sequence[str] = (),
+                 top: Optional[int] = None, top_by: str = 'requests', percentiles_by: Optional[str] = None):
+        unknown_statistics = [statistic for statistic in statistics if statistic not in STATISTICS]
+        if unknown_statistics:
+            raise ValueError(f'Unknown statistics: {unknown_statistics}')
+        if 'eps_series' in statistics and eps_bucket is None:
+            raise ValueError('eps_series requires a bucket size.')
+        unknown_dimensions = [dimension for dimension in group_by if dimension not in DIMENSIONS]
+        if unknown_dimensions:
+            raise ValueError(f'Unknown dimensions: {unknown_dimensions}')
+        if 'group_by' in statistics and not group_by:
+            raise ValueError('group_by requires at least one dimension.')
+        if top_by not in GROUP_METRICS:
+            raise ValueError(f'Unknown metric: {top_by}')
+        if percentiles_by is not None and percentiles_by not in PERCENTILE_DIMENSIONS:
+            raise ValueError(f'Percentiles cannot be broken down by {percentiles_by}, only by one of '
+                             f'{", ".join(PERCENTILE_DIMENSIONS)}')
+        self.statistics = list(statistics)
+        self.eps_bucket = eps_bucket
+        self.group_by = list(dict.fromkeys(group_by)) if 'group_by' in statistics else []
+        self.top = top
+        self.top_by = top_by
+        self.percentiles_by = percentiles_by if 'percentiles' in statistics else None
+        primitives = [primitive for statistic in self.statistics for primitive in STATISTICS[statistic].primitives]
+        primitives.extend(group_primitive(dimension) for dimension in self.group_by)
+        if self.percentiles_by is not None:
+            primitives.append(percentile_primitive(self.percentiles_by))
+        self.primitives = list(dict.fromkeys(primitives))
+
+    @property
+    def columns(self) -> List[str]:
+        """
+        Returns the columns of the log dataframe that the planned primitives read.
+        """
+        from analyzer.statistics import PRIMITIVES
+        return list(dict.fromkeys(column for primitive in self.primitives for column in PRIMITIVES[primitive].columns))
+
+    def compute(self, statistic: str, log_statistics: StatisticsEngine) -> Any:
+        """
+        Returns a planned statistic, computed from the aggregates of a StatisticsEngine.
+        """
+        return STATISTICS[statistic].compute(log_statistics, self)
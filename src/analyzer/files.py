@@ -0,0 +1,325 @@
+import bz2
+import gzip
+import hashlib
+import io
+import lzma
+import os
+import queue
+import sys
+import threading
+from io import TextIOWrapper
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
+
+# Magic bytes at the start of compressed files
+COMPRESSION_MAGIC = {
+    'gzip': b'\x1f\x8b',
+    'bz2': b'BZh',
+    'xz': b'\xfd7zXZ\x00',
+    'zstd': b'\x28\xb5\x2f\xfd',
+}
+DECOMPRESSION_BLOCK_SIZE = 1024 * 1024
+# Number of decompressed blocks the background thread may read ahead of the parser
+DECOMPRESSION_QUEUE_SIZE = 8
+FINGERPRINT_BLOCK_SIZE = 64 * 1024
+
+
+class ByteRangeReader(io.RawIOBase):
+    """
+    Read-only binary file restricted to the byte range [start, end) of a file on disk. Can be handed to parsers like
+    any other binary file, so only the requested part of a file is read.
+
+    Parameters:
+        path: Path to the file on disk.
+        start: Offset of the first byte to read.
+        end: Offset after the last byte to read.
+    """
+
+    def __init__(self, path: str, start: int, end: int):
+        super().__init__()
+        self.name = path
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self.start = start
+        self._remaining = max(end - start, 0)
+
+    def readable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        """
+        Returns the number of bytes read from the range.
+        """
+        return self._file.tell() - self.start
+
+    def readinto(self, buffer) -> int:
+        if self._remaining == 0:
+            return 0
+        view = memoryview(buffer)[:self._remaining]
+        read_count = self._file.readinto(view)
+        self._remaining -= read_count
+        return read_count
+
+    def close(self) -> None:
+        self._file.close()
+        super().close()
+
+
+class BackgroundReader(io.RawIOBase):
+    """
+    Read-only binary file that reads another file in blocks in a background thread, ahead of the consumer. For a
+    decompressing file, decompression (which releases the GIL) overlaps with parsing. The thread is started on the
+    first read and holds at most queue_size blocks.
+
+    Parameters:
+        file: The binary file to read.
+        name: Name of the file (e.g., its path).
+        block_size: Number of bytes read from the file at a time.
+        queue_size: Maximum number of blocks read ahead.
+    """
+
+    def __init__(self, file: BinaryIO, name: str, block_size: int = DECOMPRESSION_BLOCK_SIZE,
+                 queue_size: int = DECOMPRESSION_QUEUE_SIZE):
+        super().__init__()
+        self.name = name
+        self._file = file
+        self._block_size = block_size
+        self._blocks: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._block = memoryview(b'')
+        self._position = 0
+        self._is_at_end = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def readable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        """
+        Returns the number of (decompressed) bytes read so far.
+        """
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._read_blocks, name=f'reader-{self.name}', daemon=True)
+            self._thread.start()
+        while len(self._block) == 0 and not self._is_at_end:
+            block = self._blocks.get()
+            if isinstance(block, BaseException):
+                raise block
+            self._block = memoryview(block)
+            self._is_at_end = len(block) == 0
+        read_count = min(len(buffer), len(self._block))
+        memoryview(buffer)[:read_count] = self._block[:read_count]
+        self._block = self._block[read_count:]
+        self._position += read_count
+        return read_count
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            # Unblock the thread if it waits for space in the queue
+            while self._thread.is_alive():
+                try:
+                    self._blocks.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+        self._file.close()
+        super().close()
+
+    def _read_blocks(self) -> None:
+        while not self._stop.is_set():
+            try:
+                block: Union[bytes, BaseException] = self._file.read(self._block_size)
+            except Exception as error:
+                block = error
+            self._put(block)
+            if not block or isinstance(block, BaseException):
+                return
+
+    def _put(self, block: Union[bytes, BaseException]) -> None:
+        while not self._stop.is_set():
+            try:
+                self._blocks.put(block, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+
+def detect_compression(file: BinaryIO) -> Optional[str]:
+    """
+    Returns the compression format of a buffered binary file based on its magic bytes (see COMPRESSION_MAGIC), or None
+    if the file is not compressed. The file position is not changed.
+    """
+    header = file.peek(max(len(magic) for magic in COMPRESSION_MAGIC.values()))
+    for compression, magic in COMPRESSION_MAGIC.items():
+        if header.startswith(magic):
+            return compression
+    return None
+
+
+def is_compressed(path: str) -> bool:
+    """
+    Returns True if the file at path is compressed in one of the formats of COMPRESSION_MAGIC.
+    """
+    with open(path, 'rb') as file:
+        return detect_compression(file) is not None
+
+
+def open_decompressed(file: BinaryIO, compression: str) -> BinaryIO:
+    """
+    Wrap a binary file in a file that decompresses it on the fly. Files that consist of several compressed members
+    (gzip) or frames (zstd), as produced by appending compressed files, are read completely.
+
+    Raises:
+        ValueError: If the compression format is unknown or its library (zstandard) is not installed.
+    """
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=file, mode='rb')
+    if compression == 'bz2':
+        return bz2.BZ2File(file, mode='rb')
+    if compression == 'xz':
+        return lzma.LZMAFile(file, mode='rb')
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError('Reading zstd compressed files requires the zstandard package')
+        return zstandard.ZstdDecompressor().stream_reader(file, read_across_frames=True, closefd=True)
+    raise ValueError(f'Unknown compression format {compression}')
+
+
+def open_log_file(path: str) -> TextIOWrapper:
+    """
+    Open a log file as UTF-8 text. '-' refers to stdin. Compressed files are detected by their magic bytes and
+    decompressed on the fly in a background thread, without a temporary file.
+    """
+    binary_file = sys.stdin.buffer if path == '-' else open(path, 'rb')
+    name = '<stdin>' if path == '-' else path
+    compression = detect_compression(binary_file)
+    if compression is not None:
+        reader = BackgroundReader(open_decompressed(binary_file, compression), name)
+        binary_file = io.BufferedReader(reader, buffer_size=DECOMPRESSION_BLOCK_SIZE)
+    return TextIOWrapper(binary_file, encoding='utf-8')
+
+
+def open_byte_range(path: str, start: int, end: int) -> BinaryIO:
+    """
+    Open the byte range [start, end) of a file as a buffered binary file.
+    """
+    return io.BufferedReader(ByteRangeReader(path, start, end))
+
+
+def align_to_line_start(file: BinaryIO, offset: int) -> int:
+    """
+    Returns the offset of the first line that starts at or after the given offset. The file position is changed.
+    """
+    if offset <= 0:
+        file.seek(0)
+        return 0
+    file.seek(offset - 1)
+    file.readline()
+    return file.tell()
+
+
+def last_line_end(file: BinaryIO, start: int, end: int) -> int:
+    """
+    Returns the offset after the last newline in the byte range [start, end) of a file, or start if the range holds no
+    newline. The file is read backwards from end in blocks. The file position is changed.
+    """
+    block_end = end
+    while block_end > start:
+        block_start = max(block_end - FINGERPRINT_BLOCK_SIZE, start)
+        file.seek(block_start)
+        newline = file.read(block_end - block_start).rfind(b'\n')
+        if newline >= 0:
+            return block_start + newline + 1
+        block_end = block_start
+    return start
+
+
+def count_newlines(path: str, start: int, end: int) -> int:
+    """
+    Returns the number of newlines in the byte range [start, end) of a file, read in blocks.
+    """
+    newline_count = 0
+    with open(path, 'rb') as file:
+        file.seek(start)
+        remaining = max(end - start, 0)
+        while remaining > 0:
+            block = file.read(min(remaining, DECOMPRESSION_BLOCK_SIZE))
+            if not block:
+                break
+            newline_count += block.count(b'\n')
+            remaining -= len(block)
+    return newline_count
+
+
+def split_into_line_ranges(path: str, range_size: int, start: int = 0,
+                           end: Optional[int] = None) -> List[Tuple[int, int]]:
+    """
+    Split a file, or its byte range [start, end) if start is a line start, into consecutive byte ranges of roughly
+    range_size bytes. Every range starts at the beginning of a line and ends after a newline (or at the end), so no
+    line is split between two ranges.
+    """
+    end = os.path.getsize(path) if end is None else end
+    boundaries = [start]
+    with open(path, 'rb') as file:
+        while boundaries[-1] < end:
+            boundary = align_to_line_start(file, boundaries[-1] + range_size)
+            boundaries.append(min(boundary, end))
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def file_identity(path: str) -> Dict:
+    """
+    Returns the identity of a file on disk: size, modification time and a fingerprint of its first and last block.
+    A file that is appended to or replaced gets a different identity.
+    """
+    stat = os.stat(path)
+    digest = hashlib.blake2b(str(stat.st_size).encode(), digest_size=16)
+    with open(path, 'rb') as file:
+        digest.update(file.read(FINGERPRINT_BLOCK_SIZE))
+        if stat.st_size > FINGERPRINT_BLOCK_SIZE:
+            file.seek(max(stat.st_size - FINGERPRINT_BLOCK_SIZE, FINGERPRINT_BLOCK_SIZE))
+            digest.update(file.read())
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'fingerprint': digest.hexdigest()}
+
+
+def peek_text(file: Union[TextIOWrapper, BinaryIO], size: int) -> str:
+    """
+    Returns the text of up to size bytes (or characters of a text stream without a binary buffer) from the current
+    position of a file, without consuming them: buffered binary files, and text files on top of them, are peeked,
+    other files are read and rewound. Fewer bytes are returned if fewer are buffered (e.g., of a pipe), and none if the
+    file can neither be peeked nor rewound. A character that is cut off at the end is dropped.
+    """
+    binary_file = getattr(file, 'buffer', file)
+    if hasattr(binary_file, 'peek'):
+        sample = binary_file.peek(size)[:size]
+    elif binary_file.seekable():
+        position = binary_file.tell()
+        sample = binary_file.read(size)
+        binary_file.seek(position)
+    else:
+        return ''
+    return sample.decode('utf-8', errors='ignore') if isinstance(sample, bytes) else sample
+
+
+def file_path(file: TextIOWrapper) -> Optional[str]:
+    """
+    Returns the path of a file object if it refers to a regular file on disk, otherwise None (e.g., stdin or an
+    in-memory stream).
+    """
+    path = getattr(file, 'name', None)
+    if isinstance(path, str) and os.path.isfile(path):
+        return path
+    return None
+
+
+def byte_range_start(file: Union[TextIOWrapper, BinaryIO]) -> int:
+    """
+    Returns the offset in its file on disk at which a file object opened with open_byte_range starts, or 0 for any
+    other file object.
+    """
+    raw_file = getattr(getattr(file, 'buffer', file), 'raw', None)
+    return raw_file.start if isinstance(raw_file, ByteRangeReader) else 0
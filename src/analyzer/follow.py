@@ -0,0 +1,88 @@
+import logging
+import os
+from typing import BinaryIO, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_READ_SIZE = 64 * 1024 * 1024
+# Number of seconds to wait for new lines once all followed files have been read completely.
+FOLLOW_POLL_INTERVAL = 1.0
+
+
+class LogFollower:
+    """
+    Follow a growing log file like tail -F. Every call to read_lines returns only the complete lines that were
+    appended since the last call, so the cost of a call is proportional to the new data. The follower detects:
+    - rotation: the path refers to a new file (different device or inode). The rest of the old file is read first,
+      then the new file is followed from its start.
+    - truncation: the file is smaller than the current offset. The file is followed again from its start.
+
+    Parameters:
+        path: Path to the log file.
+        read_size: Maximum number of bytes returned by a single call to read_lines.
+    """
+
+    def __init__(self, path: str, read_size: int = DEFAULT_READ_SIZE):
+        self.path = path
+        self.read_size = read_size
+        self.offset = 0
+        self._file: Optional[BinaryIO] = None
+        self._identity: Optional[Tuple[int, int]] = None
+
+    def read_lines(self) -> bytes:
+        """
+        Returns the next complete lines of the file (at most read_size bytes, but at least one line), or b'' if no
+        complete line was appended. An incomplete last line is returned once it is completed.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            # The file was rotated and the new file does not exist yet.
+            return self._read_rest_of_rotated_file()
+
+        if (stat.st_dev, stat.st_ino) != self._identity:
+            lines = self._read_rest_of_rotated_file()
+            if lines:
+                return lines
+            self._open(stat)
+        elif stat.st_size < self.offset:
+            logger.warning(f'{self.path} was truncated. Following it from the start')
+            self.offset = 0
+
+        return self._read(complete_lines_only=True)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _open(self, stat: os.stat_result) -> None:
+        if self._identity is not None:
+            logger.info(f'{self.path} was rotated. Following the new file from the start')
+        self._file = open(self.path, 'rb')
+        self._identity = (stat.st_dev, stat.st_ino)
+        self.offset = 0
+
+    def _read_rest_of_rotated_file(self) -> bytes:
+        """
+        Returns the lines that were appended to the open file before it was rotated. A rotated file does not grow
+        anymore, so its last line is complete even without a trailing newline.
+        """
+        if self._file is None:
+            return b''
+        lines = self._read(complete_lines_only=False)
+        if not lines:
+            self.close()
+        return lines
+
+    def _read(self, complete_lines_only: bool) -> bytes:
+        self._file.seek(self.offset)
+        data = self._file.read(self.read_size)
+        if len(data) == self.read_size and b'\n' not in data:
+            # A single line that is longer than read_size
+            data += self._file.readline()
+        at_end_of_file = len(data) < self.read_size
+        if complete_lines_only or not at_end_of_file:
+            data = data[:data.rfind(b'\n') + 1]
+        self.offset += len(data)
+        return data
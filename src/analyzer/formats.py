@@ -0,0 +1,56 @@
+import json
+import re
+
+# Like analyzer.engine, this module is imported by the command line and must not import pandas or numpy.
+
+# Formats of the input files (--input-format), see analyzer.parsing.PARSERS: 'squid' is the native format of Squid
+# access logs, 'combined' the combined (or common) log format of Apache and Nginx, and 'jsonl' one JSON object per line
+# with the COLUMNS of analyzer.engine as keys. 'auto' detects the format of every input file from a sample of its
+# first FORMAT_SAMPLE_SIZE bytes (see detect_input_format).
+INPUT_FORMATS = ['auto', 'squid', 'combined', 'jsonl']
+FORMAT_SAMPLE_SIZE = 16 * 1024
+# Start of a line of a Squid access log: timestamp, elapsed time, client IP, result code/status and size
+SQUID_PATTERN = re.compile(r'[ \t]*[0-9]+(?:\.[0-9]*)?[ \t]+-?[0-9]+[ \t]+[^ \t]+[ \t]+'
+                           r'[^ \t]+/[0-9]+[ \t]+-?[0-9]+[ \t]')
+# Fields of a line of the combined log format, named after the COLUMNS that they map to: host, identity (ignored), user,
+# time, request line (method, URL and protocol), status and size. Referer and user agent, which the common log format
+# lacks, are ignored. The expression means the same to Python's re and to RE2 (see CombinedLogParser).
+COMBINED_PATTERN = re.compile(r'^(?P<client_ip>[^ ]+) [^ ]+ (?P<username>[^ ]+) \[(?P<timestamp>[^\]]+)\] '
+                             r'"(?P<request_method>[^ "\\]*) ?(?P<url>[^ "\\]*)(?:[^"\\]|\\.)*" '
+                             r'(?P<response_code>[0-9]{3}) (?P<response_size>[^ \t\r\n]+)')
+COMBINED_TIMESTAMP_FORMAT = '%d/%b/%Y:%H:%M:%S %z'
+
+
+def is_json_object(line: str) -> bool:
+    """
+    Returns True if a line holds a JSON object.
+    """
+    if not line.lstrip().startswith('{'):
+        return False
+    try:
+        return isinstance(json.loads(line), dict)
+    except ValueError:
+        return False
+
+
+# Whether a line matches an input format, by format
+FORMAT_MATCHERS = {
+    'squid': lambda line: SQUID_PATTERN.match(line) is not None,
+    'combined': lambda line: COMBINED_PATTERN.match(line) is not None,
+    'jsonl': is_json_object,
+}
+
+
+def detect_input_format(sample: str) -> str:
+    """
+    Returns the input format that most non-blank lines of a sample from the start of a log file match (see
+    FORMAT_MATCHERS), of formats that match equally many lines the first of INPUT_FORMATS, or 'squid' if no line matches
+    any format. The last line of a sample that holds more than one line is ignored, as it may be cut off.
+    """
+    lines = sample.split('\n')
+    if len(lines) > 1:
+        lines = lines[:-1]
+    lines = [line for line in lines if line.strip()]
+    match_counts = {input_format: sum(map(matches, lines)) for input_format, matches in FORMAT_MATCHERS.items()}
+    best_format = max(match_counts, key=match_counts.__getitem__)
+    return best_format if match_counts[best_format] > 0 else 'squid'
@@ -1,14 +1,25 @@
+import abc
+import csv
 import json
 import logging
 from io import TextIOWrapper
-from typing import Dict
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Tuple
+
+# pandas is only imported by the writers that need dataframes, so writing JSON does not import it.
+if TYPE_CHECKING:
+    import pandas as pd
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of table rows that a streaming writer holds and writes at once
+BATCH_SIZE = 10_000
+# Columns of the tables written by CSVWriter and ParquetWriter
+TABLE_COLUMNS = ['table', 'key', 'requests', 'bytes']
+
 
-class JSONWriter:
+class BaseWriter(abc.ABC):
     """
-    Write results as JSON.
+    Base class for the writers of results.
 
     Parameters:
         output: io.TextIOWrapper to the output (e.g., sys.stdout or a file).
@@ -20,8 +31,166 @@ class JSONWriter:
         self.results = results
 
     def write(self) -> None:
+        """
+        Write the results to the output.
+        """
+        self._write()
+        logger.info(f'Wrote output to {self.output.name}')
+
+    @abc.abstractmethod
+    def _write(self) -> None:
+        pass
+
+
+class JSONWriter(BaseWriter):
+    """
+    Write results as JSON.
+
+    Parameters:
+        output: io.TextIOWrapper to the output (e.g., sys.stdout or a file).
+        results: Dictionary holding the results to be written.
+    """
+
+    def _write(self) -> None:
         """
         Write results as JSON formatted string to the output.
         """
         self.output.write(json.dumps(self.results))
-        logger.info(f'Wrote output to {self.output.name}')
+
+
+class NDJSONWriter(BaseWriter):
+    """
+    Write results as newline-delimited JSON: the first line holds the scalar results (the JSON of JSONWriter without
+    the tables, see split_tables), and every following line one row of a table, e.g.,
+    {"table": "group_by.client_ip", "key": "10.105.21.199", "requests": 3, "bytes": 37815}. Rows are written in batches
+    of BATCH_SIZE.
+    """
+
+    def _write(self) -> None:
+        scalars, tables = split_tables(self.results)
+        self.output.write(json.dumps(scalars) + '\n')
+        encoder = json.JSONEncoder()
+        for table, rows in tables:
+            # Every row is encoded once, with the table spliced in front of its keys.
+            prefix = f'{{"table": {encoder.encode(table)}, '
+            for batch in _batches(rows):
+                self.output.write(''.join(prefix + encoder.encode(row)[1:] + '\n' for row in batch))
+
+
+class CSVWriter(BaseWriter):
+    """
+    Write results as CSV with the columns TABLE_COLUMNS (see table_records): first a row per scalar result, then the
+    rows of every table. Rows are written in batches of BATCH_SIZE.
+    """
+
+    def _write(self) -> None:
+        scalars, tables = split_tables(self.results)
+        csv_writer = csv.writer(self.output, lineterminator='\n')
+        csv_writer.writerow(TABLE_COLUMNS)
+        csv_writer.writerows(_scalar_rows(scalars))
+        for table, rows in tables:
+            for batch in _batches(rows):
+                csv_writer.writerows((table, row['key'], row['requests'], row['bytes']) for row in batch)
+
+
+class ParquetWriter(BaseWriter):
+    """
+    Write results as a Parquet file with the columns TABLE_COLUMNS (see table_records), one row group per batch of
+    BATCH_SIZE rows. Requires the optional pyarrow package.
+
+    Raises:
+        ValueError: If pyarrow is not installed.
+    """
+
+    def _write(self) -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError('Writing Parquet requires the pyarrow package')
+        schema = pa.schema([('table', pa.string()), ('key', pa.string()), ('requests', pa.int64()),
+                            ('bytes', pa.int64())])
+        # Parquet is binary: write to the buffer below a text output.
+        self.output.flush()
+        binary_output = getattr(self.output, 'buffer', self.output)
+        with pq.ParquetWriter(binary_output, schema) as parquet_writer:
+            for batch in table_records(self.results):
+                parquet_writer.write_table(pa.Table.from_pandas(batch, schema=schema, preserve_index=False))
+        binary_output.flush()
+
+
+def split_tables(results: Dict) -> Tuple[Dict, List[Tuple[str, Iterator[Dict]]]]:
+    """
+    Returns the scalar results and the tabular results, which can have millions of rows. Tables are the keys per
+    dimension of group_by (named group_by.DIMENSION) and the buckets of eps_series (named eps_series, the key is the
+    start of the bucket and requests are its events). Every table is a lazy iterator of rows with the keys key,
+    requests and bytes. The summary of eps_series (e.g., its peak) stays in the scalar results.
+    """
+    scalars = dict(results)
+    tables = []
+    eps_series = scalars.get('eps_series')
+    if eps_series is not None:
+        scalars['eps_series'] = {name: value for name, value in eps_series.items() if name not in ['events', 'bytes']}
+        tables.append(('eps_series', _bucket_rows(eps_series)))
+    group_by = scalars.pop('group_by', None)
+    if group_by is not None:
+        tables.extend((f'group_by.{dimension}', iter(rows)) for dimension, rows in group_by.items())
+    return scalars, tables
+
+
+def table_records(results: Dict) -> Iterator['pd.DataFrame']:
+    """
+    Returns the results as batches of at most BATCH_SIZE rows with the columns TABLE_COLUMNS: first one row per scalar
+    result, with its path (e.g., error_bounds.bytes.standard_error) as table and its value (JSON-encoded unless it is a
+    string) as key, then the rows of the tables of split_tables.
+    """
+    import pandas as pd
+    scalars, tables = split_tables(results)
+    scalar_rows = list(_scalar_rows(scalars))
+    if scalar_rows:
+        yield pd.DataFrame(scalar_rows, columns=TABLE_COLUMNS).astype({'requests': 'Int64', 'bytes': 'Int64'})
+    for table, rows in tables:
+        for batch in _batches(rows):
+            yield pd.DataFrame(batch, columns=TABLE_COLUMNS[1:]).astype(
+                {'key': str, 'requests': 'Int64', 'bytes': 'Int64'}).assign(table=table)[TABLE_COLUMNS]
+
+
+# Writers by the name of their format (--format)
+WRITERS = {
+    'json': JSONWriter,
+    'ndjson': NDJSONWriter,
+    'csv': CSVWriter,
+    'parquet': ParquetWriter,
+}
+
+
+def _bucket_rows(eps_series: Dict) -> Iterator[Dict]:
+    import pandas as pd
+    starts = pd.Timestamp(eps_series['start']) + pd.Timedelta(eps_series['bucket']) * pd.RangeIndex(
+        len(eps_series['events']))
+    for start, events, bucket_bytes in zip(starts, eps_series['events'], eps_series['bytes']):
+        yield {'key': start.isoformat(), 'requests': events, 'bytes': bucket_bytes}
+
+
+def _batches(rows: Iterator[Dict]) -> Iterator[List[Dict]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _scalar_rows(scalars: Dict) -> Iterator[Tuple[str, str, None, None]]:
+    for path, value in _flatten(scalars):
+        yield path, value if isinstance(value, str) else json.dumps(value), None, None
+
+
+def _flatten(results: Dict, prefix: str = '') -> Iterator[Tuple[str, Any]]:
+    for name, value in results.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f'{prefix}{name}.')
+        else:
+            yield f'{prefix}{name}', value
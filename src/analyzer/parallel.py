@@ -0,0 +1,119 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+from analyzer.files import is_compressed, open_byte_range, open_log_file, split_into_line_ranges
+from analyzer.parsing import BaseParser
+from analyzer.profiling import Profiler, profiler
+from analyzer.rejects import RejectLog, reject_log
+from analyzer.statistics import LogStatisticsAccumulator
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARD_SIZE = 64 * 1024 * 1024
+
+
+class Shard(NamedTuple):
+    """
+    A newline-aligned byte range [start, end) of a log file that is parsed by one worker. A compressed log file is
+    always a single shard, which is decompressed by the worker.
+    """
+    path: str
+    start: int
+    end: int
+    compressed: bool = False
+
+
+def plan_shards(paths: Sequence[str], shard_size: int,
+                byte_ranges: Optional[Sequence[Optional[Tuple[int, int]]]] = None) -> List[Shard]:
+    """
+    Split log files into shards. Files up to shard_size bytes become a single shard, larger files are split into
+    newline-aligned byte ranges of roughly shard_size bytes. If byte_ranges is set, only the given newline-aligned byte
+    range of a file is split (None for the whole file). Compressed files cannot be split without decompressing them
+    and always become a single shard. Shards are returned in file and offset order.
+    """
+    shards = []
+    for path, byte_range in zip(paths, byte_ranges or [None] * len(paths)):
+        if is_compressed(path):
+            shards.append(Shard(path, 0, os.path.getsize(path), compressed=True))
+        else:
+            shards.extend(Shard(path, start, end)
+                          for start, end in split_into_line_ranges(path, shard_size, *(byte_range or ())))
+    return shards
+
+
+def analyze_shard(parser: BaseParser, shard: Shard, chunk_size: int,
+                  statistics_factory: Callable[[], LogStatisticsAccumulator],
+                  profile: bool = False, rejects: bool = False, max_reject_ratio: Optional[float] = None
+                  ) -> Tuple[LogStatisticsAccumulator, Optional[Profiler], Optional[RejectLog]]:
+    """
+    Parse a single shard chunk by chunk and return its partial aggregates. If profile is set, the stages of the shard
+    are measured and their metrics are returned as well. If rejects is set, the rejected lines of the shard are
+    collected and returned, and if max_reject_ratio is set, the shard is aborted as soon as it rejected a larger
+    fraction of its lines.
+    """
+    # A forked worker inherits the profiler and the reject log of the parent process, so they are always reset.
+    if profile:
+        profiler.enable()
+    else:
+        profiler.disable()
+    if rejects or max_reject_ratio is not None:
+        reject_log.enable(max_ratio=max_reject_ratio, collect=rejects)
+    else:
+        reject_log.disable()
+    log_statistics = statistics_factory()
+    with open_log_file(shard.path) if shard.compressed else open_byte_range(shard.path, shard.start, shard.end) as file:
+        for chunk in parser.parse_files_to_chunks([file], chunk_size):
+            with profiler.stage('accumulate', rows_in=len(chunk)):
+                log_statistics.update(chunk)
+    return log_statistics, profiler if profile else None, reject_log if reject_log.enabled else None
+
+
+class ParallelAnalyzer:
+    """
+    Parse log files on a pool of worker processes. Every worker returns only the partial aggregates of its shard, which
+    are merged in shard order. Therefore, the results are identical to parsing the files in a single process. If
+    profiling is enabled, the stage metrics of the workers are added to the profiler, summed over all workers. If the
+    reject log is enabled, the rejected lines of the workers are merged into it in shard order as well.
+
+    Parameters:
+        parser: Parser used by the workers. Needs to be picklable.
+        workers: Number of worker processes.
+        chunk_size: Maximum number of log lines a worker holds in memory at a time.
+        shard_size: Approximate size of a shard in bytes.
+        statistics_factory: Picklable callable that returns an empty accumulator, e.g., an accumulator class.
+    """
+
+    def __init__(self, parser: BaseParser, workers: int, chunk_size: int, shard_size: int = DEFAULT_SHARD_SIZE,
+                 statistics_factory: Callable[[], LogStatisticsAccumulator] = LogStatisticsAccumulator):
+        self.parser = parser
+        self.statistics_factory = statistics_factory
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.shard_size = shard_size
+
+    def analyze_files(self, paths: Sequence[str],
+                      byte_ranges: Optional[Sequence[Optional[Tuple[int, int]]]] = None) -> LogStatisticsAccumulator:
+        """
+        Returns the merged aggregates over all log files, or over the given byte ranges of the files (see plan_shards).
+        """
+        shards = plan_shards(paths, self.shard_size, byte_ranges)
+        logger.info(f'Parsing {len(paths)} files in {len(shards)} shards on {self.workers} workers')
+
+        log_statistics = self.statistics_factory()
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            partial_statistics = executor.map(analyze_shard, [self.parser] * len(shards), shards,
+                                              [self.chunk_size] * len(shards),
+                                              [self.statistics_factory] * len(shards),
+                                              [profiler.enabled] * len(shards),
+                                              [reject_log.enabled and reject_log.path is not None] * len(shards),
+                                              [reject_log.max_ratio if reject_log.enabled else None] * len(shards))
+            for shard_statistics, shard_profiler, shard_rejects in partial_statistics:
+                with profiler.stage('merge'):
+                    log_statistics.merge(shard_statistics)
+                if shard_profiler is not None:
+                    profiler.merge(shard_profiler)
+                if shard_rejects is not None:
+                    reject_log.merge(shard_rejects)
+        return log_statistics
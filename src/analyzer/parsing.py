@@ -1,14 +1,119 @@
 import abc
+import functools
+import io
+import itertools
+import json
 import logging
+import math
+import re
+import threading
+import warnings
+from datetime import datetime
 from io import TextIOWrapper
-from typing import Sequence, List
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
+import numpy as np
 import pandas as pd
+from pandas.api.types import is_float_dtype, is_numeric_dtype, union_categoricals
+from pandas.errors import ParserError, ParserWarning
+from pandas.io.parsers import TextFileReader
+
+from analyzer.defaults import ENGINES
+from analyzer.engine import COLUMNS, NUMERIC_COLUMNS
+from analyzer.files import byte_range_start, file_path, peek_text
+from analyzer.formats import COMBINED_PATTERN, COMBINED_TIMESTAMP_FORMAT, FORMAT_SAMPLE_SIZE, detect_input_format
+from analyzer.profiling import profiler
+from analyzer.rejects import REJECT_REASONS, LineSource, reject_log
+from analyzer.timerange import TimeRange
 
 logger = logging.getLogger(__name__)
 
-COLUMNS = ['timestamp', 'response_header_size', 'client_ip', 'response_code', 'response_size', 'request_method', 'url',
-           'username', 'access_destination_ip', 'response_type']
+# Number of lines that are tokenized at once if only some columns are parsed.
+PROJECTION_CHUNK_SIZE = 100_000
+# Number of JSON lines that are decoded at once as a single JSON array. A malformed line only causes the lines of its
+# block to be decoded again.
+JSON_BLOCK_SIZE = 1024
+# Column that takes an extra field of lines with one field too many. pandas skips lines with more fields than columns,
+# but it can truncate a line with too many fields that starts a chunk instead, so such lines are read and rejected.
+OVERFLOW_COLUMN = 'overflow'
+# Line numbers in the ParserWarnings of pandas about skipped lines
+SKIPPED_LINE_PATTERN = re.compile(r'Skipping line (\d+)')
+# Column of the raw dataframes of a LineParser that holds the non-blank lines without any field (e.g., lines that do not
+# match the format), and is empty for all other lines, so they are rejected as missing fields instead of being dropped
+# as blank lines.
+UNPARSED_COLUMN = 'unparsed'
+UNIX_EPOCH = pd.Timestamp(0, tz='UTC')
+# The ParserWarnings that pandas issues while a thread reads a chunk are collected in the list of that thread (see
+# BaseParser._tracked_reads) by a hook that replaces warnings.showwarning, rather than by catch_warnings, which changes
+# the warning filters of all threads. Reads in different threads (e.g., of the query server) thus run concurrently.
+_collected_warnings = threading.local()
+_WARNINGS_HOOK_LOCK = threading.Lock()
+_show_uncollected_warning = warnings.showwarning
+
+
+def _show_warning(message: Union[Warning, str], category: type, filename: str, lineno: int, file=None,
+                  line: Optional[str] = None) -> None:
+    collected_warnings = getattr(_collected_warnings, 'warnings', None)
+    if collected_warnings is not None and issubclass(category, ParserWarning):
+        collected_warnings.append(warnings.WarningMessage(message, category, filename, lineno, file, line))
+    else:
+        _show_uncollected_warning(message, category, filename, lineno, file, line)
+
+
+def _install_warnings_hook() -> None:
+    """
+    Install the hook that collects ParserWarnings, unless it is installed, and make sure that all ParserWarnings of this
+    module are issued (see warnings.filterwarnings), as pandas reports the skipped lines of every chunk in one. The
+    hook is installed again if the warning functions have been reset since (e.g., by catch_warnings).
+    """
+    global _show_uncollected_warning
+    always_filter = ('always', None, ParserWarning, re.compile(re.escape(__name__)), 0)
+    if warnings.showwarning is _show_warning and always_filter in warnings.filters:
+        return
+    with _WARNINGS_HOOK_LOCK:
+        if warnings.showwarning is not _show_warning:
+            _show_uncollected_warning = warnings.showwarning
+            warnings.showwarning = _show_warning
+        if always_filter not in warnings.filters:
+            warnings.filterwarnings('always', category=ParserWarning, module=re.escape(__name__))
+
+
+class ParsedFile:
+    """
+    A file that is being parsed: the source of its lines (see LineSource) and the line numbers of the lines that pandas
+    skipped so far. Blank lines are read as rows, so every line that is not skipped is a row and the positions of the
+    rows among all rows read from the file map to line numbers. Skipped lines are rejected along with the malformed
+    rows of the chunk they were skipped from, so rejected lines are in order.
+
+    Parameters:
+        file: The file object.
+    """
+
+    def __init__(self, file: Union[TextIOWrapper, BinaryIO]):
+        self.source = LineSource(str(getattr(file, 'name', '<stream>')), file_path(file), byte_range_start(file))
+        self.skipped_lines: List[int] = []
+        self.unrejected_lines: List[int] = []
+
+    def skip_lines(self, lines: List[int]) -> None:
+        self.skipped_lines.extend(lines)
+        self.unrejected_lines.extend(lines)
+
+    def pop_unrejected_lines(self) -> np.ndarray:
+        """
+        Returns the line numbers of the skipped lines that were not rejected yet, which are rejected by the caller.
+        """
+        lines = np.asarray(self.unrejected_lines, dtype=np.int64)
+        self.unrejected_lines = []
+        return lines
+
+    def line_numbers(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Returns the (1-based) line numbers of rows, given by their positions among all rows read from the file.
+        """
+        skipped_lines = np.asarray(self.skipped_lines, dtype=np.int64)
+        # The number of rows before every skipped line
+        rows_before = skipped_lines - np.arange(1, len(skipped_lines) + 1)
+        return rows + 1 + np.searchsorted(rows_before, rows + 1, side='left')
 
 
 class BaseParser(abc.ABC):
@@ -17,64 +122,862 @@ class BaseParser(abc.ABC):
 
     Parameters:
         timestamp_unit: The unit used to parse the provided timestamp. Examples: D,s,ms,us,ns
+        columns: Columns that are needed from the log files. If set, only these columns and the numeric columns (which
+        decide whether an entry is malformed) are kept, and they are stored in compact dtypes: string columns as
+        categoricals and sizes as the narrowest integer type. If None, all COLUMNS are parsed.
+        time_range: If set, only log entries in this time range are kept.
     """
 
-    def __init__(self, timestamp_unit: str):
+    def __init__(self, timestamp_unit: str, columns: Optional[Sequence[str]] = None,
+                 time_range: Optional[TimeRange] = None):
         self.timestamp_unit = timestamp_unit
+        self.columns = None if columns is None else [column for column in COLUMNS
+                                                     if column in columns or column in NUMERIC_COLUMNS]
+        self.time_range = time_range
 
     @abc.abstractmethod
     def parse_files_to_dataframe(self, files: Sequence[TextIOWrapper]) -> pd.DataFrame:
         pass
 
-    def _clean_dataframe(self, dataframe: pd.DataFrame) -> pd.DataFrame:
+    @abc.abstractmethod
+    def parse_files_to_chunks(self, files: Sequence[TextIOWrapper], chunk_size: int) -> Iterator[pd.DataFrame]:
+        pass
+
+    def line_timestamp(self, line: bytes) -> Optional[float]:
+        """
+        Returns the timestamp of a raw log line in seconds since the Unix epoch, or None if the line has no valid
+        timestamp. Used to search log files by time without parsing them (see TimeRange).
+        """
+        fields = line.split(None, 1)
+        if not fields:
+            return None
+        try:
+            timestamp = float(fields[0])
+        except ValueError:
+            return None
+        if math.isnan(timestamp):
+            return None
+        return self._seconds(timestamp)
+
+    def file_parser(self, file: TextIOWrapper) -> 'BaseParser':
+        """
+        Returns the parser that parses a log file, which is this parser unless it chooses a parser per file (see
+        AutoParser).
+        """
+        return self
+
+    def _seconds(self, timestamp: float) -> float:
         """
-        Parse timestamp and numeric values and drop entries that contain malformed data after parsing (NaN).
+        Returns a timestamp in timestamp_unit in seconds.
         """
-        dataframe['timestamp'] = pd.to_numeric(dataframe['timestamp'], errors='coerce')
-        dataframe['timestamp'] = pd.to_datetime(dataframe['timestamp'], unit=self.timestamp_unit)
-        dataframe['response_header_size'] = pd.to_numeric(dataframe['response_header_size'], errors='coerce')
-        dataframe['response_size'] = pd.to_numeric(dataframe['response_size'], errors='coerce')
+        return timestamp * (pd.Timedelta(1, unit=self.timestamp_unit) / pd.Timedelta(seconds=1))
 
-        row_count_before_drop = len(dataframe)
-        dataframe = dataframe.dropna()
-        dropped_row_count = row_count_before_drop - len(dataframe)
-        if dropped_row_count > 0:
-            logger.warning(f'Ignored {dropped_row_count} log entries with unexpected values')
+    def _clean_dataframe(self, dataframe: pd.DataFrame, parsed_file: ParsedFile) -> pd.DataFrame:
+        """
+        Parse timestamp and numeric values and drop blank lines (see _drop_blank_lines) and malformed entries (see
+        _validate). The parsed columns replace the raw ones in place, and the dataframe is only filtered (copied) if it
+        holds blank lines or malformed entries.
+        """
+        timestamps = pd.to_numeric(dataframe['timestamp'], errors='coerce')
+        dataframe, timestamps = self._drop_blank_lines(dataframe, timestamps)
+        numeric_values = {'timestamp': timestamps,
+                          'response_header_size': pd.to_numeric(dataframe['response_header_size'], errors='coerce'),
+                          'response_size': pd.to_numeric(dataframe['response_size'], errors='coerce')}
+        valid_rows = self._validate(dataframe, numeric_values, parsed_file)
+
+        del dataframe[OVERFLOW_COLUMN]
+        dataframe['timestamp'] = pd.to_datetime(numeric_values['timestamp'], unit=self.timestamp_unit)
+        dataframe['response_header_size'] = numeric_values['response_header_size']
+        dataframe['response_size'] = numeric_values['response_size']
+        if valid_rows is not None:
+            dataframe = self._take_valid_rows(dataframe, valid_rows)
+
+        if self.columns is not None:
+            dataframe = self._compact_dataframe(dataframe)
+        return dataframe
+
+    def _clean(self, dataframe: pd.DataFrame, parsed_file: ParsedFile) -> pd.DataFrame:
+        """
+        Clean a raw dataframe of parsed_file with _clean_dataframe and keep the log entries in the time range, measured
+        as stage 'clean'.
+        """
+        with profiler.stage('clean', rows_in=len(dataframe)) as stage:
+            dataframe = self._clean_dataframe(dataframe, parsed_file)
+            if self.time_range is not None:
+                dataframe = self.time_range.filter(dataframe)
+            stage.record(rows_out=len(dataframe))
+        return dataframe
+
+    def _validate(self, dataframe: pd.DataFrame, numeric_values: Dict[str, pd.Series],
+                  parsed_file: ParsedFile) -> Optional[np.ndarray]:
+        """
+        Validate raw entries in a single pass over one mask: an entry is malformed if it has an extra field
+        (OVERFLOW_COLUMN) or a numeric value that could not be parsed (NaN in numeric_values, the parsed
+        NUMERIC_COLUMNS). Returns the positions of the valid entries, or None if all entries are valid. Only for the
+        malformed entries, the raw values are inspected to reject them by reason (see REJECT_REASONS and _reject): too
+        many fields, missing fields (lines with too few fields are filled up with empty strings, or NaN in columns that
+        are parsed as numbers), or else the first numeric column with a malformed value. The lines that pandas skipped
+        while reading the entries are rejected along with them.
+        """
+        skipped_lines = parsed_file.pop_unrejected_lines()
+        malformed = {column: values.isna().to_numpy(dtype=bool) for column, values in numeric_values.items()}
+        invalid = dataframe[OVERFLOW_COLUMN].ne('').to_numpy(dtype=bool)
+        for column_malformed in malformed.values():
+            invalid |= column_malformed
+        if not invalid.any():
+            self._reject(parsed_file, len(dataframe) + len(skipped_lines), skipped_lines,
+                         np.full(len(skipped_lines), REJECT_REASONS[0]))
+            return None
+
+        rows = np.flatnonzero(invalid)
+        raw_entries = dataframe.iloc[rows]
+        missing = {column: self._is_missing(raw_entries[column]) for column in [OVERFLOW_COLUMN] + NUMERIC_COLUMNS}
+        reasons = np.select([~missing[OVERFLOW_COLUMN], np.logical_or.reduce([missing[column]
+                                                                              for column in NUMERIC_COLUMNS])]
+                            + [malformed[column][rows] for column in NUMERIC_COLUMNS], REJECT_REASONS, default='')
+        lines = parsed_file.line_numbers(dataframe.index.to_numpy()[rows])
+
+        extra_field_lines = lines[reasons == 'too_many_fields']
+        if len(extra_field_lines) > 0:
+            self._report_extra_fields(extra_field_lines)
+        unexpected_value_count = len(lines) - len(extra_field_lines)
+        if unexpected_value_count > 0:
+            logger.warning(f'Ignored {unexpected_value_count} log entries with unexpected values')
+        lines = np.concatenate([skipped_lines, lines])
+        reasons = np.concatenate([np.full(len(skipped_lines), REJECT_REASONS[0]), reasons])
+        order = np.argsort(lines, kind='stable')
+        self._reject(parsed_file, len(dataframe) + len(skipped_lines), lines[order], reasons[order])
+        return np.flatnonzero(~invalid)
+
+    def _drop_blank_lines(self, dataframe: pd.DataFrame, timestamps: pd.Series) -> Tuple[pd.DataFrame, pd.Series]:
+        """
+        Drop the rows of blank lines, which are read as rows so that rows map to line numbers (see ParsedFile), before
+        they turn the other numeric columns into floats. Only the rows without a timestamp (NaN in the parsed
+        timestamps) are inspected, and the dataframe is only copied if it holds blank lines. Returns the dataframe and
+        the parsed timestamps of its rows.
+        """
+        candidate_rows = np.flatnonzero(timestamps.isna().to_numpy(dtype=bool))
+        if len(candidate_rows) == 0:
+            return dataframe, timestamps
+        raw_entries = dataframe.iloc[candidate_rows]
+        blank = np.logical_and.reduce([self._is_missing(raw_entries[column]) for column in raw_entries.columns])
+        if not blank.any():
+            return dataframe, timestamps
+        kept_rows = np.ones(len(dataframe), dtype=bool)
+        kept_rows[candidate_rows[blank]] = False
+        kept_rows = np.flatnonzero(kept_rows)
+        return self._take_valid_rows(dataframe, kept_rows), timestamps.iloc[kept_rows]
 
+    @staticmethod
+    def _take_valid_rows(dataframe: pd.DataFrame, valid_rows: np.ndarray) -> pd.DataFrame:
+        """
+        Returns the valid rows of a dataframe. Categories that only the dropped rows used (e.g., the empty strings of
+        blank lines) are removed.
+        """
+        dataframe = dataframe.take(valid_rows)
+        for column, dtype in dataframe.dtypes.items():
+            if isinstance(dtype, pd.CategoricalDtype):
+                dataframe[column] = dataframe[column].cat.remove_unused_categories()
         return dataframe
 
+    def _report_extra_fields(self, lines: np.ndarray) -> None:
+        """
+        Report lines with one field too many (in OVERFLOW_COLUMN) like pandas reports lines with even more fields,
+        depending on on_bad_lines.
+
+        Raises:
+            ParserError: If on_bad_lines is 'error'.
+        """
+        if self.on_bad_lines == 'error':
+            raise ParserError(f'Expected {len(COLUMNS)} fields in line {lines[0]}, saw {len(COLUMNS) + 1}')
+        if self.on_bad_lines == 'warn':
+            warnings.warn(''.join(f'Skipping line {line}: expected {len(COLUMNS)} fields, saw {len(COLUMNS) + 1}\n'
+                                  for line in lines), ParserWarning)
 
-class CSVParser(BaseParser):
+    @staticmethod
+    def _reject(parsed_file: ParsedFile, line_count: int, lines: np.ndarray, reasons: np.ndarray) -> None:
+        """
+        Count the rejected lines of parsed_file by reason if profiling is enabled and add them to the reject log, along
+        with the number of validated lines.
+        """
+        if profiler.enabled:
+            for reason, count in zip(*np.unique(reasons, return_counts=True)):
+                profiler.count_dropped_lines(str(reason), int(count))
+        reject_log.add(parsed_file.source, line_count, lines, reasons)
+
+    @staticmethod
+    def _is_missing(values: pd.Series) -> np.ndarray:
+        missing = values.isna().to_numpy(dtype=bool)
+        if not is_numeric_dtype(values):
+            missing |= values.eq('').fillna(False).to_numpy(dtype=bool)
+        return missing
+
+    def _parse_chunks(self, file: TextIOWrapper, chunk_size: Optional[int]) -> Iterator[pd.DataFrame]:
+        """
+        Read and clean a file, as a single dataframe or in chunks (see DelimitedParser._read_columns and
+        LineParser._read_columns).
+        """
+        parsed_file = ParsedFile(file)
+        for dataframe in self._read_columns(file, chunk_size, parsed_file):
+            yield self._clean(dataframe, parsed_file)
+
+    def _tracked_reads(self, file: TextIOWrapper, chunks: Iterator[pd.DataFrame],
+                       parsed_file: ParsedFile) -> Iterator[pd.DataFrame]:
+        """
+        Returns the chunks of parsed_file and records the lines that pandas skips for having too many fields, which it
+        reports in one ParserWarning per chunk, to be rejected with the chunk (see _validate). The warnings are
+        collected per thread (see _install_warnings_hook) and only issued as usual if on_bad_lines is 'warn'. If
+        profiling is enabled, the reading of every chunk is measured as stage 'read'.
+        """
+        binary_file = getattr(file, 'buffer', file)
+        while True:
+            position = self._file_position(binary_file) if profiler.enabled else None
+            _install_warnings_hook()
+            caught_warnings = _collected_warnings.warnings = []
+            try:
+                with profiler.stage('read') as stage:
+                    dataframe = next(chunks, None)
+                    end_position = self._file_position(binary_file) if profiler.enabled else None
+                    stage.record(rows_out=0 if dataframe is None else len(dataframe),
+                                 bytes_read=None if position is None or end_position is None
+                                 else end_position - position)
+            finally:
+                _collected_warnings.warnings = None
+            skipped_lines = []
+            for warning in caught_warnings:
+                skipped_lines.extend(int(line) for line in SKIPPED_LINE_PATTERN.findall(str(warning.message)))
+                if self.on_bad_lines == 'warn':
+                    # pandas expects the OVERFLOW_COLUMN as well.
+                    message = ParserWarning(str(warning.message).replace(f'expected {len(COLUMNS) + 1} fields',
+                                                                         f'expected {len(COLUMNS)} fields'))
+                    warnings.warn_explicit(message, warning.category, warning.filename, warning.lineno)
+            parsed_file.skip_lines(skipped_lines)
+            if dataframe is None:
+                unrejected_lines = parsed_file.pop_unrejected_lines()
+                self._reject(parsed_file, len(unrejected_lines), unrejected_lines,
+                             np.full(len(unrejected_lines), REJECT_REASONS[0]))
+                return
+            yield dataframe
+
+    @staticmethod
+    def _file_position(file: BinaryIO) -> Optional[int]:
+        # Pipes and decompressed streams have no position.
+        try:
+            return file.tell()
+        except (OSError, ValueError):
+            return None
+
+    def _string_dtype(self, column: str) -> Union[str, pd.StringDtype]:
+        """
+        Returns the dtype that a column is read as before cleaning. With selected columns, the needed string columns
+        are read as categoricals, which store every distinct value only once, and the unused ones as plain objects,
+        which are cheapest to create and dropped right away. The OVERFLOW_COLUMN, which is empty for all but malformed
+        lines, is a categorical as well.
+        """
+        if column == OVERFLOW_COLUMN:
+            return 'category'
+        if self.columns is None or column in NUMERIC_COLUMNS:
+            return pd.StringDtype()
+        return 'category' if column in self.columns else 'object'
+
+    @staticmethod
+    def _concat(dataframes: List[pd.DataFrame]) -> pd.DataFrame:
+        """
+        Concatenate dataframes. Categorical columns stay categorical: pd.concat would convert categoricals with
+        different categories (as read from different chunks) to objects.
+        """
+        with profiler.stage('concat', rows_in=sum(len(dataframe) for dataframe in dataframes)) as stage:
+            categorical_columns = [column for column, dtype in dataframes[0].dtypes.items()
+                                   if isinstance(dtype, pd.CategoricalDtype)]
+            if len(dataframes) > 1 and categorical_columns:
+                categories = {column: union_categoricals([dataframe[column] for dataframe in dataframes]).categories
+                              for column in categorical_columns}
+                dataframes = [dataframe.assign(**{column: dataframe[column].cat.set_categories(categories[column])
+                                                  for column in categorical_columns})
+                              for dataframe in dataframes]
+            dataframe = pd.concat(dataframes)
+            stage.record(rows_out=len(dataframe))
+        return dataframe
+
+    @staticmethod
+    def _to_nullable_numeric(series: pd.Series) -> pd.Series:
+        # Columns with malformed values already went through pd.to_numeric and are nullable.
+        if isinstance(series.dtype, pd.api.extensions.ExtensionDtype):
+            return series
+        return series.astype('Float64' if is_float_dtype(series) else 'Int64')
+
+    @staticmethod
+    def _compact_dataframe(dataframe: pd.DataFrame) -> pd.DataFrame:
+        """
+        Convert the cleaned size columns in place from nullable to plain NumPy dtypes (there are no missing values left)
+        and downcast integers to the narrowest type that holds all values.
+        """
+        for column in ['response_header_size', 'response_size']:
+            if is_float_dtype(dataframe[column]):
+                dataframe[column] = dataframe[column].to_numpy(dtype='float64')
+            else:
+                dataframe[column] = pd.to_numeric(dataframe[column].to_numpy(dtype='int64'), downcast='integer')
+        return dataframe
+
+
+class DelimitedParser(BaseParser):
     """
-    Implementation of the BaseParser for CSV log files.
+    Base class for the parsers of log formats that the C tokenizer of pandas splits into fields (see _read_csv). Files
+    are read as a single dataframe or in chunks, and lines with too many fields are rejected (see _tracked_reads).
+
+    Parameters:
+        timestamp_unit: The unit used to parse the provided timestamp. Examples: 'D', 's', 'ms', 'us', 'ns'
+        on_bad_lines: Sets the behaviour of the parser when it encounters bad lines (e.g., too many columns). Values:
+        'error', 'warn', 'skip'
+        columns: Columns that are needed from the log files, see BaseParser.
+        time_range: Time range of the log entries that are kept, see BaseParser.
+    """
+
+    def __init__(self, timestamp_unit: str, on_bad_lines: str, columns: Optional[Sequence[str]] = None,
+                 time_range: Optional[TimeRange] = None):
+        self.on_bad_lines = on_bad_lines
+        super().__init__(timestamp_unit, columns, time_range)
+
+    @abc.abstractmethod
+    def _read_csv(self, file: TextIOWrapper, chunk_size: Optional[int]) -> Union[pd.DataFrame, TextFileReader]:
+        """
+        Read the raw (uncleaned) COLUMNS and the OVERFLOW_COLUMN of a file, keeping blank lines. Returns a dataframe, or
+        a reader of dataframes with chunk_size rows if chunk_size is set.
+        """
+
+    def _pandas_on_bad_lines(self) -> str:
+        """
+        Returns the on_bad_lines value for pandas. Skipped lines are always reported as warnings, so they can be
+        rejected with their line numbers (see _tracked_reads).
+        """
+        return 'error' if self.on_bad_lines == 'error' else 'warn'
+
+    def _read_columns(self, file: TextIOWrapper, chunk_size: Optional[int],
+                      parsed_file: ParsedFile) -> Iterator[pd.DataFrame]:
+        """
+        Read the raw columns of a file that the parser is configured with, as a single dataframe or in chunks.
+        pandas no longer detects lines with too many fields if it is told to parse only some columns (usecols).
+        Therefore, all fields are tokenized and the unused columns are dropped chunk by chunk, so they are never held
+        in memory for a whole file.
+        """
+        if self.columns is None:
+            yield from self._tracked_reads(file, self._read_chunks(file, chunk_size), parsed_file)
+            return
+
+        unused_columns = [column for column in COLUMNS if column not in self.columns]
+        for dataframe in self._tracked_reads(file, self._read_chunks(file, chunk_size or PROJECTION_CHUNK_SIZE),
+                                             parsed_file):
+            yield dataframe.drop(columns=unused_columns)
+
+    def _read_chunks(self, file: TextIOWrapper, chunk_size: Optional[int]) -> Iterator[pd.DataFrame]:
+        """
+        Read the raw COLUMNS of a file as a single dataframe, or as dataframes with chunk_size rows if chunk_size is
+        set. Nothing is read before the first dataframe is requested.
+        """
+        reader = self._read_csv(file, chunk_size)
+        if isinstance(reader, pd.DataFrame):
+            yield reader
+            return
+        with reader:
+            yield from reader
+
+
+class CSVParser(DelimitedParser):
+    """
+    Implementation of the DelimitedParser for CSV log files.
 
     Parameters:
         timestamp_unit: The unit used to parse the provided timestamp. Examples: 'D', 's', 'ms', 'us', 'ns'
         separator: The separator used in parsing the CSV
         on_bad_lines: Sets the behaviour of the parser when it encounters bad lines (e.g., too many columns). Values:
         'error', 'warn', 'skip'
+        columns: Columns that are needed from the log files, see BaseParser.
+        time_range: Time range of the log entries that are kept, see BaseParser.
     """
 
-    def __init__(self, timestamp_unit: str, separator: str, on_bad_lines: str):
+    def __init__(self, timestamp_unit: str, separator: str, on_bad_lines: str,
+                 columns: Optional[Sequence[str]] = None, time_range: Optional[TimeRange] = None):
         self.separator = separator
-        self.on_bad_lines = on_bad_lines
-        super().__init__(timestamp_unit)
+        super().__init__(timestamp_unit, on_bad_lines, columns, time_range)
 
     def parse_files_to_dataframe(self, files: Sequence[TextIOWrapper]) -> pd.DataFrame:
         """
         Parse log files in CSV format to a single dataframe. Calls the parent _clean_dataframe to parse timestamp and
-        numeric values and drop NaN values.
+        numeric values and drop malformed entries, file by file. With selected columns, the files are cleaned chunk by
+        chunk, so the raw string values are never held in memory for a whole file.
+        """
+        log_dataframe = self._concat([dataframe for file in files
+                                      for dataframe in self._parse_chunks(file, chunk_size=None)])
+        logger.info(f'Parsed {len(log_dataframe)} log lines')
+
+        return log_dataframe
+
+    def parse_files_to_chunks(self, files: Sequence[TextIOWrapper], chunk_size: int) -> Iterator[pd.DataFrame]:
+        """
+        Parse log files in CSV format to a sequence of cleaned dataframes with at most chunk_size rows each. Files are
+        read lazily, so only one chunk is held in memory at a time.
         """
-        log_dataframes: List[pd.DataFrame] = []
         for file in files:
-            # Setting index_col to False because the parser will otherwise get confused if the first line in a file is
-            # malformed (i.e., has more columns than expected).
-            dataframe = pd.read_csv(file, sep=self.separator, on_bad_lines=self.on_bad_lines, names=COLUMNS,
-                                    dtype=pd.StringDtype(), index_col=False, keep_default_na=False)
-            log_dataframes.append(dataframe)
-        log_dataframe = pd.concat(log_dataframes)
-
-        log_dataframe = self._clean_dataframe(log_dataframe)
+            yield from self._parse_chunks(file, chunk_size)
+
+    def _read_csv(self, file: TextIOWrapper, chunk_size: Optional[int]) -> Union[pd.DataFrame, TextFileReader]:
+        # Setting index_col to False because the parser will otherwise get confused if the first line in a file is
+        # malformed (i.e., has more columns than expected).
+        return pd.read_csv(file, sep=self.separator, on_bad_lines=self._pandas_on_bad_lines(),
+                           names=COLUMNS + [OVERFLOW_COLUMN],
+                           dtype={column: self._string_dtype(column) for column in COLUMNS + [OVERFLOW_COLUMN]},
+                           index_col=False, keep_default_na=False, skip_blank_lines=False, chunksize=chunk_size)
+
+
+class FastSquidParser(DelimitedParser):
+    """
+    Implementation of the DelimitedParser for the native whitespace separated Squid access log format. Unlike CSVParser,
+    numeric fields are not read as strings: the C tokenizer of pandas parses them directly from the raw bytes into
+    int64/float64 arrays, and the timestamp is converted from that array into a datetime64[ns] column. Only a numeric
+    column that contains malformed values falls back to strings and pd.to_numeric. The resulting dataframes have the
+    same schema and values as those of CSVParser with a whitespace separator.
+
+    Parameters:
+        timestamp_unit: The unit used to parse the provided timestamp. Examples: 'D', 's', 'ms', 'us', 'ns'
+        on_bad_lines: Sets the behaviour of the parser when it encounters bad lines (e.g., too many columns). Values:
+        'error', 'warn', 'skip'
+        columns: Columns that are needed from the log files, see BaseParser.
+        time_range: Time range of the log entries that are kept, see BaseParser.
+    """
+
+    def parse_files_to_dataframe(self, files: Sequence[TextIOWrapper]) -> pd.DataFrame:
+        """
+        Parse log files in Squid format to a single dataframe.
+        """
+        log_dataframe = self._concat([dataframe for file in files
+                                      for dataframe in self._parse_chunks(file, chunk_size=None)])
+        logger.info(f'Parsed {len(log_dataframe)} log lines')
+
+        return log_dataframe
+
+    def parse_files_to_chunks(self, files: Sequence[TextIOWrapper], chunk_size: int) -> Iterator[pd.DataFrame]:
+        """
+        Parse log files in Squid format to a sequence of cleaned dataframes with at most chunk_size rows each.
+        """
+        for file in files:
+            yield from self._parse_chunks(file, chunk_size)
+
+    def _read_csv(self, file: TextIOWrapper, chunk_size: Optional[int]) -> Union[pd.DataFrame, TextFileReader]:
+        # Text files are read through their binary buffer, so the C tokenizer works on the raw bytes. Numeric columns
+        # get no dtype, so they are inferred as int64/float64 (or object if a value is malformed). 'round_trip' parses
+        # floats exactly like pd.to_numeric.
+        return pd.read_csv(getattr(file, 'buffer', file), sep=r'\s+', on_bad_lines=self._pandas_on_bad_lines(),
+                           names=COLUMNS + [OVERFLOW_COLUMN],
+                           dtype={column: self._string_dtype(column) for column in COLUMNS + [OVERFLOW_COLUMN]
+                                  if column not in NUMERIC_COLUMNS},
+                           index_col=False, keep_default_na=False, skip_blank_lines=False, float_precision='round_trip',
+                           encoding='utf-8', chunksize=chunk_size)
+
+    def _clean_dataframe(self, dataframe: pd.DataFrame, parsed_file: ParsedFile) -> pd.DataFrame:
+        """
+        Parse numeric columns that contain malformed values, drop blank lines and malformed entries (see
+        BaseParser._clean_dataframe) and convert the numeric columns in place to the dtypes that
+        BaseParser._clean_dataframe produces.
+        """
+        timestamps = dataframe['timestamp']
+        if timestamps.dtype == object:
+            timestamps = self._to_numeric(timestamps)
+        dataframe, timestamps = self._drop_blank_lines(dataframe, timestamps)
+        numeric_values = {'timestamp': timestamps}
+        numeric_values.update({column: self._to_numeric(dataframe[column]) if dataframe[column].dtype == object
+                               else dataframe[column] for column in NUMERIC_COLUMNS[1:]})
+        valid_rows = self._validate(dataframe, numeric_values, parsed_file)
+
+        del dataframe[OVERFLOW_COLUMN]
+        for column, values in numeric_values.items():
+            if dataframe[column].dtype == object:
+                dataframe[column] = values
+        if valid_rows is not None:
+            dataframe = self._take_valid_rows(dataframe, valid_rows)
+
+        timestamps = dataframe['timestamp']
+        timestamps = timestamps.to_numpy(dtype='float64' if is_float_dtype(timestamps) else 'int64')
+        dataframe['timestamp'] = pd.to_datetime(timestamps, unit=self.timestamp_unit)
+        if self.columns is not None:
+            return self._compact_dataframe(dataframe)
+        dataframe['response_header_size'] = self._to_nullable_numeric(dataframe['response_header_size'])
+        dataframe['response_size'] = self._to_nullable_numeric(dataframe['response_size'])
+        return dataframe
+
+    @staticmethod
+    def _to_numeric(series: pd.Series) -> pd.Series:
+        return pd.to_numeric(series.astype(pd.StringDtype()), errors='coerce')
+
+
+class LineParser(BaseParser):
+    """
+    Base class for the parsers of log formats that the C tokenizer of pandas cannot split into fields, e.g., with
+    bracketed fields or JSON objects. Files are read in chunks of lines, the fields of all lines of a chunk are
+    extracted at once (see _extract), and the raw columns are cleaned and validated like those of CSVParser. Every line
+    is a row, so rows map to line numbers. A non-blank line without any of the fields (e.g., a line that does not match
+    the format) is rejected as missing fields.
+
+    Parameters:
+        timestamp_unit: The unit of numeric timestamps. Examples: 'D', 's', 'ms', 'us', 'ns'
+        on_bad_lines: Accepted like by the parsers of the squid format (see PARSERS). No line has too many fields, so it
+        has no effect.
+        columns: Columns that are needed from the log files, see BaseParser. Only these columns are extracted.
+        time_range: Time range of the log entries that are kept, see BaseParser.
+    """
+
+    def __init__(self, timestamp_unit: str, on_bad_lines: str, columns: Optional[Sequence[str]] = None,
+                 time_range: Optional[TimeRange] = None):
+        self.on_bad_lines = on_bad_lines
+        super().__init__(timestamp_unit, columns, time_range)
+
+    def parse_files_to_dataframe(self, files: Sequence[TextIOWrapper]) -> pd.DataFrame:
+        """
+        Parse log files to a single dataframe.
+        """
+        log_dataframe = self._concat([dataframe for file in files
+                                      for dataframe in self._parse_chunks(file, chunk_size=None)])
+        logger.info(f'Parsed {len(log_dataframe)} log lines')
+
+        return log_dataframe
+
+    def parse_files_to_chunks(self, files: Sequence[TextIOWrapper], chunk_size: int) -> Iterator[pd.DataFrame]:
+        """
+        Parse log files to a sequence of cleaned dataframes with at most chunk_size rows each.
+        """
+        for file in files:
+            yield from self._parse_chunks(file, chunk_size)
+
+    @abc.abstractmethod
+    def _extract(self, lines: List[str]) -> Dict[str, pd.Series]:
+        """
+        Returns the raw columns (see _raw_columns) of lines, with a missing value (NaN or an empty string) for every
+        field that a line does not have. Numeric columns hold numbers, or strings that pd.to_numeric parses if they hold
+        malformed values, so these are rejected like by CSVParser.
+        """
+
+    def _raw_columns(self) -> List[str]:
+        return COLUMNS if self.columns is None else self.columns
+
+    def _read_columns(self, file: TextIOWrapper, chunk_size: Optional[int],
+                      parsed_file: ParsedFile) -> Iterator[pd.DataFrame]:
+        """
+        Read the raw columns of a file in chunks of lines. With selected columns, a file is read in chunks of at most
+        PROJECTION_CHUNK_SIZE lines, so the lines of a whole file are never held in memory.
+        """
+        if self.columns is not None:
+            chunk_size = chunk_size or PROJECTION_CHUNK_SIZE
+        yield from self._tracked_reads(file, self._read_chunks(file, chunk_size), parsed_file)
+
+    def _read_chunks(self, file: TextIOWrapper, chunk_size: Optional[int]) -> Iterator[pd.DataFrame]:
+        """
+        Read the raw columns of a file as dataframes of chunk_size lines each, or as a single dataframe if chunk_size is
+        None. The rows are numbered across chunks, like by pandas. Binary files (e.g., the byte ranges of shards) are
+        decoded as UTF-8.
+        """
+        text_file = file if isinstance(file, io.TextIOBase) else io.TextIOWrapper(file, encoding='utf-8')
+        row_count = 0
+        try:
+            while True:
+                lines = list(itertools.islice(text_file, chunk_size))
+                if lines or chunk_size is None:
+                    dataframe = self._raw_dataframe(lines)
+                    dataframe.index = pd.RangeIndex(row_count, row_count + len(lines))
+                    row_count += len(lines)
+                    yield dataframe
+                if not lines or chunk_size is None:
+                    return
+        finally:
+            if text_file is not file:
+                # The binary file is closed by its owner.
+                text_file.detach()
+
+    def _raw_dataframe(self, lines: List[str]) -> pd.DataFrame:
+        """
+        Returns the raw columns of lines (see _extract) in the dtypes of CSVParser (see _string_dtype), along with the
+        empty OVERFLOW_COLUMN and the UNPARSED_COLUMN.
+        """
+        columns = self._extract(lines)
+        dataframe = pd.DataFrame({column: values if column in NUMERIC_COLUMNS
+                                  else values.fillna('').astype(self._string_dtype(column))
+                                  for column, values in columns.items()})
+        dataframe[OVERFLOW_COLUMN] = pd.Categorical.from_codes(np.zeros(len(lines), dtype=np.int8), categories=[''])
+        unparsed = np.full(len(lines), '', dtype=object)
+        unparsed_rows = np.flatnonzero(np.logical_and.reduce([self._is_missing(values) for values in columns.values()]))
+        unparsed[unparsed_rows] = [lines[row].strip() for row in unparsed_rows]
+        dataframe[UNPARSED_COLUMN] = pd.Categorical(unparsed)
+        return dataframe
+
+    def _clean_dataframe(self, dataframe: pd.DataFrame, parsed_file: ParsedFile) -> pd.DataFrame:
+        """
+        Clean a raw dataframe like BaseParser._clean_dataframe and drop the UNPARSED_COLUMN. The size columns are
+        nullable, like those of CSVParser, if all columns are parsed.
+        """
+        dataframe = super()._clean_dataframe(dataframe, parsed_file)
+        del dataframe[UNPARSED_COLUMN]
+        if self.columns is None:
+            dataframe['response_header_size'] = self._to_nullable_numeric(dataframe['response_header_size'])
+            dataframe['response_size'] = self._to_nullable_numeric(dataframe['response_size'])
+        return dataframe
+
+
+class CombinedLogParser(LineParser):
+    """
+    Implementation of the LineParser for the combined log format of Apache and Nginx (and the common log format, which
+    lacks referer and user agent). The fields of COMBINED_PATTERN map onto the COLUMNS: host to client_ip, user to
+    username, the method and URL of the request line to request_method and url, and the status to response_code. The
+    time becomes a timestamp in whole timestamp_units and a size of '-' becomes 0. The format has no
+    response_header_size (which is 0), access_destination_ip or response_type (both '-').
+
+    The regular expression is applied to all lines of a chunk at once, by the RE2 engine of pyarrow if the optional
+    pyarrow package is installed, and by pandas otherwise.
+    """
+
+    def line_timestamp(self, line: bytes) -> Optional[float]:
+        """
+        Returns the time of a raw log line in seconds since the Unix epoch, or None if the line does not match the
+        format or has a malformed time.
+        """
+        match = COMBINED_PATTERN.match(line.decode('utf-8', errors='replace'))
+        if match is None:
+            return None
+        try:
+            return datetime.strptime(match.group('timestamp'), COMBINED_TIMESTAMP_FORMAT).timestamp()
+        except ValueError:
+            return None
+
+    def _extract(self, lines: List[str]) -> Dict[str, pd.Series]:
+        fields, times = self._extract_fields(lines)
+        matched = fields['client_ip'].notna().to_numpy()
+        columns = {}
+        for column in self._raw_columns():
+            if column == 'timestamp':
+                columns[column] = self._timestamps(fields['timestamp'], times)
+            elif column == 'response_header_size':
+                columns[column] = pd.Series(np.zeros(len(lines), dtype=np.int64), dtype='Int64').where(matched)
+            elif column == 'response_size':
+                sizes = fields['response_size']
+                columns[column] = sizes.mask(sizes.eq('-'), '0').astype(pd.StringDtype())
+            elif column in fields:
+                columns[column] = fields[column]
+            else:
+                columns[column] = pd.Series('-', index=fields.index, dtype=object).where(matched)
+        return columns
+
+    @staticmethod
+    def _extract_fields(lines: List[str]) -> Tuple[pd.DataFrame, pd.Series]:
+        """
+        Returns the fields of COMBINED_PATTERN of lines as strings, with NaN for the lines that do not match it, and
+        their parsed times in UTC, with NaT for malformed times. A request without a URL (e.g., '-') gets the URL '-'.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.compute as pc
+        except ImportError:
+            fields = pd.Series(lines, dtype=object).str.extract(COMBINED_PATTERN)
+            times = pd.to_datetime(fields['timestamp'], format=COMBINED_TIMESTAMP_FORMAT, utc=True, errors='coerce')
+        else:
+            matches = pc.extract_regex(pa.array(lines, type=pa.string()), COMBINED_PATTERN.pattern)
+            fields = pd.DataFrame({name: pc.struct_field(matches, name).to_pandas()
+                                   for name in COMBINED_PATTERN.groupindex})
+            times = pc.strptime(pc.struct_field(matches, 'timestamp'), format=COMBINED_TIMESTAMP_FORMAT, unit='s',
+                                error_is_null=True).to_pandas()
+        fields['url'] = fields['url'].mask(fields['url'].eq(''), '-')
+        return fields, times
+
+    def _timestamps(self, raw_times: pd.Series, times: pd.Series) -> pd.Series:
+        """
+        Returns the raw timestamp column of lines from their raw and parsed times, in whole timestamp_units. Malformed
+        times stay strings, so they are rejected as malformed timestamps.
+        """
+        timestamps = ((times - UNIX_EPOCH) // pd.Timedelta(1, unit=self.timestamp_unit)).astype('Int64')
+        malformed = (times.isna() & raw_times.notna()).to_numpy()
+        if malformed.any():
+            return timestamps.astype(object).where(~malformed, raw_times)
+        return timestamps
+
+
+class JSONLinesParser(LineParser):
+    """
+    Implementation of the LineParser for JSON lines: one JSON object per line, with the COLUMNS as keys. Other keys
+    are ignored, and a missing key or null is a missing field. Numeric fields are numbers or strings that hold numbers,
+    and other values of string fields are converted to strings. A line that is blank or does not hold a JSON object
+    has no fields.
+
+    The lines of a chunk that look like JSON objects are decoded at once as a single JSON array, like by
+    pd.read_json(lines=True), but unlike pd.read_json, blank and malformed lines are kept as rows. A malformed line
+    among them does not cause the other lines to be decoded one by one (see _decode_objects).
+    """
+
+    def line_timestamp(self, line: bytes) -> Optional[float]:
+        """
+        Returns the timestamp of a raw log line in seconds since the Unix epoch, or None if the line does not hold a
+        JSON object with a numeric timestamp.
+        """
+        timestamp = self._decode_line(line).get('timestamp')
+        if isinstance(timestamp, str):
+            try:
+                timestamp = float(timestamp)
+            except ValueError:
+                return None
+        if not isinstance(timestamp, (int, float)) or isinstance(timestamp, bool) or math.isnan(timestamp):
+            return None
+        return self._seconds(timestamp)
+
+    def _extract(self, lines: List[str]) -> Dict[str, pd.Series]:
+        records = self._decode(lines)
+        dataframe = pd.DataFrame(records, columns=self._raw_columns(), index=pd.RangeIndex(len(lines)), dtype=object)
+        columns = {}
+        for column, values in dataframe.items():
+            if column in NUMERIC_COLUMNS:
+                numbers = pd.to_numeric(values, errors='coerce', dtype_backend='numpy_nullable')
+                malformed = numbers.isna().to_numpy() & ~self._is_missing(values)
+                columns[column] = values.astype(pd.StringDtype()) if malformed.any() else numbers
+            elif pd.api.types.infer_dtype(values, skipna=True) in ('string', 'empty'):
+                columns[column] = values
+            else:
+                columns[column] = values.astype(str).where(values.notna())
+        return columns
+
+    def _decode(self, lines: List[str]) -> List[Dict]:
+        """
+        Returns the JSON object of every line, or an empty dict for a line that is blank or does not hold a JSON object.
+        If not all lines can be decoded at once, only the lines that start with '{' and end with '}' are decoded, in
+        blocks of JSON_BLOCK_SIZE lines (see _decode_objects).
+        """
+        try:
+            records = json.loads('[' + ','.join(lines) + ']')
+        except ValueError:
+            records = None
+        if records is not None and len(records) == len(lines) and set(map(type, records)) <= {dict}:
+            return records
+
+        records = [{}] * len(lines)
+        stripped_lines = [line.strip() for line in lines]
+        object_rows = [row for row, line in enumerate(stripped_lines) if line[:1] == '{' and line[-1:] == '}']
+        for start in range(0, len(object_rows), JSON_BLOCK_SIZE):
+            block_rows = object_rows[start:start + JSON_BLOCK_SIZE]
+            for row, record in zip(block_rows, self._decode_objects([stripped_lines[row] for row in block_rows])):
+                records[row] = record
+        return records
+
+    def _decode_objects(self, lines: List[str]) -> List[Dict]:
+        """
+        Returns the JSON object of every line, or an empty dict for a line that does not hold one. The lines are
+        decoded at once as a single JSON array. If that fails, the lines before the line at the position of the error
+        are decoded at once, that line on its own, and the lines after it like all lines.
+        """
+        records: List[Dict] = []
+        while lines:
+            try:
+                decoded = json.loads('[' + ','.join(lines) + ']')
+            except json.JSONDecodeError as error:
+                # Line i ends at line_ends[i], where its separating comma (or the closing bracket) is.
+                line_ends = np.cumsum([len(line) + 1 for line in lines])
+                malformed_line = min(int(np.searchsorted(line_ends, error.pos)), len(lines) - 1)
+                records.extend(self._decode_objects(lines[:malformed_line]))
+                records.append(self._decode_line(lines[malformed_line]))
+                lines = lines[malformed_line + 1:]
+                continue
+            if len(decoded) == len(lines) and set(map(type, decoded)) <= {dict}:
+                records.extend(decoded)
+            else:
+                # A line holds several values, e.g., '{"a": 1}, {"b": 2}'.
+                records.extend(self._decode_line(line) for line in lines)
+            break
+        return records
+
+    @staticmethod
+    def _decode_line(line: Union[str, bytes]) -> Dict:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return {}
+        return record if isinstance(record, dict) else {}
+
+
+class AutoParser(BaseParser):
+    """
+    Parser of log files in any input format (see INPUT_FORMATS). The format of every file is detected from a sample of
+    its first FORMAT_SAMPLE_SIZE bytes (see detect_input_format), and the file is parsed by the parser of that format
+    (see PARSERS). A file that can neither be peeked nor rewound (see peek_text) is parsed as squid.
+
+    Parameters:
+        engine: Parser engine of the squid format, see ENGINES.
+        timestamp_unit: The unit of numeric timestamps. Examples: 'D', 's', 'ms', 'us', 'ns'
+        on_bad_lines: Sets the behaviour of the parser when it encounters bad lines, see CSVParser.
+        columns: Columns that are needed from the log files, see BaseParser.
+        time_range: Time range of the log entries that are kept, see BaseParser.
+    """
+
+    def __init__(self, engine: str, timestamp_unit: str, on_bad_lines: str, columns: Optional[Sequence[str]] = None,
+                 time_range: Optional[TimeRange] = None):
+        self.engine = engine
+        self.on_bad_lines = on_bad_lines
+        super().__init__(timestamp_unit, columns, time_range)
+
+    def parse_files_to_dataframe(self, files: Sequence[TextIOWrapper]) -> pd.DataFrame:
+        """
+        Parse log files, each in its own format, to a single dataframe.
+        """
+        log_dataframe = self._concat([dataframe for file in files
+                                      for dataframe in self.file_parser(file)._parse_chunks(file, chunk_size=None)])
         logger.info(f'Parsed {len(log_dataframe)} log lines')
 
         return log_dataframe
+
+    def parse_files_to_chunks(self, files: Sequence[TextIOWrapper], chunk_size: int) -> Iterator[pd.DataFrame]:
+        """
+        Parse log files, each in its own format, to a sequence of cleaned dataframes with at most chunk_size rows each.
+        """
+        for file in files:
+            yield from self.file_parser(file)._parse_chunks(file, chunk_size)
+
+    def line_timestamp(self, line: bytes) -> Optional[float]:
+        """
+        Returns the timestamp of a raw log line in the format that the line matches (see BaseParser.line_timestamp).
+        """
+        return self._parser(detect_input_format(line.decode('utf-8', errors='replace'))).line_timestamp(line)
+
+    def file_parser(self, file: TextIOWrapper) -> BaseParser:
+        """
+        Returns the parser of the input format of a log file, detected from a sample of its start.
+        """
+        input_format = detect_input_format(peek_text(file, FORMAT_SAMPLE_SIZE))
+        name = getattr(file, 'name', None)
+        if name is not None:
+            logger.info(f'Parsing {name} in the {input_format} format')
+        return self._parser(input_format)
+
+    def _parser(self, input_format: str) -> BaseParser:
+        # Parsers are created on demand, so the attributes of this parser, which key the parse cache (see
+        # CachingParser), are plain values.
+        return create_parser(input_format, self.engine, self.on_bad_lines, self.columns, self.time_range,
+                             self.timestamp_unit)
+
+
+# Parsers by input format (see INPUT_FORMATS) and parser engine (see ENGINES). The formats that pandas cannot tokenize
+# have the same parser for every engine. Every parser is created with the keyword arguments timestamp_unit,
+# on_bad_lines, columns and time_range.
+PARSERS: Dict[str, Dict[str, Callable[..., BaseParser]]] = {
+    'squid': {'pandas': functools.partial(CSVParser, separator=r'\s+'), 'fast': FastSquidParser},
+    'combined': dict.fromkeys(ENGINES, CombinedLogParser),
+    'jsonl': dict.fromkeys(ENGINES, JSONLinesParser),
+}
+
+
+def create_parser(input_format: str, engine: str, on_bad_lines: str, columns: Optional[Sequence[str]] = None,
+                  time_range: Optional[TimeRange] = None, timestamp_unit: str = 's') -> BaseParser:
+    """
+    Returns the parser of an input format (see PARSERS), or an AutoParser if input_format is 'auto'.
+
+    Raises:
+        ValueError: If the input format or the engine is unknown.
+    """
+    if input_format == 'auto':
+        return AutoParser(engine, timestamp_unit, on_bad_lines, columns, time_range)
+    if input_format not in PARSERS:
+        raise ValueError(f'Unknown input format: {input_format}')
+    if engine not in PARSERS[input_format]:
+        raise ValueError(f'Unknown engine: {engine}')
+    return PARSERS[input_format][engine](timestamp_unit=timestamp_unit, on_bad_lines=on_bad_lines, columns=columns,
+                                         time_range=time_range)
@@ -0,0 +1,215 @@
+import json
+import sys
+import time
+from typing import Dict, Optional, Union
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where peak memory is not reported.
+    resource = None
+
+
+def peak_rss() -> Optional[int]:
+    """
+    Returns the peak resident set size of the process in bytes, or None if it cannot be determined.
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+
+class StageMetrics:
+    """
+    Metrics of a pipeline stage, summed over all runs of the stage (e.g., one run per chunk). peak_rss is the highest
+    peak resident set size of the process at the end of a run, so the stage that first reaches the peak of a run
+    shows it.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.rows_in = 0
+        self.rows_out = 0
+        self.bytes_read = 0
+        self.peak_rss: Optional[int] = None
+
+    def merge(self, other: 'StageMetrics') -> None:
+        self.calls += other.calls
+        self.wall_seconds += other.wall_seconds
+        self.cpu_seconds += other.cpu_seconds
+        self.rows_in += other.rows_in
+        self.rows_out += other.rows_out
+        self.bytes_read += other.bytes_read
+        if other.peak_rss is not None:
+            self.peak_rss = max(self.peak_rss or 0, other.peak_rss)
+
+    def to_dict(self) -> Dict:
+        return {
+            'calls': self.calls,
+            'wall_seconds': self.wall_seconds,
+            'cpu_seconds': self.cpu_seconds,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'bytes_read': self.bytes_read,
+            'peak_rss_mib': None if self.peak_rss is None else self.peak_rss / (1024 * 1024),
+        }
+
+
+class Stage:
+    """
+    Context manager that measures a single run of a stage and adds it to the metrics of the stage.
+    """
+    __slots__ = ('metrics', '_wall_start', '_cpu_start')
+
+    def __init__(self, metrics: StageMetrics, rows_in: Optional[int]):
+        self.metrics = metrics
+        if rows_in is not None:
+            metrics.rows_in += rows_in
+
+    def record(self, rows_out: Optional[int] = None, bytes_read: Optional[int] = None) -> None:
+        """
+        Add the number of rows that the run produced and of bytes that it read to the metrics of the stage.
+        """
+        if rows_out is not None:
+            self.metrics.rows_out += rows_out
+        if bytes_read is not None:
+            self.metrics.bytes_read += bytes_read
+
+    def __enter__(self) -> 'Stage':
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.metrics.calls += 1
+        self.metrics.wall_seconds += time.perf_counter() - self._wall_start
+        self.metrics.cpu_seconds += time.process_time() - self._cpu_start
+        rss = peak_rss()
+        if rss is not None:
+            self.metrics.peak_rss = max(self.metrics.peak_rss or 0, rss)
+
+
+class DisabledStage:
+    """
+    Stage of a disabled profiler, which measures nothing.
+    """
+    __slots__ = ()
+
+    def record(self, rows_out: Optional[int] = None, bytes_read: Optional[int] = None) -> None:
+        pass
+
+    def __enter__(self) -> 'DisabledStage':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+DISABLED_STAGE = DisabledStage()
+
+
+class Profiler:
+    """
+    Collects wall time, CPU time, rows in and out, bytes read and peak memory per pipeline stage, and the number of
+    dropped log lines per reason. A disabled profiler hands out a shared stage that does nothing, so instrumented code
+    costs one attribute lookup and one call per stage run when profiling is off. Code that needs extra work to provide
+    a metric (e.g., to find out why lines were dropped) checks enabled first.
+
+    Parameters:
+        enabled: If true, stages are measured.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.stages: Dict[str, StageMetrics] = {}
+        self.dropped_lines: Dict[str, int] = {}
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+    def enable(self) -> None:
+        """
+        Discard all metrics and start measuring.
+        """
+        self.__init__(enabled=True)
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def stage(self, name: str, rows_in: Optional[int] = None) -> Union[Stage, DisabledStage]:
+        """
+        Returns a context manager that measures a run of the stage name, e.g.
+        ```
+        with profiler.stage('clean', rows_in=len(dataframe)) as stage:
+            dataframe = clean(dataframe)
+            stage.record(rows_out=len(dataframe))
+        ```
+        """
+        if not self.enabled:
+            return DISABLED_STAGE
+        metrics = self.stages.get(name)
+        if metrics is None:
+            metrics = self.stages[name] = StageMetrics()
+        return Stage(metrics, rows_in)
+
+    def count_dropped_lines(self, reason: str, count: int) -> None:
+        if self.enabled and count > 0:
+            self.dropped_lines[reason] = self.dropped_lines.get(reason, 0) + count
+
+    def merge(self, other: 'Profiler') -> None:
+        """
+        Add the metrics of another profiler, e.g., of a worker process, to this one.
+        """
+        for name, metrics in other.stages.items():
+            self.stages.setdefault(name, StageMetrics()).merge(metrics)
+        for reason, count in other.dropped_lines.items():
+            self.count_dropped_lines(reason, count)
+
+    def report(self) -> Dict:
+        """
+        Returns the metrics of all stages in the order they first ran, the dropped lines per reason and the totals
+        since the profiler was enabled.
+        """
+        rss = peak_rss()
+        return {
+            'stages': {name: metrics.to_dict() for name, metrics in self.stages.items()},
+            'dropped_lines': dict(self.dropped_lines),
+            'total': {
+                'wall_seconds': time.perf_counter() - self._wall_start,
+                'cpu_seconds': time.process_time() - self._cpu_start,
+                'peak_rss_mib': None if rss is None else rss / (1024 * 1024),
+            },
+        }
+
+    def write_report(self, path: str) -> None:
+        """
+        Write the report as JSON to the file at path, or as a table to stderr if path is '-'.
+        """
+        report = self.report()
+        if path != '-':
+            with open(path, 'w', encoding='utf-8') as report_file:
+                json.dump(report, report_file, indent=2)
+            return
+
+        lines = [f'{"stage":<16} {"calls":>7} {"wall s":>9} {"cpu s":>9} {"rows in":>12} {"rows out":>12} '
+                 f'{"MiB read":>10} {"peak RSS MiB":>13}']
+        for name, metrics in report['stages'].items():
+            lines.append(f'{name:<16} {metrics["calls"]:>7} {metrics["wall_seconds"]:>9.3f} '
+                         f'{metrics["cpu_seconds"]:>9.3f} {metrics["rows_in"]:>12,} {metrics["rows_out"]:>12,} '
+                         f'{metrics["bytes_read"] / (1024 * 1024):>10.1f} {self._format_mib(metrics["peak_rss_mib"])}')
+        total = report['total']
+        lines.append(f'{"total":<16} {"":>7} {total["wall_seconds"]:>9.3f} {total["cpu_seconds"]:>9.3f} '
+                     f'{"":>12} {"":>12} {"":>10} {self._format_mib(total["peak_rss_mib"])}')
+        dropped_lines = ', '.join(f'{reason}: {count:,}' for reason, count in report['dropped_lines'].items())
+        lines.append(f'Dropped lines: {dropped_lines or "none"}')
+        sys.stderr.write('\n'.join(lines) + '\n')
+
+    @staticmethod
+    def _format_mib(mib: Optional[float]) -> str:
+        return f'{"-":>13}' if mib is None else f'{mib:>13.1f}'
+
+
+# The profiler of this process. It is disabled unless profiling was requested (--profile).
+profiler = Profiler()
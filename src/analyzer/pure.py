@@ -0,0 +1,328 @@
+import logging
+import math
+import re
+from io import TextIOWrapper
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+
+from analyzer.engine import (COLUMNS, DIMENSIONS, GROUP_METRICS, NUMERIC_COLUMNS, PERCENTILE_COLUMNS,
+                             PERCENTILE_DIMENSIONS, PERCENTILES, URL_HOST_PATTERN, StatisticsEngine, group_primitive,
+                             percentile_primitive, percentile_rank, percentile_summary)
+from analyzer.files import byte_range_start, file_path
+from analyzer.profiling import profiler
+from analyzer.rejects import REJECT_REASONS, LineSource, reject_log
+
+logger = logging.getLogger(__name__)
+
+# Fields are separated by spaces and tabs, like in the C tokenizer of pandas with sep=r'\s+'. Other whitespace (e.g.,
+# form feeds) is part of a field.
+FIELD_SEPARATOR = re.compile(r'[ \t]+')
+# Numbers that pd.to_numeric parses: integers, decimals with an optional exponent, and infinity
+INTEGER_PATTERN = re.compile(r'[+-]?[0-9]+')
+FLOAT_PATTERN = re.compile(r'[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?|[+-]?inf(?:inity)?', re.IGNORECASE)
+# Positions of the numeric fields in a log line, and of the field that holds the key of every dimension
+NUMERIC_FIELDS = [COLUMNS.index(column) for column in NUMERIC_COLUMNS]
+DIMENSION_FIELDS = {dimension: COLUMNS.index('url' if dimension == 'host' else dimension) for dimension in DIMENSIONS}
+NANOSECONDS_PER_SECOND = 10 ** 9
+
+
+def parse_number(field: str) -> Optional[Union[int, float]]:
+    """
+    Returns the number in a field like pd.to_numeric: an int if the field is an integer, a float if it is a decimal
+    number, or None if it is not a number. Decimals with more than 15 significant digits may differ from pandas in the
+    last bit, as pandas does not always round them correctly.
+    """
+    if field.isdigit() and field.isascii():
+        return int(field)
+    if INTEGER_PATTERN.fullmatch(field):
+        return int(field)
+    if FLOAT_PATTERN.fullmatch(field):
+        return float(field)
+    return None
+
+
+def timestamp_nanoseconds(timestamp: Union[int, float]) -> int:
+    """
+    Returns a timestamp in seconds as nanoseconds since the Unix epoch, rounded like pd.to_datetime(unit='s'): the
+    fraction of a float timestamp is rounded to whole nanoseconds.
+
+    Raises:
+        ValueError: If the timestamp is out of the range of pd.Timestamp.
+    """
+    try:
+        if isinstance(timestamp, int):
+            nanoseconds = timestamp * NANOSECONDS_PER_SECOND
+        else:
+            seconds = int(timestamp)
+            fraction = round((timestamp - seconds) * NANOSECONDS_PER_SECOND) / NANOSECONDS_PER_SECOND
+            nanoseconds = seconds * NANOSECONDS_PER_SECOND + int(fraction * NANOSECONDS_PER_SECOND)
+    except OverflowError:
+        nanoseconds = None
+    if nanoseconds is None or not -2 ** 63 < nanoseconds < 2 ** 63:
+        raise ValueError(f'Timestamp {timestamp} is out of bounds')
+    return nanoseconds
+
+
+def split_fields(line: str, lines: Iterator[str]) -> List[str]:
+    """
+    Returns the fields of a log line, which starts a row. Like in the C tokenizer of pandas, a field that starts with a
+    double quote is quoted: it ends at the next double quote that is not doubled (two double quotes stand for one) and
+    can span lines, which are then taken from lines.
+
+    Raises:
+        ValueError: If a quoted field is not closed before the end of the file.
+    """
+    line = line.rstrip('\n')
+    if '"' not in line:
+        line = line.strip(' \t')
+        return FIELD_SEPARATOR.split(line) if line else []
+
+    fields = []
+    field = []
+    in_field = in_quotes = after_quote = False
+    while True:
+        for char in line:
+            if in_quotes:
+                if char == '"':
+                    in_quotes, after_quote = False, True
+                else:
+                    field.append(char)
+            elif char in ' \t':
+                if in_field:
+                    fields.append(''.join(field))
+                    field, in_field, after_quote = [], False, False
+            elif char == '"' and (not in_field or after_quote):
+                if after_quote:
+                    # A doubled double quote within a quoted field
+                    field.append(char)
+                in_field, in_quotes, after_quote = True, True, False
+            else:
+                field.append(char)
+                in_field, after_quote = True, False
+        if not in_quotes:
+            break
+        line = next(lines, None)
+        if line is None:
+            raise ValueError('EOF inside a quoted field')
+        field.append('\n')
+        line = line.rstrip('\n')
+    if in_field:
+        fields.append(''.join(field))
+    return fields
+
+
+class PythonLogStatistics(StatisticsEngine):
+    """
+    Statistics engine that parses log files line by line and aggregates the log entries in plain Python objects,
+    without importing pandas or numpy. Importing pandas alone takes longer than analyzing a small log file, so this
+    engine is used for small inputs (see SMALL_INPUT_SIZE). Memory scales with the number of distinct keys, like with a
+    LogStatisticsAccumulator.
+
+    Lines are validated and rejected like by the parsers of analyzer.parsing (see REJECT_REASONS), and the statistics
+    are identical to those of LogStatistics. Of IPs with equal counts, the most frequent IP is the one that appears
+    first and the least frequent IP the one that appears last, like with a stable sort of the counts. Timestamps are in
+    seconds. Time ranges and the events per time bucket (eps_series) are not supported. The percentiles are exact, so
+    all elapsed times and response sizes are kept in memory if they are requested.
+
+    Parameters:
+        primitives: Primitive aggregates (see analyzer.statistics.PRIMITIVES) to accumulate, e.g., those of a
+        StatisticsPlan. The row count is always accumulated.
+    Raises:
+        ValueError: If a statistic is requested before any log entry has been accumulated or if a primitive it depends
+        on is not accumulated.
+    """
+
+    def __init__(self, primitives: Sequence[str]):
+        self.primitives = {'row_count', *primitives}
+        self.row_count = 0
+        # Counts in order of first appearance of the IPs
+        self.ip_counts: Dict[str, int] = {}
+        self.min_timestamp: Optional[int] = None
+        self.max_timestamp: Optional[int] = None
+        self.response_header_size_sum: Union[int, float] = 0
+        self.response_size_sum: Union[int, float] = 0
+        # Requests and bytes per key of every dimension of the accumulated group totals
+        self.group_totals: Dict[str, Dict[str, List[Union[int, float]]]] = {
+            dimension: {} for dimension in DIMENSIONS if group_primitive(dimension) in self.primitives}
+        # Elapsed times and response sizes that are not negative, overall (under the key None) and per key of every
+        # dimension of the accumulated percentiles
+        self.sizes: Dict[Optional[str], Dict[Optional[str], List[List[Union[int, float]]]]] = {
+            dimension: {} for dimension in [None, *PERCENTILE_DIMENSIONS]
+            if percentile_primitive(dimension) in self.primitives}
+        self._hosts: Dict[str, str] = {}
+        self._url_host_pattern = re.compile(URL_HOST_PATTERN)
+
+    def update(self, file: TextIOWrapper) -> None:
+        """
+        Parse the lines of a log file and add its valid log entries to the accumulated aggregates. Malformed lines are
+        rejected (see RejectLog).
+        """
+        source = LineSource(str(getattr(file, 'name', '<stream>')), file_path(file), byte_range_start(file))
+        count_ips = 'ip_counts' in self.primitives
+        track_timestamps = 'timestamp_range' in self.primitives
+        sum_sizes = 'size_sums' in self.primitives
+        group_fields = [(DIMENSION_FIELDS[dimension], dimension == 'host', totals)
+                        for dimension, totals in self.group_totals.items()]
+        size_fields = [(None if dimension is None else DIMENSION_FIELDS[dimension], sizes)
+                       for dimension, sizes in self.sizes.items()]
+        ip_field = COLUMNS.index('client_ip')
+        rejected_lines: List[int] = []
+        reasons: List[str] = []
+        line_count = 0
+        row_count = 0
+        with profiler.stage('parse') as stage:
+            lines = iter(file)
+            for line_number, line in enumerate(lines, start=1):
+                fields = split_fields(line, lines)
+                if not any(fields):
+                    continue
+                line_count += 1
+                reason = self._reject_reason(fields)
+                if reason is None:
+                    numbers = [parse_number(fields[position]) for position in NUMERIC_FIELDS]
+                    if None in numbers:
+                        reason = REJECT_REASONS[2 + numbers.index(None)]
+                if reason is not None:
+                    rejected_lines.append(line_number)
+                    reasons.append(reason)
+                    continue
+                if len(fields) < len(COLUMNS):
+                    fields.extend([''] * (len(COLUMNS) - len(fields)))
+
+                row_count += 1
+                timestamp, header_size, size = numbers
+                if count_ips:
+                    ip = fields[ip_field]
+                    self.ip_counts[ip] = self.ip_counts.get(ip, 0) + 1
+                if track_timestamps:
+                    nanoseconds = timestamp_nanoseconds(timestamp)
+                    if self.min_timestamp is None or nanoseconds < self.min_timestamp:
+                        self.min_timestamp = nanoseconds
+                    if self.max_timestamp is None or nanoseconds > self.max_timestamp:
+                        self.max_timestamp = nanoseconds
+                for field, sizes in size_fields:
+                    key_sizes = sizes.get(None if field is None else fields[field])
+                    if key_sizes is None:
+                        key_sizes = sizes[None if field is None else fields[field]] = [[], []]
+                    if header_size >= 0 and math.isfinite(header_size):
+                        key_sizes[0].append(header_size)
+                    if size >= 0 and math.isfinite(size):
+                        key_sizes[1].append(size)
+                header_size = header_size if header_size > 0 else 0
+                size = size if size > 0 else 0
+                if sum_sizes:
+                    self.response_header_size_sum += header_size
+                    self.response_size_sum += size
+                for field, is_host, totals in group_fields:
+                    key = self._host(fields[field]) if is_host else fields[field]
+                    key_totals = totals.get(key)
+                    if key_totals is None:
+                        totals[key] = [1, header_size + size]
+                    else:
+                        key_totals[0] += 1
+                        key_totals[1] += header_size + size
+            stage.record(rows_out=row_count)
+        self.row_count += row_count
+
+        if rejected_lines:
+            logger.warning(f'Ignored {len(rejected_lines)} log entries with unexpected values')
+            if profiler.enabled:
+                for reason in REJECT_REASONS:
+                    profiler.count_dropped_lines(reason, reasons.count(reason))
+        reject_log.add(source, line_count, rejected_lines, reasons)
+
+    def most_frequent_ip(self) -> str:
+        """
+        Returns the most frequent (Client) IP, of IPs with equal counts the one that appears first.
+        """
+        self._raise_if_empty('ip_counts')
+        return max(self.ip_counts, key=self.ip_counts.__getitem__)
+
+    def least_frequent_ip(self) -> str:
+        """
+        Returns the least frequent (Client) IP, of IPs with equal counts the one that appears last.
+        """
+        self._raise_if_empty('ip_counts')
+        return min(reversed(self.ip_counts), key=self.ip_counts.__getitem__)
+
+    def distinct_ip_count(self) -> int:
+        """
+        Returns the number of distinct (Client) IPs.
+        """
+        self._raise_if_empty('ip_counts')
+        return len(self.ip_counts)
+
+    def events_per_second(self) -> float:
+        """
+        Returns the average number of events per second, see LogStatistics.events_per_second.
+        """
+        self._raise_if_empty('timestamp_range')
+        return self.row_count / ((self.max_timestamp - self.min_timestamp) // NANOSECONDS_PER_SECOND)
+
+    def total_amount_of_bytes_exchanged(self) -> int:
+        """
+        Returns total amount of bytes exchanged by adding the sums of the positive header and response sizes.
+        See LogStatistics.total_amount_of_bytes_exchanged for details.
+        """
+        self._raise_if_empty('size_sums')
+        return int(self.response_header_size_sum + self.response_size_sum)
+
+    def eps_series(self, bucket: str) -> Dict:
+        raise ValueError('The events per time bucket (eps_series) are not computed by the python engine.')
+
+    def group_breakdown(self, dimension: str, top: Optional[int] = None, top_by: str = 'requests') -> List[Dict]:
+        """
+        Returns the requests and bytes per key of a dimension, ordered like by LogStatistics.group_breakdown.
+        """
+        self._raise_if_empty(group_primitive(dimension))
+        metric = GROUP_METRICS.index(top_by)
+        ordered = sorted(self.group_totals[dimension].items(),
+                         key=lambda item: (-item[1][metric], -item[1][1 - metric], item[0]))
+        if top is not None:
+            ordered = ordered[:top]
+        return [{'key': key, 'requests': int(requests), 'bytes': int(bytes_exchanged)}
+                for key, (requests, bytes_exchanged) in ordered]
+
+    def percentiles(self, by: Optional[str] = None) -> Dict:
+        """
+        Returns the exact percentiles and maximum of the elapsed time and the response size, see
+        LogStatistics.percentiles.
+        """
+        self._raise_if_empty(percentile_primitive())
+        percentiles = self._size_percentiles(self.sizes[None][None])
+        if by is not None:
+            self._raise_if_empty(percentile_primitive(by))
+            percentiles[f'by_{by}'] = {key: self._size_percentiles(key_sizes)
+                                       for key, key_sizes in sorted(self.sizes[by].items())}
+        return percentiles
+
+    @staticmethod
+    def _size_percentiles(sizes: List[List[Union[int, float]]]) -> Dict:
+        percentiles = {}
+        for column, values in zip(PERCENTILE_COLUMNS, sizes):
+            values = sorted(values)
+            ranks = [percentile_rank(len(values), percentile) for percentile in PERCENTILES] + [len(values) - 1]
+            percentiles[column] = percentile_summary([values[rank] for rank in ranks] if values else None)
+        return percentiles
+
+    def _reject_reason(self, fields: List[str]) -> Optional[str]:
+        """
+        Returns the reason why a non-blank line with fields is rejected before its numbers are parsed: too many fields
+        or missing fields (a numeric field that is missing or empty), or None.
+        """
+        if len(fields) > len(COLUMNS):
+            return REJECT_REASONS[0]
+        if len(fields) <= NUMERIC_FIELDS[-1] or not all(fields[position] for position in NUMERIC_FIELDS):
+            return REJECT_REASONS[1]
+        return None
+
+    def _host(self, url: str) -> str:
+        host = self._hosts.get(url)
+        if host is None:
+            host = self._hosts[url] = self._url_host_pattern.match(url).group(1)
+        return host
+
+    def _raise_if_empty(self, primitive: str) -> None:
+        if self.row_count == 0:
+            raise ValueError('No log entries have been accumulated.')
+        if primitive not in self.primitives:
+            raise ValueError(f'The primitive {primitive} has not been accumulated.')
@@ -0,0 +1,166 @@
+import csv
+import logging
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from analyzer.files import count_newlines
+
+# Lines are also rejected by the pure-Python engine (see analyzer.pure), which does not import numpy.
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Reasons why the parsers reject a log line, in the order they are checked
+REJECT_REASONS = ['too_many_fields', 'missing_fields', 'malformed_timestamp', 'malformed_response_header_size',
+                  'malformed_response_size']
+# Columns of the rejects file
+REJECT_COLUMNS = ['source', 'line', 'reason']
+# The maximum reject ratio is checked during a run only once this number of lines was validated, so a few malformed
+# lines at the start of the input do not abort it.
+MIN_LINES_FOR_REJECT_RATIO = 1000
+
+
+class LineSource(NamedTuple):
+    """
+    An input that log lines are parsed from: its name, its path if it is a regular file on disk, and the byte offset in
+    that file of the first parsed line (e.g., of a shard or of a time range). Line numbers within the input are
+    relative to this offset.
+    """
+    name: str
+    path: Optional[str] = None
+    start: int = 0
+
+
+class RejectLog:
+    """
+    Counts the log lines that the parsers validate and reject, and keeps a trail of the rejected lines. With a path,
+    every rejected line is written to a CSV file with the columns REJECT_COLUMNS (source, line number and reason, see
+    REJECT_REASONS) as soon as it is rejected. With a maximum reject ratio, the run is aborted once a larger fraction
+    of the validated lines was rejected. A worker process collects its rejected lines instead of writing them, and the
+    parent process merges them. A disabled reject log ignores everything.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.path: Optional[str] = None
+        self.max_ratio: Optional[float] = None
+        self.collect = False
+        self.line_count = 0
+        self.reject_count = 0
+        self.rejects: List[Tuple[LineSource, 'np.ndarray', 'np.ndarray']] = []
+        self._file = None
+        self._writer = None
+        # Number of lines before a byte offset, per path, as counted last
+        self._line_offsets: Dict[str, Tuple[int, int]] = {}
+
+    def enable(self, path: Optional[str] = None, max_ratio: Optional[float] = None, collect: bool = False) -> None:
+        """
+        Discard all counts and start counting rejected lines. If path is set, they are written to the CSV file at path.
+        If max_ratio is set, add raises a ValueError once more than this fraction of the lines was rejected. If collect
+        is set, the rejected lines are kept in rejects, e.g., to be merged into the reject log of the parent process.
+        """
+        self.close()
+        self.__init__()
+        self.enabled = True
+        self.path = path
+        self.max_ratio = max_ratio
+        self.collect = collect
+        if path is not None:
+            self._file = open(path, 'w', encoding='utf-8', newline='')
+            self._writer = csv.writer(self._file, lineterminator='\n')
+            self._writer.writerow(REJECT_COLUMNS)
+            # Nothing is left in the buffer that a forked worker process could flush a second time.
+            self._file.flush()
+
+    def disable(self) -> None:
+        if self._file is not None:
+            logger.info(f'Wrote {self.reject_count} rejected log lines to {self.path}')
+        self.close()
+        self.enabled = False
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+    def add(self, source: LineSource, line_count: int, lines: Union['np.ndarray', Sequence[int]],
+            reasons: Union['np.ndarray', Sequence[str]]) -> None:
+        """
+        Add line_count validated lines of source, of which the lines with the given (1-based) line numbers were
+        rejected for the given reasons.
+
+        Raises:
+            ValueError: If more than the maximum reject ratio of the lines was rejected so far.
+        """
+        if not self.enabled:
+            return
+        self.line_count += line_count
+        self.reject_count += len(lines)
+        if len(lines) > 0:
+            if self.collect:
+                import numpy as np
+                self.rejects.append((source, np.asarray(lines), np.asarray(reasons)))
+            if self._writer is not None:
+                self._write(source, lines, reasons)
+        self.check(final=False)
+
+    def merge(self, other: 'RejectLog') -> None:
+        """
+        Add the counts and rejected lines of another reject log, e.g., of a worker process, to this one.
+
+        Raises:
+            ValueError: If more than the maximum reject ratio of the lines was rejected so far.
+        """
+        if not self.enabled:
+            return
+        self.line_count += other.line_count
+        self.reject_count += other.reject_count
+        for source, lines, reasons in other.rejects:
+            if self.collect:
+                self.rejects.append((source, lines, reasons))
+            if self._writer is not None:
+                self._write(source, lines, reasons)
+        self.check(final=False)
+
+    def check(self, final: bool = True) -> None:
+        """
+        Check the ratio of rejected lines. Unless final is set (at the end of a run), it is checked only once
+        MIN_LINES_FOR_REJECT_RATIO lines were validated.
+
+        Raises:
+            ValueError: If more than the maximum reject ratio of the lines was rejected.
+        """
+        if not self.enabled or self.max_ratio is None or self.line_count == 0:
+            return
+        if not final and self.line_count < MIN_LINES_FOR_REJECT_RATIO:
+            return
+        if self.reject_count > self.max_ratio * self.line_count:
+            raise ValueError(f'Rejected {self.reject_count} of {self.line_count} log lines '
+                             f'({self.reject_count / self.line_count:.2%}), more than the maximum reject ratio of '
+                             f'{self.max_ratio:.2%}')
+
+    def _write(self, source: LineSource, lines: Union['np.ndarray', Sequence[int]],
+               reasons: Union['np.ndarray', Sequence[str]]) -> None:
+        line_offset = self._line_offset(source)
+        self._writer.writerows((source.name, line_offset + int(line), reason) for line, reason in zip(lines, reasons))
+        self._file.flush()
+
+    def _line_offset(self, source: LineSource) -> int:
+        """
+        Returns the number of lines in the file of source before its start. They are counted from the last counted
+        offset of the same file if possible, so the shards of a file, which come in order, are counted only once.
+        """
+        if source.start == 0 or source.path is None:
+            return 0
+        offset, line_count = self._line_offsets.get(source.path, (0, 0))
+        if offset > source.start:
+            offset, line_count = 0, 0
+        line_count += count_newlines(source.path, offset, source.start)
+        self._line_offsets[source.path] = (source.start, line_count)
+        return line_count
+
+
+# The reject log of this process. It is disabled unless rejected lines are written (--rejects) or limited
+# (--max-reject-ratio).
+reject_log = RejectLog()
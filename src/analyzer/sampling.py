@@ -0,0 +1,306 @@
+import io
+import logging
+import math
+import mmap
+import os
+import random
+from io import TextIOWrapper
+from statistics import NormalDist
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from analyzer.parsing import PROJECTION_CHUNK_SIZE, BaseParser
+from analyzer.statistics import GROUP_PRIMITIVES, LogStatistics
+from analyzer.timerange import SEARCH_SCAN_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Blocks are at most this large, and smaller for small samples so a sample has about MIN_SAMPLE_BLOCKS blocks to
+# estimate the variance from, but never smaller than MIN_SAMPLE_BLOCK_SIZE.
+SAMPLE_BLOCK_SIZE = 1024 * 1024
+MIN_SAMPLE_BLOCK_SIZE = 16 * 1024
+MIN_SAMPLE_BLOCKS = 32
+CONFIDENCE_LEVEL = 0.95
+# Statistics that cannot be extrapolated from a sample and are those of the sample: the most and least frequent IPs are
+# guesses, and the number of distinct IPs is a lower bound.
+SAMPLE_STATISTICS = ['mfip', 'lfip', 'distinct_ips']
+
+
+class SampleBlock(NamedTuple):
+    """
+    A block of a log file: the byte range [start, end) before it is aligned to lines.
+    """
+    path: str
+    start: int
+    end: int
+
+
+class MappedRangeReader(io.RawIOBase):
+    """
+    Read-only binary file over a range of a memory-mapped file, which is read without copying it first.
+
+    Parameters:
+        buffer: The range of the memory-mapped file. It is released when the reader is closed.
+        name: Name of the file (e.g., its path).
+    """
+
+    def __init__(self, buffer: memoryview, name: str):
+        super().__init__()
+        self.name = name
+        self._buffer = buffer
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        # Seeking lets the format of a block be detected from its first lines (see peek_text).
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._buffer)}[whence]
+        self._position = min(max(base + offset, 0), len(self._buffer))
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        read_count = min(len(buffer), len(self._buffer) - self._position)
+        memoryview(buffer)[:read_count] = self._buffer[self._position:self._position + read_count]
+        self._position += read_count
+        return read_count
+
+    def close(self) -> None:
+        self._buffer.release()
+        super().close()
+
+
+class LogSample:
+    """
+    Random sample of the lines of uncompressed log files for fast approximate statistics. The files are split into
+    blocks of equal size, and a random subset of fraction of all blocks of all files is drawn, so every block (and
+    thus every line) is in the sample with the same probability. A block holds the lines that start in it. Totals
+    over all lines are estimated from the totals of the sampled blocks by scaling them up, with a standard error from
+    the variance between the blocks.
+
+    Parameters:
+        paths: Paths of the log files.
+        fraction: Fraction of the blocks that are sampled, in (0, 1].
+        seed: Seed of the random choice of blocks. The same seed and files always give the same sample. If None, a
+        random seed is chosen (and reported with the results, so the sample can be repeated).
+    Raises:
+        ValueError: If fraction is not in (0, 1].
+    """
+
+    def __init__(self, paths: Sequence[str], fraction: float, seed: Optional[int] = None):
+        if not 0 < fraction <= 1:
+            raise ValueError(f'The sample fraction must be in (0, 1], got {fraction}')
+        self.paths = list(paths)
+        self.fraction = fraction
+        self.seed = seed if seed is not None else random.SystemRandom().randrange(2 ** 32)
+        self.file_sizes = [os.path.getsize(path) for path in self.paths]
+        total_size = sum(self.file_sizes)
+        self.block_size = int(min(SAMPLE_BLOCK_SIZE,
+                                  max(MIN_SAMPLE_BLOCK_SIZE, total_size * fraction / MIN_SAMPLE_BLOCKS)))
+        population = [SampleBlock(path, start, min(start + self.block_size, size))
+                      for path, size in zip(self.paths, self.file_sizes)
+                      for start in range(0, size, self.block_size)]
+        self.block_count = len(population)
+        sample_size = min(self.block_count, max(1, round(self.block_count * fraction)))
+        chosen = random.Random(self.seed).sample(range(self.block_count), sample_size) if population else []
+        self.blocks = [population[block] for block in sorted(chosen)]
+
+    def parse(self, parser: BaseParser) -> Optional['SampledLogStatistics']:
+        """
+        Parses the sampled blocks of the memory-mapped files with parser and returns the statistics extrapolated from
+        them, or None if the sample holds no log entries.
+        """
+        chunks = []
+        block_sizes = []
+        block_rows = []
+        time_bounds = []
+        for path, size in zip(self.paths, self.file_sizes):
+            if size == 0:
+                continue
+            with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+                time_bounds.extend(_time_bounds(mapped_file, parser.line_timestamp))
+                for block in self.blocks:
+                    if block.path != path:
+                        continue
+                    start, end = _line_start(mapped_file, block.start), _line_start(mapped_file, block.end)
+                    block_sizes.append(end - start)
+                    with TextIOWrapper(MappedRangeReader(memoryview(mapped_file)[start:end], path),
+                                       encoding='utf-8') as block_file:
+                        block_chunks = list(parser.parse_files_to_chunks([block_file], PROJECTION_CHUNK_SIZE))
+                    chunks.extend(chunk for chunk in block_chunks if len(chunk) > 0)
+                    block_rows.append(sum(len(chunk) for chunk in block_chunks))
+        logger.info(f'Sampled {len(self.blocks)} of {self.block_count} blocks of {self.block_size} bytes '
+                    f'({sum(block_sizes)} of {sum(self.file_sizes)} bytes) with seed {self.seed}')
+
+        block_sizes = np.array(block_sizes, dtype='int64')
+        block_rows = np.array(block_rows, dtype='int64')
+        if not chunks:
+            return None
+        log_dataframe = BaseParser._concat(chunks)
+        header_sizes, response_sizes = (log_dataframe[column].to_numpy()
+                                        for column in ['response_header_size', 'response_size'])
+        sizes = np.where(header_sizes > 0, header_sizes, 0) + np.where(response_sizes > 0, response_sizes, 0)
+        block_bytes = np.bincount(np.repeat(np.arange(len(block_rows)), block_rows), weights=sizes,
+                                  minlength=len(block_rows))
+
+        time_range = parser.time_range
+        time_bounds = [pd.Timestamp(seconds, unit='s') for seconds in time_bounds]
+        if time_range is not None:
+            time_bounds = [timestamp for timestamp in time_bounds
+                           if (time_range.since is None or timestamp >= time_range.since)
+                           and (time_range.until is None or timestamp < time_range.until)]
+        return SampledLogStatistics(log_dataframe, self, block_sizes, block_rows, block_bytes, time_bounds)
+
+    def description(self, sampled_bytes: int) -> Dict:
+        """
+        Returns the description of the sample that marks results as approximate.
+        """
+        return {'sample_fraction': sampled_bytes / sum(self.file_sizes), 'sampled_blocks': len(self.blocks),
+                'blocks': self.block_count, 'block_size': self.block_size, 'seed': self.seed,
+                'confidence_level': CONFIDENCE_LEVEL}
+
+
+class SampledLogStatistics(LogStatistics):
+    """
+    Statistics extrapolated from the log entries of a LogSample. The number of log entries, the bytes exchanged and
+    the requests and bytes per group are scaled up from the sampled bytes of the log files to all bytes (a ratio
+    estimate, which also accounts for blocks of different sizes). The time span of eps also covers the first and last
+    log lines of every file, which are read directly. The IP statistics are those of the sample: the most and least
+    frequent IPs are estimates, and the number of distinct IPs is a lower bound.
+
+    Parameters:
+        log_dataframe: The log entries of the sampled blocks.
+        sample: The sample.
+        block_sizes: Number of bytes per sampled block, aligned to lines.
+        block_rows: Number of log entries per sampled block.
+        block_bytes: Bytes exchanged per sampled block.
+        time_bounds: Timestamps of log lines outside of the sample that widen the time span.
+    """
+
+    def __init__(self, log_dataframe: pd.DataFrame, sample: LogSample, block_sizes: np.ndarray, block_rows: np.ndarray,
+                 block_bytes: np.ndarray, time_bounds: Sequence[pd.Timestamp] = ()):
+        super().__init__(log_dataframe)
+        self.sample = sample
+        self.block_sizes = block_sizes
+        self.block_rows = block_rows
+        self.block_bytes = block_bytes
+        self.time_bounds = list(time_bounds)
+
+    @property
+    def scale(self) -> float:
+        """
+        Returns the factor from totals over the sampled blocks to estimated totals over the whole log files.
+        """
+        return sum(self.sample.file_sizes) / self.block_sizes.sum()
+
+    def estimate(self, block_totals: np.ndarray) -> Tuple[float, Optional[float]]:
+        """
+        Returns the estimated total over the whole log files from the totals of the sampled blocks, and its standard
+        error. The standard error is None if it cannot be estimated from a single block.
+        """
+        block_count, sample_size = self.sample.block_count, len(self.block_sizes)
+        estimate = float(block_totals.sum()) * self.scale
+        if sample_size == block_count:
+            return estimate, 0.0
+        if sample_size < 2:
+            return estimate, None
+        # Variance of the ratio estimate under simple random sampling of blocks without replacement, from the residuals
+        # of the block totals around the ratio to the block sizes
+        residuals = block_totals - block_totals.sum() / self.block_sizes.sum() * self.block_sizes
+        variance = block_count ** 2 * (1 - sample_size / block_count) * residuals.var(ddof=1) / sample_size
+        return estimate, math.sqrt(variance)
+
+    def aggregate(self, primitives: Sequence[str], eps_bucket: Optional[str] = None) -> None:
+        new_primitives = [primitive for primitive in primitives if primitive in EXTRAPOLATIONS
+                          and (primitive, None) not in self._aggregates]
+        super().aggregate(primitives, eps_bucket)
+        for primitive in new_primitives:
+            self._aggregates[(primitive, None)] = EXTRAPOLATIONS[primitive](self, self._aggregates[(primitive, None)])
+
+    def error_bounds(self) -> Dict[str, Dict]:
+        """
+        Returns the standard errors and confidence intervals (at CONFIDENCE_LEVEL) of the estimated bytes exchanged and
+        events per second. The intervals are None if they cannot be estimated (from a single block). The lower bounds
+        are never below what was seen in the sample. The SAMPLE_STATISTICS are marked as taken from the sample.
+        """
+        seconds = self._seconds()
+        error_bounds = {}
+        for statistic, block_totals, divisor in [('eps', self.block_rows, seconds), ('bytes', self.block_bytes, 1)]:
+            estimate, standard_error = self.estimate(block_totals)
+            if standard_error is None:
+                error_bounds[statistic] = {'standard_error': None, 'confidence_interval': None}
+                continue
+            margin = NormalDist().inv_cdf((1 + CONFIDENCE_LEVEL) / 2) * standard_error
+            low = max(estimate - margin, float(block_totals.sum()))
+            high = estimate + margin
+            error_bounds[statistic] = {'standard_error': standard_error / divisor,
+                                       'confidence_interval': [float(low / divisor), float(high / divisor)]}
+        error_bounds.update({statistic: {'from_sample': True} for statistic in SAMPLE_STATISTICS})
+        error_bounds['distinct_ips']['lower_bound'] = True
+        return error_bounds
+
+    def description(self) -> Dict:
+        """
+        Returns the description of the sample, with the statistics that are those of the sample (see
+        SAMPLE_STATISTICS) under 'from_sample'.
+        """
+        return dict(self.sample.description(int(self.block_sizes.sum())), from_sample=SAMPLE_STATISTICS)
+
+    def _seconds(self) -> int:
+        min_timestamp, max_timestamp = self._aggregate('timestamp_range')
+        return (max_timestamp - min_timestamp) // pd.Timedelta(seconds=1)
+
+    def _widen_time_range(self, timestamp_range: Tuple[pd.Timestamp, pd.Timestamp]) -> Tuple[pd.Timestamp,
+                                                                                           pd.Timestamp]:
+        return min([timestamp_range[0], *self.time_bounds]), max([timestamp_range[1], *self.time_bounds])
+
+
+def _scale_groups(log_statistics: SampledLogStatistics, group_totals: pd.DataFrame) -> pd.DataFrame:
+    return (group_totals * log_statistics.scale).round().astype('int64')
+
+
+# How the primitives of the sampled log entries are extrapolated to all log entries. The IP counts are kept.
+EXTRAPOLATIONS: Dict[str, Callable[[SampledLogStatistics, Any], Any]] = {
+    'row_count': lambda log_statistics, row_count: round(row_count * log_statistics.scale),
+    'size_sums': lambda log_statistics, size_sums: tuple(size_sum * log_statistics.scale
+                                                         for size_sum in size_sums),
+    'timestamp_range': SampledLogStatistics._widen_time_range,
+    **{primitive: _scale_groups for primitive in GROUP_PRIMITIVES},
+}
+
+
+def _line_start(mapped_file: mmap.mmap, offset: int) -> int:
+    """
+    Returns the offset of the first line that starts at or after offset.
+    """
+    if offset <= 0:
+        return 0
+    newline = mapped_file.find(b'\n', offset - 1)
+    return len(mapped_file) if newline < 0 else newline + 1
+
+
+def _time_bounds(mapped_file: mmap.mmap, line_timestamp: Callable[[bytes], Optional[float]]) -> List[float]:
+    """
+    Returns the timestamps of the first and the last line with a valid timestamp within SEARCH_SCAN_SIZE bytes of the
+    start and the end of a file.
+    """
+    time_bounds = []
+    head_end = min(SEARCH_SCAN_SIZE, len(mapped_file))
+    tail_start = max(len(mapped_file) - SEARCH_SCAN_SIZE, 0)
+    head_lines = mapped_file[:head_end].split(b'\n')
+    tail_lines = mapped_file[tail_start:].split(b'\n')
+    # Unless the head or the tail is the whole file, its last or first line may be cut off.
+    for lines in [head_lines[:-1] if head_end < len(mapped_file) else head_lines,
+                  reversed(tail_lines[1:] if tail_start > 0 else tail_lines)]:
+        timestamp = next((timestamp for timestamp in map(line_timestamp, lines) if timestamp is not None), None)
+        if timestamp is not None:
+            time_bounds.append(timestamp)
+    return time_bounds
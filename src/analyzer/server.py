@@ -0,0 +1,433 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import socketserver
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import TextIOWrapper
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from analyzer import point_in_time, time_bucket
+from analyzer.defaults import ENGINES
+from analyzer.engine import STATISTICS, StatisticsPlan
+from analyzer.files import FINGERPRINT_BLOCK_SIZE, is_compressed, last_line_end, open_byte_range, open_log_file
+from analyzer.formats import INPUT_FORMATS
+from analyzer.log import init_logging
+from analyzer.parsing import BaseParser, create_parser
+from analyzer.statistics import GROUP_BY_DIMENSIONS, LogStatistics
+from analyzer.timerange import TimeRange
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_MEMORY_BUDGET = 1024 * 1024 * 1024
+# Keys of a query besides the statistics, which are flags like the options of the CLI.
+QUERY_OPTIONS = ['files', 'eps_series', 'group_by', 'top', 'top_by', 'percentiles_by', 'since', 'until']
+
+
+class Dataset:
+    """
+    The parsed log entries of a log file, kept in memory between queries. A refresh only parses the lines that were
+    appended to the file since the last refresh. A file that was replaced (e.g., rotated), truncated or rewritten is
+    parsed again completely, as are compressed files whenever they change. A last line without a newline (which may
+    still be written) is parsed on every refresh until it is complete.
+
+    Parameters:
+        path: Path of the log file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # Held while refreshing, so a file is not parsed twice by concurrent queries.
+        self.lock = threading.Lock()
+        self.log_statistics: Optional[LogStatistics] = None
+        # Counts the refreshes that changed the dataset, so combined snapshots of it can be told apart.
+        self.generation = 0
+        self.row_count = 0
+        self.memory_usage = 0
+        self._version = None
+        self._complete_end = 0
+        self._head_digest = None
+        self._complete_lines: Optional[pd.DataFrame] = None
+
+    def refresh(self, parser: BaseParser) -> bool:
+        """
+        Brings the dataset up to date with the log file. Returns False if the file is unchanged.
+        """
+        stat = os.stat(self.path)
+        version = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if version == self._version:
+            return False
+
+        if is_compressed(self.path):
+            with open_log_file(self.path) as file:
+                self._complete_lines = parser.parse_files_to_dataframe([file])
+            tail = None
+        else:
+            with open(self.path, 'rb') as file:
+                if not self._is_appended(file, version):
+                    self._complete_lines = None
+                    self._complete_end = 0
+                complete_end = last_line_end(file, self._complete_end, stat.st_size)
+                if complete_end > self._complete_end or self._complete_lines is None:
+                    appended_lines = self._parse_range(parser, self._complete_end, complete_end)
+                    self._complete_lines = appended_lines if self._complete_lines is None \
+                        else self._append(self._complete_lines, appended_lines)
+                    logger.info(f'Parsed {len(appended_lines)} log lines from bytes {self._complete_end} to '
+                                f'{complete_end} of {self.path}')
+                self._complete_end = complete_end
+                self._head_digest = self._digest_head(file)
+            tail = self._parse_range(parser, complete_end, stat.st_size) if stat.st_size > complete_end else None
+
+        log_dataframe = self._complete_lines if tail is None else self._append(self._complete_lines, tail)
+        self.row_count = len(log_dataframe)
+        self.memory_usage = int(log_dataframe.memory_usage(deep=True).sum())
+        self.log_statistics = LogStatistics(log_dataframe) if self.row_count > 0 else None
+        self.generation += 1
+        self._version = version
+        return True
+
+    def _is_appended(self, file, version) -> bool:
+        """
+        Returns True if the file is the one that was parsed, with lines appended at most.
+        """
+        return (self._version is not None and version[:2] == self._version[:2] and version[2] >= self._complete_end
+                and self._digest_head(file) == self._head_digest)
+
+    def _digest_head(self, file) -> str:
+        """
+        Returns a digest of the start of the parsed part of the file, which changes if the file is rewritten in place.
+        """
+        file.seek(0)
+        return hashlib.sha1(file.read(min(self._complete_end, FINGERPRINT_BLOCK_SIZE))).hexdigest()
+
+    def _parse_range(self, parser: BaseParser, start: int, end: int) -> pd.DataFrame:
+        with TextIOWrapper(open_byte_range(self.path, start, end), encoding='utf-8') as file:
+            return parser.parse_files_to_dataframe([file])
+
+    @staticmethod
+    def _append(dataframe: pd.DataFrame, appended: pd.DataFrame) -> pd.DataFrame:
+        if len(appended) == 0:
+            return dataframe
+        return appended if len(dataframe) == 0 else BaseParser._concat([dataframe, appended])
+
+
+class CombinedSnapshot(NamedTuple):
+    """
+    Statistics of the log entries of several datasets, or of the log entries of datasets in a time range.
+
+    Parameters:
+        generations: Generations of the datasets that the snapshot was combined from.
+        log_statistics: The statistics, or None if there are no log entries.
+        memory_usage: Memory usage of the combined log entries in bytes.
+    """
+    generations: Tuple[int, ...]
+    log_statistics: Optional[LogStatistics]
+    memory_usage: int
+
+
+class DatasetCache:
+    """
+    Datasets of log files by path, within a memory budget. When the datasets outgrow the budget, the least recently
+    queried ones are evicted as a whole and parsed again when they are queried next. Queries on different files do not
+    wait for each other: the cache is only locked for bookkeeping, and every dataset is refreshed under its own lock.
+    The log entries of queries on several files or a time range are combined once and kept as a snapshot until one of
+    the files changes (see snapshot).
+
+    Parameters:
+        parser: Parser of the log files. Parses every column that any statistic needs.
+        memory_budget: Maximum memory usage of all datasets and combined snapshots in bytes. Combined snapshots are
+        evicted before datasets. Datasets of a running query are never evicted, so a single query may exceed it.
+        roots: If set, only log files in these directories (or their subdirectories) can be queried.
+    """
+
+    def __init__(self, parser: BaseParser, memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                 roots: Optional[Sequence[str]] = None):
+        self.parser = parser
+        self.memory_budget = memory_budget
+        self.roots = None if roots is None else [os.path.realpath(root) for root in roots]
+        self._datasets: OrderedDict[str, Dataset] = OrderedDict()
+        self._snapshots: OrderedDict[Tuple, CombinedSnapshot] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, paths: Sequence[str]) -> List[Dataset]:
+        """
+        Returns the refreshed datasets of log files.
+
+        Raises:
+            PermissionError: If a file is outside the roots.
+            OSError: If a file cannot be read.
+        """
+        paths = [os.path.realpath(path) for path in paths]
+        for path in paths:
+            if self.roots is not None and not any(os.path.commonpath([root, path]) == root for root in self.roots):
+                raise PermissionError(f'{path} is outside the directories of the log files that can be queried')
+        datasets = []
+        for path in paths:
+            with self._lock:
+                dataset = self._datasets.get(path)
+                if dataset is None:
+                    dataset = self._datasets[path] = Dataset(path)
+                self._datasets.move_to_end(path)
+            try:
+                with dataset.lock:
+                    dataset.refresh(self.parser)
+            except OSError:
+                with self._lock:
+                    if self._datasets.get(path) is dataset:
+                        del self._datasets[path]
+                raise
+            datasets.append(dataset)
+        self._evict(keep=datasets)
+        return datasets
+
+    def snapshot(self, datasets: Sequence[Dataset], time_range: Optional[TimeRange] = None) -> Optional[LogStatistics]:
+        """
+        Returns the statistics of the log entries of datasets, of those in time_range if it is set, or None if there are
+        none. Statistics of a single dataset are those of the dataset. The log entries of several datasets or in a time
+        range are combined once, and their statistics, including the aggregates computed by queries, are kept until one
+        of the datasets is refreshed.
+        """
+        sources = []
+        for dataset in datasets:
+            with dataset.lock:
+                sources.append((dataset.generation, dataset.log_statistics))
+        snapshots = [log_statistics for _, log_statistics in sources if log_statistics is not None]
+        if time_range is None and len(snapshots) <= 1:
+            return snapshots[0] if snapshots else None
+
+        key = (tuple(dataset.path for dataset in datasets),
+               None if time_range is None else (time_range.since, time_range.until))
+        generations = tuple(generation for generation, _ in sources)
+        with self._lock:
+            combined_snapshot = self._snapshots.get(key)
+            if combined_snapshot is not None and combined_snapshot.generations == generations:
+                self._snapshots.move_to_end(key)
+                return combined_snapshot.log_statistics
+
+        log_dataframes = [log_statistics.log_dataframe for log_statistics in snapshots]
+        if time_range is not None:
+            log_dataframes = [time_range.filter(log_dataframe) for log_dataframe in log_dataframes]
+        log_dataframes = [log_dataframe for log_dataframe in log_dataframes if len(log_dataframe) > 0]
+        log_dataframe = BaseParser._concat(log_dataframes) if log_dataframes else None
+        combined_snapshot = CombinedSnapshot(
+            generations, None if log_dataframe is None else LogStatistics(log_dataframe),
+            0 if log_dataframe is None else int(log_dataframe.memory_usage(deep=True).sum()))
+        with self._lock:
+            # Replaces the snapshot of the same files and time range before a refresh.
+            self._snapshots[key] = combined_snapshot
+            self._snapshots.move_to_end(key)
+        self._evict(keep=datasets)
+        return combined_snapshot.log_statistics
+
+    def describe(self) -> List[Dict]:
+        """
+        Returns the path, number of log entries and memory usage of every dataset, least recently queried first.
+        """
+        with self._lock:
+            return [{'path': dataset.path, 'rows': dataset.row_count, 'memory_usage': dataset.memory_usage}
+                    for dataset in self._datasets.values()]
+
+    def _evict(self, keep: Sequence[Dataset]) -> None:
+        with self._lock:
+            memory_usage = sum(dataset.memory_usage for dataset in self._datasets.values()) + \
+                sum(combined_snapshot.memory_usage for combined_snapshot in self._snapshots.values())
+            for key, combined_snapshot in list(self._snapshots.items()):
+                if memory_usage <= self.memory_budget:
+                    break
+                del self._snapshots[key]
+                memory_usage -= combined_snapshot.memory_usage
+            for path, dataset in list(self._datasets.items()):
+                if memory_usage <= self.memory_budget:
+                    break
+                if any(dataset is kept for kept in keep):
+                    continue
+                del self._datasets[path]
+                memory_usage -= dataset.memory_usage
+                logger.info(f'Evicted {path} ({dataset.memory_usage / (1024 * 1024):.1f} MiB) from memory')
+        if memory_usage > self.memory_budget:
+            logger.warning(f'The queried log files need {memory_usage / (1024 * 1024):.1f} MiB, more than the memory '
+                           f'budget of {self.memory_budget / (1024 * 1024):.1f} MiB')
+
+
+def dataset_parser(engine: str = 'pandas', input_format: str = 'auto') -> BaseParser:
+    """
+    Returns a parser of log files in input_format (see create_parser) of all columns that any statistic or --group-by
+    dimension reads, in compact dtypes.
+    """
+    columns = StatisticsPlan(list(STATISTICS), eps_bucket='1s', group_by=list(GROUP_BY_DIMENSIONS)).columns
+    return create_parser(input_format, engine, on_bad_lines='warn', columns=columns)
+
+
+def run_query(dataset_cache: DatasetCache, query: Dict) -> Dict:
+    """
+    Answers a query with the same results that the CLI writes for the same log files and options. A query is a JSON
+    object with the list of log files ('files'), a true flag per requested statistic (e.g., 'mfip') and the options
+    eps_series, group_by, top, top_by, percentiles_by, since and until, which take the same values as the options of
+    the CLI. The results are empty if there are no log entries to analyze. Percentiles are always exact.
+
+    Raises:
+        ValueError: If the query is invalid or the statistics cannot be computed.
+        PermissionError: If a log file is outside the roots of the dataset cache.
+        OSError: If a log file cannot be read.
+    """
+    if not isinstance(query, dict):
+        raise ValueError('The query must be a JSON object')
+    unknown_keys = set(query) - set(STATISTICS) - set(QUERY_OPTIONS)
+    if unknown_keys:
+        raise ValueError(f'Unknown query keys: {", ".join(sorted(unknown_keys))}')
+    files = query.get('files')
+    if not isinstance(files, list) or not files or not all(isinstance(path, str) for path in files):
+        raise ValueError('files must be a non-empty list of paths')
+    try:
+        eps_bucket = time_bucket(query['eps_series']) if query.get('eps_series') else None
+        since = point_in_time(str(query['since'])) if query.get('since') is not None else None
+        until = point_in_time(str(query['until'])) if query.get('until') is not None else None
+    except argparse.ArgumentTypeError as error:
+        raise ValueError(str(error)) from error
+    group_by = query.get('group_by') or []
+    if not isinstance(group_by, list) or not all(isinstance(dimension, str) for dimension in group_by):
+        raise ValueError('group_by must be a list of dimensions')
+    top = query.get('top')
+    if top is not None and (not isinstance(top, int) or isinstance(top, bool) or top < 1):
+        raise ValueError('top must be a positive integer')
+    plan = StatisticsPlan([statistic for statistic in STATISTICS if query.get(statistic)], eps_bucket, group_by, top,
+                          query.get('top_by', 'requests'), query.get('percentiles_by'))
+
+    datasets = dataset_cache.get(files)
+    # The statistics are snapshots: a refresh replaces the statistics of a dataset instead of changing them. They keep
+    # their aggregates between queries until then.
+    log_statistics = dataset_cache.snapshot(datasets, TimeRange(since, until)
+                                            if since is not None or until is not None else None)
+    if log_statistics is None:
+        return {}
+
+    log_statistics.aggregate(plan.primitives, plan.eps_bucket)
+    try:
+        return {statistic: plan.compute(statistic, log_statistics) for statistic in plan.statistics}
+    except ZeroDivisionError as error:
+        raise ValueError('All log entries are from the same second') from error
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    Handles the requests of the analyzer server:
+        POST /query: Answers the JSON query in the body, see run_query.
+        GET /datasets: Lists the datasets in memory, see DatasetCache.describe.
+    Errors are answered with a JSON object with the error message.
+    """
+    server_version = 'LogAnalyzer'
+
+    def do_POST(self) -> None:
+        if self.path != '/query':
+            self._send_json(404, {'error': f'Unknown path {self.path}'})
+            return
+        try:
+            query = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            results = run_query(self.server.dataset_cache, query)
+        except ValueError as error:
+            self._send_json(400, {'error': str(error)})
+        except PermissionError as error:
+            self._send_json(403, {'error': str(error)})
+        except OSError as error:
+            self._send_json(404, {'error': str(error)})
+        else:
+            self._send_json(200, results)
+
+    def do_GET(self) -> None:
+        if self.path != '/datasets':
+            self._send_json(404, {'error': f'Unknown path {self.path}'})
+            return
+        self._send_json(200, self.server.dataset_cache.describe())
+
+    def address_string(self) -> str:
+        # Clients of a Unix socket have no address.
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix socket'
+
+    def log_message(self, format: str, *args) -> None:
+        logger.info(f'{self.address_string()} {format % args}')
+
+    def _send_json(self, status: int, body) -> None:
+        content = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class AnalyzerHTTPServer(ThreadingHTTPServer):
+    """
+    HTTP server on a TCP port that answers every request in its own thread.
+    """
+
+    def __init__(self, address, dataset_cache: DatasetCache):
+        super().__init__(address, QueryHandler)
+        self.dataset_cache = dataset_cache
+
+
+class AnalyzerUnixServer(socketserver.ThreadingUnixStreamServer):
+    """
+    HTTP server on a Unix socket that answers every request in its own thread.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, dataset_cache: DatasetCache):
+        super().__init__(socket_path, QueryHandler)
+        self.dataset_cache = dataset_cache
+
+
+def create_server(dataset_cache: DatasetCache, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                  socket_path: Optional[str] = None) -> socketserver.BaseServer:
+    """
+    Returns a server of queries on the datasets, listening on a Unix socket if socket_path is set, or else on a TCP
+    port of host.
+    """
+    if socket_path is None:
+        return AnalyzerHTTPServer((host, port), dataset_cache)
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    return AnalyzerUnixServer(socket_path, dataset_cache)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    init_logging()
+
+    arg_parser = argparse.ArgumentParser(prog='analyzer serve',
+                                         description='Keep parsed log files in memory and answer queries over HTTP')
+    arg_parser.add_argument('--host', default=DEFAULT_HOST, help='Address to listen on, default: %(default)s')
+    arg_parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to listen on, default: %(default)s')
+    arg_parser.add_argument('--socket', metavar='PATH', help='Listen on a Unix socket at PATH instead of a TCP port')
+    arg_parser.add_argument('--memory-budget', type=int, default=DEFAULT_MEMORY_BUDGET // (1024 * 1024),
+                            help='Maximum memory of the parsed log files in MiB. The least recently queried files '
+                                 'are evicted beyond it, default: %(default)s')
+    arg_parser.add_argument('--engine', choices=ENGINES, default='pandas',
+                            help='Parser engine, "fast" parses numeric fields directly from bytes, default: '
+                                 '%(default)s')
+    arg_parser.add_argument('--input-format', choices=INPUT_FORMATS, default='auto',
+                            help='Format of the log files, "auto" detects the format of every file from its first '
+                                 'lines, default: %(default)s')
+    arg_parser.add_argument('--root', metavar='DIR', action='append',
+                            help='Directory of the log files that can be queried, including its subdirectories. Can be '
+                                 'given several times, default: the current directory')
+    args = arg_parser.parse_args(argv)
+
+    dataset_cache = DatasetCache(dataset_parser(args.engine, args.input_format), args.memory_budget * 1024 * 1024,
+                                 args.root or [os.getcwd()])
+    server = create_server(dataset_cache, args.host, args.port, args.socket)
+    address = args.socket if args.socket is not None else f'http://{args.host}:{server.server_address[1]}'
+    logger.info(f'Serving queries on {address}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info('Stopped serving queries')
+    finally:
+        server.server_close()
+        if args.socket is not None and os.path.exists(args.socket):
+            os.remove(args.socket)
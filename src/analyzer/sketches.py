@@ -0,0 +1,303 @@
+import json
+import math
+import zlib
+from typing import List, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+HYPERLOGLOG_MIN_PRECISION = 4
+HYPERLOGLOG_MAX_PRECISION = 18
+
+
+class SpaceSaving:
+    """
+    Space-Saving summary of the most frequent values in a stream, using a bounded number of counters. Every monitored
+    value has an estimated count that is never lower than its true count and at most its error higher. Values that
+    are not monitored occurred at most floor times. With N counted values, floor and every error are at most
+    N / capacity. Summaries over different parts of a stream can be merged; the bounds then hold for the whole stream.
+
+    Parameters:
+        capacity: Maximum number of monitored values.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts = pd.Series(index=pd.Index([], dtype=object), dtype='int64')
+        self.errors = pd.Series(index=pd.Index([], dtype=object), dtype='int64')
+        self.floor = 0
+        self.total = 0
+
+    @classmethod
+    def for_error(cls, error: float) -> 'SpaceSaving':
+        """
+        Returns an empty summary whose counts are overestimated by at most error times the number of counted values.
+        """
+        return cls(capacity=math.ceil(1 / error))
+
+    def update(self, counts: pd.Series) -> None:
+        """
+        Add exact counts of values (e.g., of a chunk, as returned by value_counts) to the summary.
+        """
+        counts = pd.Series(counts.to_numpy(dtype='int64'), index=counts.index.astype(object))
+        self._merge(counts, pd.Series(0, index=counts.index, dtype='int64'), floor=0, total=int(counts.sum()))
+
+    def merge(self, other: 'SpaceSaving') -> None:
+        """
+        Merge another summary into this one.
+        """
+        self._merge(other.counts, other.errors, other.floor, other.total)
+
+    def top(self) -> Tuple[str, int, int]:
+        """
+        Returns the value with the highest estimated count, its estimated count and the maximum overestimation of the
+        count.
+
+        Raises:
+            ValueError: If no value has been counted.
+        """
+        if len(self.counts) == 0:
+            raise ValueError('No values have been counted.')
+        value = self.counts.idxmax()
+        return value, int(self.counts[value]), int(self.errors[value])
+
+    def is_top_guaranteed(self) -> bool:
+        """
+        Returns True if the value returned by top is guaranteed to be a most frequent value, i.e., its lower count bound
+        is at least as high as the upper count bound of every other value.
+        """
+        value, count, error = self.top()
+        other_counts = self.counts.drop(value)
+        return count - error >= max(other_counts.max() if len(other_counts) > 0 else 0, self.floor)
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the summary compactly, see from_bytes.
+        """
+        return zlib.compress(json.dumps({
+            'capacity': self.capacity,
+            'floor': self.floor,
+            'total': self.total,
+            'values': self.counts.index.tolist(),
+            'counts': self.counts.tolist(),
+            'errors': self.errors.tolist(),
+        }).encode('utf-8'))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'SpaceSaving':
+        state = json.loads(zlib.decompress(data))
+        summary = cls(state['capacity'])
+        index = pd.Index(state['values'], dtype=object)
+        summary.counts = pd.Series(state['counts'], index=index, dtype='int64')
+        summary.errors = pd.Series(state['errors'], index=index, dtype='int64')
+        summary.floor = state['floor']
+        summary.total = state['total']
+        return summary
+
+    def _merge(self, counts: pd.Series, errors: pd.Series, floor: int, total: int) -> None:
+        # A value that is not monitored by one of the summaries occurred at most floor times in its part of the stream.
+        index = self.counts.index.append(counts.index.difference(self.counts.index, sort=False))
+        merged_counts = self.counts.reindex(index, fill_value=self.floor) + counts.reindex(index, fill_value=floor)
+        merged_errors = self.errors.reindex(index, fill_value=self.floor) + errors.reindex(index, fill_value=floor)
+        self.floor += floor
+        self.total += total
+
+        if len(index) > self.capacity:
+            order = np.argsort(-merged_counts.to_numpy(), kind='stable')
+            self.floor = max(self.floor, int(merged_counts.iloc[order[self.capacity]]))
+            kept = np.sort(order[:self.capacity])
+            merged_counts = merged_counts.iloc[kept]
+            merged_errors = merged_errors.iloc[kept]
+        self.counts = merged_counts
+        self.errors = merged_errors
+
+
+class HyperLogLog:
+    """
+    HyperLogLog sketch that estimates the number of distinct values in a stream with 2^precision one-byte registers.
+    The relative standard error of the estimate is 1.04 / sqrt(2^precision). Values are hashed with the (seeded, so
+    stable across processes) 64-bit hash of pandas. Sketches with the same precision can be merged.
+
+    Parameters:
+        precision: Number of hash bits that select a register, between 4 and 18.
+    """
+
+    def __init__(self, precision: int):
+        if not HYPERLOGLOG_MIN_PRECISION <= precision <= HYPERLOGLOG_MAX_PRECISION:
+            raise ValueError(f'Precision must be between {HYPERLOGLOG_MIN_PRECISION} and {HYPERLOGLOG_MAX_PRECISION}')
+        self.precision = precision
+        self.registers = np.zeros(2 ** precision, dtype='uint8')
+
+    @classmethod
+    def for_error(cls, error: float) -> 'HyperLogLog':
+        """
+        Returns an empty sketch with the lowest precision whose relative standard error is at most error.
+        """
+        precision = math.ceil(math.log2((1.04 / error) ** 2))
+        return cls(min(max(precision, HYPERLOGLOG_MIN_PRECISION), HYPERLOGLOG_MAX_PRECISION))
+
+    @property
+    def relative_standard_error(self) -> float:
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def update(self, values: Sequence[str]) -> None:
+        """
+        Add values to the sketch. Adding a value more than once does not change the sketch.
+        """
+        hashes = pd.util.hash_array(np.asarray(values, dtype=object))
+        remaining_bit_count = 64 - self.precision
+        register_indices = hashes >> np.uint64(remaining_bit_count)
+        remaining_bits = hashes & np.uint64((1 << remaining_bit_count) - 1)
+        # Position of the first 1-bit in the remaining bits
+        ranks = remaining_bit_count - self._bit_length(remaining_bits) + 1
+        np.maximum.at(self.registers, register_indices.astype('intp'), ranks.astype('uint8'))
+
+    def merge(self, other: 'HyperLogLog') -> None:
+        if other.precision != self.precision:
+            raise ValueError('Only HyperLogLog sketches with the same precision can be merged.')
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        """
+        Returns the estimated number of distinct values.
+        """
+        register_count = len(self.registers)
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(register_count, 0.7213 / (1 + 1.079 / register_count))
+        estimate = alpha * register_count ** 2 / np.sum(np.ldexp(1.0, -self.registers.astype('int64')))
+        empty_register_count = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * register_count and empty_register_count > 0:
+            # Linear counting is more accurate for small cardinalities.
+            estimate = register_count * math.log(register_count / empty_register_count)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the sketch compactly, see from_bytes.
+        """
+        return bytes([self.precision]) + zlib.compress(self.registers.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'HyperLogLog':
+        sketch = cls(data[0])
+        sketch.registers = np.frombuffer(zlib.decompress(data[1:]), dtype='uint8').copy()
+        return sketch
+
+    @staticmethod
+    def _bit_length(values: np.ndarray) -> np.ndarray:
+        # frexp is exact for integers below 2^53, so the 64-bit values are split into two 32-bit halves.
+        high_bit_lengths = np.frexp((values >> np.uint64(32)).astype('float64'))[1]
+        low_bit_lengths = np.frexp((values & np.uint64(0xFFFFFFFF)).astype('float64'))[1]
+        return np.where(high_bit_lengths > 0, high_bit_lengths + 32, low_bit_lengths)
+
+
+class QuantileSketch:
+    """
+    Sketch of the distribution of non-negative numbers that answers quantiles with a bounded relative error (a
+    DDSketch): positive values are counted in buckets whose bounds grow by the factor gamma = (1 + relative_error) /
+    (1 - relative_error), and the value at a rank is estimated by the middle of its bucket (2 * bound / (gamma + 1)),
+    which is at most relative_error off from every value in the bucket. Zeros are counted exactly. The estimates are
+    clamped to the exact minimum and maximum, and are rounded if all values are integers. Memory grows with the
+    logarithm of the range of the values only (about 1,400 buckets for values from 1 to 10^12 with 1% error).
+    Sketches are merged by adding their bucket counts, so a merged sketch is identical to one that counted all values,
+    in whatever order or parts they were counted.
+
+    Parameters:
+        relative_error: Maximum error of an estimated value relative to the true value at its rank, in (0, 1).
+    """
+
+    def __init__(self, relative_error: float):
+        if not 0 < relative_error < 1:
+            raise ValueError('The relative error must be between 0 and 1')
+        self.relative_error = relative_error
+        self.gamma = (1 + relative_error) / (1 - relative_error)
+        # Counts of the buckets offset, offset + 1, ..., where bucket i holds the values in (gamma^(i-1), gamma^i]
+        self.counts = np.zeros(0, dtype='int64')
+        self.offset = 0
+        self.zero_count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.is_integer = True
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + int(self.counts.sum())
+
+    def update(self, values: np.ndarray) -> None:
+        """
+        Add values to the sketch. Negative, NaN and infinite values are ignored.
+        """
+        values = values[np.isfinite(values) & (values >= 0)]
+        if len(values) == 0:
+            return
+        self.min = min(self.min, values.min().item())
+        self.max = max(self.max, values.max().item())
+        self.is_integer = self.is_integer and bool(np.all(values == np.floor(values)))
+        positive_values = values[values > 0]
+        self.zero_count += len(values) - len(positive_values)
+        if len(positive_values) > 0:
+            buckets = np.ceil(np.log(positive_values.astype('float64')) / math.log(self.gamma)).astype('int64')
+            offset = int(buckets.min())
+            self._add_counts(np.bincount(buckets - offset), offset)
+
+    def merge(self, other: 'QuantileSketch') -> None:
+        if other.relative_error != self.relative_error:
+            raise ValueError('Only quantile sketches with the same relative error can be merged.')
+        if other.count == 0:
+            return
+        self._add_counts(other.counts, other.offset)
+        self.zero_count += other.zero_count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.is_integer = self.is_integer and other.is_integer
+
+    def values_at_ranks(self, ranks: Sequence[int]) -> List[Union[int, float]]:
+        """
+        Returns the estimated values at ranks (from 0) of the counted values in ascending order.
+
+        Raises:
+            ValueError: If no value has been counted.
+        """
+        if self.count == 0:
+            raise ValueError('No values have been counted.')
+        ranks = np.asarray(ranks, dtype='int64')
+        buckets = np.searchsorted(np.cumsum(self.counts), ranks - self.zero_count, side='right') + self.offset
+        values = np.where(ranks < self.zero_count, 0.0, 2 * self.gamma ** buckets.astype('float64') / (self.gamma + 1))
+        values = np.clip(values, self.min, self.max)
+        return [round(value) if self.is_integer else value for value in values.tolist()]
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the sketch compactly, see from_bytes.
+        """
+        return zlib.compress(json.dumps({
+            'relative_error': self.relative_error,
+            'offset': self.offset,
+            'counts': self.counts.tolist(),
+            'zero_count': self.zero_count,
+            'min': self.min if self.count > 0 else None,
+            'max': self.max if self.count > 0 else None,
+            'is_integer': self.is_integer,
+        }).encode('utf-8'))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'QuantileSketch':
+        state = json.loads(zlib.decompress(data))
+        sketch = cls(state['relative_error'])
+        sketch.offset = state['offset']
+        sketch.counts = np.array(state['counts'], dtype='int64')
+        sketch.zero_count = state['zero_count']
+        if state['min'] is not None:
+            sketch.min, sketch.max = state['min'], state['max']
+        sketch.is_integer = state['is_integer']
+        return sketch
+
+    def _add_counts(self, counts: np.ndarray, offset: int) -> None:
+        if len(self.counts) == 0:
+            self.counts, self.offset = counts.astype('int64'), offset
+            return
+        start = min(self.offset, offset)
+        end = max(self.offset + len(self.counts), offset + len(counts))
+        merged_counts = np.zeros(end - start, dtype='int64')
+        merged_counts[self.offset - start:self.offset - start + len(self.counts)] += self.counts
+        merged_counts[offset - start:offset - start + len(counts)] += counts
+        self.counts, self.offset = merged_counts, start
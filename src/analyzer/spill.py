@@ -0,0 +1,166 @@
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import weakref
+from typing import Iterator, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPILL_PARTITIONS = 64
+
+
+class CountSummary(NamedTuple):
+    """
+    The statistics of spilled counts: the number of distinct keys and the most and least frequent key.
+    """
+    distinct_count: int
+    most_frequent: str
+    least_frequent: str
+
+
+class SpilledCounts:
+    """
+    Exact counts per key (e.g., per client IP) that are kept on local disk instead of in memory. Tables of counts are
+    added in the order of the stream they were counted from, and every table is hash-partitioned by key into a number
+    of partition files in a temporary directory. Every key lands in the same partition each time, so the partitions
+    can be merged one at a time, in memory proportional to a single partition, to find the exact counts.
+
+    Keys with equal counts are told apart by their first appearance in the stream, like a stable sort of the counts in
+    order of first appearance: the most frequent key is the first and the least frequent key the last of them. Every
+    added key gets a position (the number of keys added before it), and a key keeps its smallest position when the
+    partitions are merged.
+
+    The temporary directory is removed by close, when the counts are garbage collected or when the interpreter exits,
+    whichever comes first. Pickled counts hand their directory over to the process that unpickles them (e.g., from a
+    worker process to its parent), which removes it from then on.
+
+    Parameters:
+        partitions: Number of partitions.
+        directory: Parent directory of the temporary directory, default: the directory of tempfile.
+    """
+
+    def __init__(self, partitions: int = DEFAULT_SPILL_PARTITIONS, directory: Optional[str] = None):
+        self.partitions = partitions
+        self.path = tempfile.mkdtemp(prefix='analyzer-spill-', dir=directory)
+        self.size = 0
+        self.spill_count = 0
+        self._summary: Optional[CountSummary] = None
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.path, ignore_errors=True)
+        logger.info(f'Spilling counts to {self.path}')
+
+    def add(self, counts: pd.Series) -> None:
+        """
+        Add counts per key, in order of first appearance of the keys, that were counted after all counts added so far.
+        """
+        if len(counts) == 0:
+            return
+        keys = counts.index.to_numpy(dtype=object)
+        self._write(keys, counts.to_numpy(dtype='int64'), self.size + np.arange(len(keys), dtype=np.int64))
+        self.size += len(keys)
+        self.spill_count += 1
+
+    def merge(self, other: 'SpilledCounts') -> None:
+        """
+        Add the spilled counts of other, which were counted after all counts added so far, and remove its files.
+        """
+        for keys, counts, positions in other._read_all():
+            self._write(keys, counts, self.size + positions)
+        self.size += other.size
+        self.spill_count += other.spill_count
+        other.close()
+
+    def summary(self) -> CountSummary:
+        """
+        Returns the number of distinct keys and the most and least frequent key, merging one partition at a time. The
+        summary is kept until more counts are added.
+
+        Raises:
+            ValueError: If no counts have been added.
+        """
+        if self.size == 0:
+            raise ValueError('No counts have been spilled.')
+        if self._summary is None:
+            distinct_count = 0
+            # The most and least frequent key of every partition
+            most_frequent, least_frequent = [], []
+            for partition in range(self.partitions):
+                totals = self._partition_totals(partition)
+                if len(totals) == 0:
+                    continue
+                distinct_count += len(totals)
+                most_frequent.append(_first_by_count(totals, most_frequent=True))
+                least_frequent.append(_first_by_count(totals, most_frequent=False))
+            self._summary = CountSummary(distinct_count,
+                                         _first_by_count(pd.concat(most_frequent), most_frequent=True).index[0],
+                                         _first_by_count(pd.concat(least_frequent), most_frequent=False).index[0])
+        return self._summary
+
+    def close(self) -> None:
+        """
+        Remove the temporary directory with all partitions.
+        """
+        self._finalizer()
+
+    def __getstate__(self):
+        state = {name: value for name, value in vars(self).items() if name != '_finalizer'}
+        # The unpickling process removes the directory from now on.
+        self._finalizer.detach()
+        return state
+
+    def __setstate__(self, state):
+        vars(self).update(state)
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.path, ignore_errors=True)
+
+    def _write(self, keys: np.ndarray, counts: np.ndarray, positions: np.ndarray) -> None:
+        self._summary = None
+        partitions = pd.util.hash_array(keys) % self.partitions
+        order = np.argsort(partitions, kind='stable')
+        boundaries = np.searchsorted(partitions[order], np.arange(self.partitions + 1))
+        for partition in range(self.partitions):
+            rows = order[boundaries[partition]:boundaries[partition + 1]]
+            if len(rows) > 0:
+                with open(self._partition_path(partition), 'ab') as partition_file:
+                    pickle.dump((keys[rows], counts[rows], positions[rows]), partition_file,
+                                protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _read(self, partition: int) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        path = self._partition_path(partition)
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as partition_file:
+            while True:
+                try:
+                    yield pickle.load(partition_file)
+                except EOFError:
+                    return
+
+    def _read_all(self) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        for partition in range(self.partitions):
+            yield from self._read(partition)
+
+    def _partition_totals(self, partition: int) -> pd.DataFrame:
+        """
+        Returns the total count and the first position per key of a partition.
+        """
+        tables = list(self._read(partition))
+        if not tables:
+            return pd.DataFrame()
+        keys, counts, positions = (np.concatenate(arrays) for arrays in zip(*tables))
+        return pd.DataFrame({'count': counts, 'position': positions}, index=keys).groupby(level=0, sort=False).agg(
+            {'count': 'sum', 'position': 'min'})
+
+    def _partition_path(self, partition: int) -> str:
+        return os.path.join(self.path, f'partition-{partition:04d}.pickle')
+
+
+def _first_by_count(totals: pd.DataFrame, most_frequent: bool) -> pd.DataFrame:
+    """
+    Returns the row of the most (or least) frequent key of totals, of the keys with equal counts the one with the
+    smallest (or largest) position.
+    """
+    return totals.sort_values(['count', 'position'], ascending=[not most_frequent, most_frequent]).iloc[:1]
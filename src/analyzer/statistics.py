@@ -1,11 +1,396 @@
+import functools
 from datetime import timedelta
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
 
+import numpy as np
 import pandas as pd
+from pandas.api.types import is_float_dtype
 
+from analyzer.defaults import DEFAULT_DISTINCT_ERROR, DEFAULT_PERCENTILE_ERROR, DEFAULT_TOP_K_ERROR
+from analyzer.engine import (GROUP_METRICS, PERCENTILE_COLUMNS, PERCENTILE_DIMENSIONS, PERCENTILES, URL_HOST_PATTERN,
+                             StatisticsEngine, group_primitive, percentile_primitive, percentile_rank,
+                             percentile_summary)
+from analyzer.sketches import HyperLogLog, QuantileSketch, SpaceSaving
+from analyzer.spill import CountSummary, SpilledCounts
 
-class LogStatistics:
+EPS_PERCENTILES = [50, 95, 99]
+# Bucket counts are computed with a dense array if the number of buckets between the first and last timestamp is at
+# most this factor times the number of log entries, otherwise by sorting.
+DENSE_BUCKET_FACTOR = 4
+
+
+def count_ips(client_ips: pd.Series) -> pd.Series:
+    """
+    Returns the number of log entries per IP in order of first appearance, like value_counts(sort=False) on a string
+    column. Categorical columns are counted on their integer codes, but in the same order, so that ties between IPs
+    with equal counts are resolved identically for both column types.
+    """
+    if not isinstance(client_ips.dtype, pd.CategoricalDtype):
+        return client_ips.value_counts(sort=False)
+    codes = client_ips.cat.codes.to_numpy()
+    first_appearance = pd.unique(codes)
+    counts = np.bincount(codes, minlength=len(client_ips.cat.categories))[first_appearance]
+    index = pd.Index(client_ips.cat.categories[first_appearance], dtype=object, name=client_ips.name)
+    return pd.Series(counts, index=index, dtype='Int64', name='count')
+
+
+class LogColumns:
+    """
+    Column arrays of a log dataframe that primitive aggregates are computed from. Every array is converted from the
+    dataframe only once and shared by all primitives that read it, so primitives computed together make a single pass
+    over each column.
+
+    Parameters:
+        log_dataframe: Dataframe with (cleaned) log entries.
+    """
+
+    def __init__(self, log_dataframe: pd.DataFrame):
+        self.log_dataframe = log_dataframe
+        self.row_count = len(log_dataframe)
+
+    @functools.cached_property
+    def timestamps(self) -> np.ndarray:
+        """
+        Timestamps as int64 nanoseconds since the Unix epoch.
+        """
+        return self.log_dataframe['timestamp'].to_numpy(dtype='datetime64[ns]').view('int64')
+
+    @functools.cached_property
+    def sizes(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Header and response sizes as int64, or as float64 if a column holds decimals.
+        """
+        return (self._numeric(self.log_dataframe['response_header_size']),
+                self._numeric(self.log_dataframe['response_size']))
+
+    @functools.cached_property
+    def positive_sizes(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Header and response sizes, with sizes that are not positive (e.g., -1 for chunked responses) set to 0.
+        """
+        return tuple(np.where(values > 0, values, 0) for values in self.sizes)
+
+    @staticmethod
+    def _numeric(sizes: pd.Series) -> np.ndarray:
+        return sizes.to_numpy(dtype='float64' if is_float_dtype(sizes) else 'int64')
+
+    def group_codes(self, dimension: str) -> Tuple[np.ndarray, pd.Index]:
+        """
+        Returns the key of every log entry in a dimension (see GROUP_BY_DIMENSIONS) as integer codes into the returned
+        distinct keys. Categorical columns already hold such codes, other columns are factorized by hashing. Derived
+        keys (e.g., the host of a URL) are only computed for the distinct values of the column.
+        """
+        dimension_spec = GROUP_BY_DIMENSIONS[dimension]
+        values = self.log_dataframe[dimension_spec.column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes, keys = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            codes, keys = pd.factorize(values)
+        keys = pd.Index(keys, dtype=object)
+        if dimension_spec.derive_keys is not None:
+            key_codes, keys = pd.factorize(dimension_spec.derive_keys(keys))
+            codes = key_codes[codes]
+            keys = pd.Index(keys, dtype=object)
+        return codes, keys
+
+
+def count_buckets(columns: LogColumns, bucket: str) -> pd.DataFrame:
+    """
+    Returns the number of log entries ('events') and the bytes exchanged ('bytes', see
+    LogStatistics.total_amount_of_bytes_exchanged) per time bucket in one vectorized pass. Buckets are aligned to the
+    Unix epoch and indexed by their number since the epoch. Only non-empty buckets are returned.
+    """
+    bucket_size = pd.Timedelta(bucket).value
+    bucket_ids = columns.timestamps // bucket_size
+    header_sizes, response_sizes = columns.positive_sizes
+    sizes = header_sizes.astype('float64') + response_sizes
+    if len(bucket_ids) == 0:
+        return pd.DataFrame({'events': pd.Series(dtype='int64'), 'bytes': pd.Series(dtype='int64')})
+
+    first_bucket_id = bucket_ids.min()
+    bucket_count = bucket_ids.max() - first_bucket_id + 1
+    if bucket_count <= DENSE_BUCKET_FACTOR * len(bucket_ids):
+        offsets = bucket_ids - first_bucket_id
+        events = np.bincount(offsets, minlength=bucket_count)
+        bytes_exchanged = np.bincount(offsets, weights=sizes, minlength=bucket_count)
+        is_non_empty = events > 0
+        index = np.flatnonzero(is_non_empty) + first_bucket_id
+        events, bytes_exchanged = events[is_non_empty], bytes_exchanged[is_non_empty]
+    else:
+        index, inverse, events = np.unique(bucket_ids, return_inverse=True, return_counts=True)
+        bytes_exchanged = np.bincount(inverse, weights=sizes, minlength=len(index))
+    return pd.DataFrame({'events': events.astype('int64'), 'bytes': bytes_exchanged.astype('int64')}, index=index)
+
+
+def url_hosts(urls: pd.Index) -> pd.Index:
+    """
+    Returns the host of every URL, or an empty string if a URL has none.
+    """
+    return pd.Index(urls.str.extract(URL_HOST_PATTERN, expand=False).fillna(''), dtype=object)
+
+
+class Dimension(NamedTuple):
+    """
+    A dimension that log entries can be grouped by (--group-by).
+
+    Parameters:
+        column: Column of the log dataframe that holds the key of a log entry.
+        derive_keys: If set, derives the keys from the distinct values of the column, e.g., the host from the URL.
+    """
+    column: str
+    derive_keys: Optional[Callable[[pd.Index], pd.Index]] = None
+
+
+# The DIMENSIONS of analyzer.engine, in the same order
+GROUP_BY_DIMENSIONS: Dict[str, Dimension] = {
+    'client_ip': Dimension('client_ip'),
+    'response_code': Dimension('response_code'),
+    'request_method': Dimension('request_method'),
+    'username': Dimension('username'),
+    'host': Dimension('url', url_hosts),
+}
+
+
+def count_groups(columns: LogColumns, dimension: str) -> pd.DataFrame:
+    """
+    Returns the number of log entries ('requests') and the bytes exchanged ('bytes', see
+    LogStatistics.total_amount_of_bytes_exchanged) per key of a dimension, indexed by the key. The entries are grouped
+    by their integer key codes with np.bincount, in one vectorized pass.
+    """
+    codes, keys = columns.group_codes(dimension)
+    header_sizes, response_sizes = columns.positive_sizes
+    requests = np.bincount(codes, minlength=len(keys))
+    bytes_exchanged = np.bincount(codes, weights=header_sizes.astype('float64') + response_sizes, minlength=len(keys))
+    # Categories of a chunk can include keys without log entries.
+    is_non_empty = requests > 0
+    return pd.DataFrame({'requests': requests[is_non_empty].astype('int64'),
+                         'bytes': bytes_exchanged[is_non_empty].astype('int64')},
+                        index=keys[is_non_empty].rename(dimension))
+
+
+def top_groups(group_totals: pd.DataFrame, top: Optional[int], top_by: str) -> List[Dict]:
+    """
+    Returns the keys with their requests and bytes (see count_groups), ordered by top_by ('requests' or 'bytes') in
+    descending order and by key for equal values. If top is set, only the first top keys are returned.
+    """
+    other_metric = GROUP_METRICS[1 - GROUP_METRICS.index(top_by)]
+    ordered = group_totals.rename_axis('key').reset_index()
+    ordered = ordered.sort_values([top_by, other_metric, 'key'], ascending=[False, False, True], kind='stable')
+    if top is not None:
+        ordered = ordered.head(top)
+    return [{'key': key, 'requests': int(requests), 'bytes': int(bytes_exchanged)}
+            for key, requests, bytes_exchanged in zip(ordered['key'], ordered['requests'], ordered['bytes'])]
+
+
+class GroupTotals:
     """
-    Statistics for logs that are stored in a Dataframe.
+    Requests and bytes per key of a dimension (see count_groups), summed over chunks. The totals of a chunk are only
+    collected; they are combined by hash grouping once the collected totals outgrow the combined ones. Therefore,
+    adding a chunk costs time proportional to its own number of keys (amortized), not to all keys seen so far, and at
+    most twice the memory of the combined totals is used.
+    """
+
+    def __init__(self):
+        self._combined = pd.DataFrame({metric: pd.Series(dtype='int64') for metric in GROUP_METRICS})
+        self._pending: List[pd.DataFrame] = []
+        self._pending_row_count = 0
+
+    def add(self, group_totals: pd.DataFrame) -> None:
+        self._pending.append(group_totals)
+        self._pending_row_count += len(group_totals)
+        if self._pending_row_count > len(self._combined):
+            self._combine()
+
+    def merge(self, other: 'GroupTotals') -> None:
+        self.add(other.totals())
+
+    def totals(self) -> pd.DataFrame:
+        """
+        Returns the combined totals, indexed by key.
+        """
+        if self._pending:
+            self._combine()
+        return self._combined
+
+    def _combine(self) -> None:
+        parts = [self._combined, *self._pending] if len(self._combined) > 0 else self._pending
+        self._combined = pd.concat(parts).groupby(level=0, sort=False).sum() if len(parts) > 1 else parts[0]
+        self._pending = []
+        self._pending_row_count = 0
+
+
+def summarize_buckets(bucket_counts: pd.DataFrame, bucket: str) -> Dict:
+    """
+    Returns the traffic series of bucket counts (see count_buckets) from the first to the last non-empty bucket,
+    including the empty buckets in between: the start of the first bucket, the events and bytes per bucket, and the
+    peak and percentiles of the events per second over all buckets. The first and last bucket may only be partly
+    covered by log entries.
+    """
+    bucket_size = pd.Timedelta(bucket)
+    bucket_ids = np.arange(bucket_counts.index.min(), bucket_counts.index.max() + 1)
+    series = bucket_counts.reindex(bucket_ids, fill_value=0)
+    events_per_second = series['events'].to_numpy() / bucket_size.total_seconds()
+    peak_bucket = int(np.argmax(events_per_second))
+    summary = {
+        'bucket': bucket,
+        'start': (pd.Timestamp(0) + bucket_ids[0] * bucket_size).isoformat(),
+        'peak_eps': float(events_per_second[peak_bucket]),
+        'peak_start': (pd.Timestamp(0) + bucket_ids[peak_bucket] * bucket_size).isoformat(),
+    }
+    for percentile, value in zip(EPS_PERCENTILES, np.percentile(events_per_second, EPS_PERCENTILES)):
+        summary[f'p{percentile}_eps'] = float(value)
+    summary['events'] = series['events'].tolist()
+    summary['bytes'] = series['bytes'].tolist()
+    return summary
+
+
+def exact_percentiles(values: np.ndarray) -> Dict:
+    """
+    Returns the exact percentiles and maximum of values (see percentile_summary), found by partitioning the values at
+    the ranks of the percentiles instead of sorting them. Negative values (e.g., -1 for unknown sizes), NaN and
+    infinite values are ignored.
+    """
+    values = values[np.isfinite(values) & (values >= 0)]
+    if len(values) == 0:
+        return percentile_summary(None)
+    ranks = [percentile_rank(len(values), percentile) for percentile in PERCENTILES] + [len(values) - 1]
+    return percentile_summary(np.partition(values, ranks)[ranks].tolist())
+
+
+def size_percentiles(columns: LogColumns, dimension: Optional[str] = None) -> Dict:
+    """
+    Returns the exact percentiles of every column of PERCENTILE_COLUMNS (see exact_percentiles) by column, or if
+    dimension is set, by key of the dimension (in order of the keys) and column. The percentiles of all keys are found
+    in one vectorized pass: the values are sorted by key code and value, and the values at the ranks of every key are
+    picked from the ranges of the keys.
+    """
+    if dimension is None:
+        return {column: exact_percentiles(values) for column, values in zip(PERCENTILE_COLUMNS, columns.sizes)}
+    codes, keys = columns.group_codes(dimension)
+    summaries = {}
+    for column, values in zip(PERCENTILE_COLUMNS, columns.sizes):
+        is_valid = np.isfinite(values) & (values >= 0)
+        valid_codes, valid_values = codes[is_valid], values[is_valid]
+        sorted_values = valid_values[np.lexsort((valid_values, valid_codes))]
+        counts = np.bincount(valid_codes, minlength=len(keys))
+        starts = np.cumsum(counts) - counts
+        ranks = [starts + percentile_rank(counts, percentile) for percentile in PERCENTILES] + [starts + counts - 1]
+        key_values = sorted_values[np.clip(np.stack(ranks, axis=1), 0, None)] if len(sorted_values) > 0 else None
+        summaries[column] = [percentile_summary(key_values[code].tolist() if counts[code] > 0 else None)
+                             for code in range(len(keys))]
+    # Categories of a chunk can include keys without log entries.
+    non_empty_codes = np.flatnonzero(np.bincount(codes, minlength=len(keys)))
+    return {keys[code]: {column: summaries[column][code] for column in PERCENTILE_COLUMNS}
+            for code in sorted(non_empty_codes, key=keys.__getitem__)}
+
+
+def sketch_percentiles(sketch: QuantileSketch) -> Dict:
+    """
+    Returns the estimated percentiles and the exact maximum of the values in a sketch, see percentile_summary.
+    """
+    if sketch.count == 0:
+        return percentile_summary(None)
+    ranks = [percentile_rank(sketch.count, percentile) for percentile in PERCENTILES]
+    return percentile_summary(sketch.values_at_ranks(ranks) + [sketch.max])
+
+
+class SizeQuantiles:
+    """
+    Quantile sketches (see QuantileSketch) of the PERCENTILE_COLUMNS, overall or per key of a dimension, which are
+    updated chunk by chunk and merged with those of other accumulators. Merging is exact, so the estimates do not depend
+    on how the log entries were split into chunks or shards.
+
+    Parameters:
+        relative_error: Relative error of the estimated percentiles.
+        dimension: If set, the sketches are kept per key of this dimension, see PERCENTILE_DIMENSIONS.
+    """
+
+    def __init__(self, relative_error: float, dimension: Optional[str] = None):
+        self.relative_error = relative_error
+        self.dimension = dimension
+        self.sketches: Dict[Any, List[QuantileSketch]] = {}
+
+    def add(self, columns: LogColumns) -> None:
+        if self.dimension is None:
+            self._update(None, columns.sizes)
+            return
+        codes, keys = columns.group_codes(self.dimension)
+        order = np.argsort(codes, kind='stable')
+        counts = np.bincount(codes, minlength=len(keys))
+        key_sizes = [np.split(values[order], np.cumsum(counts)[:-1]) for values in columns.sizes]
+        for code in np.flatnonzero(counts):
+            self._update(keys[code], [sizes[code] for sizes in key_sizes])
+
+    def merge(self, other: 'SizeQuantiles') -> None:
+        for key, other_sketches in other.sketches.items():
+            for sketch, other_sketch in zip(self._key_sketches(key), other_sketches):
+                sketch.merge(other_sketch)
+
+    def percentiles(self) -> Dict:
+        """
+        Returns the estimated percentiles by column, or by key and column, like size_percentiles.
+        """
+        if self.dimension is None:
+            return {column: sketch_percentiles(sketch)
+                    for column, sketch in zip(PERCENTILE_COLUMNS, self._key_sketches(None))}
+        return {key: {column: sketch_percentiles(sketch) for column, sketch in zip(PERCENTILE_COLUMNS, sketches)}
+                for key, sketches in sorted(self.sketches.items())}
+
+    def _update(self, key: Any, sizes: Sequence[np.ndarray]) -> None:
+        for sketch, values in zip(self._key_sketches(key), sizes):
+            sketch.update(values)
+
+    def _key_sketches(self, key: Any) -> List[QuantileSketch]:
+        sketches = self.sketches.get(key)
+        if sketches is None:
+            sketches = self.sketches[key] = [QuantileSketch(self.relative_error) for _ in PERCENTILE_COLUMNS]
+        return sketches
+
+
+class Primitive(NamedTuple):
+    """
+    A primitive aggregate over log entries that statistics are computed from.
+
+    Parameters:
+        columns: Columns of the log dataframe that the primitive reads.
+        compute: Computes the primitive from the columns of a dataframe and the bucket size of eps_series.
+    """
+    columns: List[str]
+    compute: Callable[[LogColumns, Optional[str]], Any]
+
+
+PRIMITIVES: Dict[str, Primitive] = {
+    'row_count': Primitive([], lambda columns, bucket: columns.row_count),
+    'ip_counts': Primitive(['client_ip'], lambda columns, bucket: count_ips(columns.log_dataframe['client_ip'])),
+    'timestamp_range': Primitive(['timestamp'], lambda columns, bucket: (pd.Timestamp(columns.timestamps.min()),
+                                                                         pd.Timestamp(columns.timestamps.max()))),
+    'size_sums': Primitive(['response_header_size', 'response_size'],
+                           lambda columns, bucket: tuple(sizes.sum() for sizes in columns.positive_sizes)),
+    'bucket_counts': Primitive(['timestamp', 'response_header_size', 'response_size'], count_buckets),
+}
+
+
+# Primitives with the totals per key of every dimension, mapped to their dimension
+GROUP_PRIMITIVES = {group_primitive(dimension): dimension for dimension in GROUP_BY_DIMENSIONS}
+PRIMITIVES.update({
+    group_primitive(dimension): Primitive([dimension_spec.column, 'response_header_size', 'response_size'],
+                                          lambda columns, bucket, dimension=dimension: count_groups(columns, dimension))
+    for dimension, dimension_spec in GROUP_BY_DIMENSIONS.items()
+})
+# Primitives with the percentiles, overall or per key of a dimension, mapped to their dimension
+PERCENTILE_PRIMITIVES = {percentile_primitive(dimension): dimension for dimension in [None, *PERCENTILE_DIMENSIONS]}
+PRIMITIVES.update({
+    primitive: Primitive(PERCENTILE_COLUMNS if dimension is None
+                         else [GROUP_BY_DIMENSIONS[dimension].column, *PERCENTILE_COLUMNS],
+                         lambda columns, bucket, dimension=dimension: size_percentiles(columns, dimension))
+    for primitive, dimension in PERCENTILE_PRIMITIVES.items()
+})
+
+
+class LogStatistics(StatisticsEngine):
+    """
+    Statistics for logs that are stored in a Dataframe. Statistics are computed from primitive aggregates (see
+    PRIMITIVES), which are memoized, so statistics that share a primitive only compute it once.
 
     Parameters:
         log_dataframe: Dataframe with log entries.
@@ -17,28 +402,49 @@ class LogStatistics:
         if len(log_dataframe) == 0:
             raise ValueError('LogStatistics cannot be instantiated with an empty dataframe.')
         self.log_dataframe = log_dataframe
+        self._aggregates: Dict[Tuple[str, Optional[str]], Any] = {}
+        self._ip_counts: Optional[pd.Series] = None
+
+    def aggregate(self, primitives: Sequence[str], eps_bucket: Optional[str] = None) -> None:
+        """
+        Compute primitive aggregates (e.g., those of a StatisticsPlan) in one pass: every column is converted once and
+        shared by all primitives that read it. Primitives that are not computed here are computed on first use.
+        """
+        columns = LogColumns(self.log_dataframe)
+        for primitive in primitives:
+            key = (primitive, eps_bucket if primitive == 'bucket_counts' else None)
+            if key not in self._aggregates:
+                self._aggregates[key] = PRIMITIVES[primitive].compute(columns, key[1])
 
     def most_frequent_ip(self) -> str:
         """
         Returns the most frequent (Client) IP.
-        Note: There can be more than one IP with that property, in that case one IP is chosen.
+        Note: There can be more than one IP with that property, in that case the one that appears first is chosen.
         """
-        return self.log_dataframe['client_ip'].value_counts().index[0]
+        return self._sorted_ip_counts().index[0]
 
     def least_frequent_ip(self) -> str:
         """
         Returns the least frequent (Client) IP.
-        Note: There can be more than one IP with that property, in that case one IP is chosen.
+        Note: There can be more than one IP with that property, in that case the one that appears last is chosen.
+        """
+        return self._sorted_ip_counts().index[-1]
+
+    def distinct_ip_count(self) -> int:
+        """
+        Returns the number of distinct (Client) IPs.
         """
-        return self.log_dataframe['client_ip'].value_counts().index[-1]
+        return len(self._sorted_ip_counts())
 
     def events_per_second(self) -> float:
         """
         Returns the average number of events per second.
         """
-        number_of_events = len(self.log_dataframe)
-        time_span: timedelta = self.log_dataframe['timestamp'].max() - self.log_dataframe['timestamp'].min()
-        number_of_seconds = time_span.seconds
+        number_of_events = self._aggregate('row_count')
+        min_timestamp, max_timestamp = self._aggregate('timestamp_range')
+        time_span: timedelta = max_timestamp - min_timestamp
+        # Whole seconds of the span, including whole days (time_span.seconds would drop them)
+        number_of_seconds = time_span // timedelta(seconds=1)
         return number_of_events / number_of_seconds
 
     def total_amount_of_bytes_exchanged(self) -> int:
@@ -48,6 +454,402 @@ class LogStatistics:
         can be -1 (e.g., when data is returned 'Chunked'). Adding entries with -1 to the sum would slightly taint the
         overall value.
         """
-        total_sum_of_bytes_exchanged = (self.log_dataframe['response_header_size'].where(lambda size: size > 0).sum()
-                                        + self.log_dataframe['response_size'].where(lambda size: size > 0).sum())
-        return int(total_sum_of_bytes_exchanged)
+        response_header_size_sum, response_size_sum = self._aggregate('size_sums')
+        return int(response_header_size_sum + response_size_sum)
+
+    def eps_series(self, bucket: str) -> Dict:
+        """
+        Returns the number of events and bytes exchanged per time bucket of size bucket (e.g., '1s', '1min', '1h'),
+        and the peak and percentiles of the events per second per bucket. See summarize_buckets for details.
+        """
+        return summarize_buckets(self._aggregate('bucket_counts', bucket), bucket)
+
+    def group_breakdown(self, dimension: str, top: Optional[int] = None, top_by: str = 'requests') -> List[Dict]:
+        """
+        Returns the number of requests and bytes exchanged per key of a dimension (see GROUP_BY_DIMENSIONS), ordered by
+        top_by. If top is set, only the top keys are returned. See top_groups for details.
+        """
+        return top_groups(self._aggregate(group_primitive(dimension)), top, top_by)
+
+    def percentiles(self, by: Optional[str] = None) -> Dict:
+        """
+        Returns the exact percentiles (see PERCENTILES) and maximum of the elapsed time (response_header_size) and the
+        response size, see size_percentiles. If by is set, they are also broken down by the keys of this dimension
+        (under 'by_' and the dimension).
+        """
+        percentiles = dict(self._aggregate(percentile_primitive()))
+        if by is not None:
+            percentiles[f'by_{by}'] = self._aggregate(percentile_primitive(by))
+        return percentiles
+
+    def _aggregate(self, primitive: str, bucket: Optional[str] = None) -> Any:
+        self.aggregate([primitive], bucket)
+        return self._aggregates[(primitive, bucket)]
+
+    def _sorted_ip_counts(self) -> pd.Series:
+        # The sorted counts are shared by all IP statistics, so they are only sorted once. The sort is stable, so of IPs
+        # with equal counts the first to appear comes first, whatever sort algorithm numpy picks for the platform.
+        if self._ip_counts is None:
+            self._ip_counts = self._aggregate('ip_counts').sort_values(ascending=False, kind='stable')
+        return self._ip_counts
+
+
+class LogStatisticsAccumulator(StatisticsEngine):
+    """
+    Statistics for logs that are fed in chunks of Dataframes. Only aggregates are kept between chunks, so memory scales
+    with the number of distinct client IPs instead of the number of log entries. Accumulators over different chunks
+    can be merged. The results are identical to those of LogStatistics over the concatenation of all chunks, except
+    for the percentiles, which are estimated from quantile sketches (see SizeQuantiles) within percentile_error.
+
+    Parameters:
+        eps_bucket: If set, the number of events and bytes per time bucket of this size are accumulated for eps_series.
+        primitives: Primitive aggregates (see PRIMITIVES) to accumulate, e.g., those of a StatisticsPlan. By default,
+        all primitives except those per key of a dimension are accumulated (bucket counts only if eps_bucket is set).
+        The row count is always accumulated.
+        max_memory: If set, the exact counts per IP are spilled to disk (see SpilledCounts) whenever their estimated
+        size in memory exceeds this number of bytes, and the IP statistics are computed from the spilled counts. Close
+        the accumulator to remove the spilled counts.
+        percentile_error: Maximum error of the estimated percentiles relative to the exact percentiles.
+    Raises:
+        ValueError: If a statistic is requested before any log entry has been accumulated, if a primitive it depends on
+        is not accumulated, or if eps_series is requested for another bucket size than eps_bucket.
+    """
+
+    def __init__(self, eps_bucket: Optional[str] = None, primitives: Optional[Sequence[str]] = None,
+                 max_memory: Optional[int] = None, percentile_error: float = DEFAULT_PERCENTILE_ERROR):
+        if primitives is None:
+            primitives = [primitive for primitive in PRIMITIVES if primitive not in GROUP_PRIMITIVES
+                          and PERCENTILE_PRIMITIVES.get(primitive) is None]
+        self.primitives = {'row_count', *primitives}
+        if eps_bucket is None:
+            self.primitives.discard('bucket_counts')
+        self.group_totals = {GROUP_PRIMITIVES[primitive]: GroupTotals() for primitive in GROUP_PRIMITIVES
+                             if primitive in self.primitives}
+        self.percentile_error = percentile_error
+        self.size_quantiles = {primitive: SizeQuantiles(percentile_error, dimension)
+                               for primitive, dimension in PERCENTILE_PRIMITIVES.items()
+                               if primitive in self.primitives}
+        self.row_count = 0
+        self.eps_bucket = eps_bucket
+        self.bucket_counts = pd.DataFrame({'events': pd.Series(dtype='int64'), 'bytes': pd.Series(dtype='int64')})
+        # Counts are kept in order of first appearance, like value_counts(sort=False) over the concatenated chunks.
+        # This keeps the tie-breaking between IPs with equal counts identical to LogStatistics. Like in GroupTotals, the
+        # counts of a chunk are only collected and combined by hash grouping once the collected counts outgrow the
+        # combined ones, so a chunk does not cost time proportional to all IPs seen so far (see _combined_ip_counts).
+        self.ip_counts = pd.Series(dtype='Int64')
+        self._pending_ip_counts: List[pd.Series] = []
+        self._pending_ip_count_rows = 0
+        self.max_memory = max_memory
+        self.spilled_ip_counts: Optional[SpilledCounts] = None
+        # Estimated bytes per IP in ip_counts
+        self._ip_count_size = 0.0
+        self.min_timestamp = None
+        self.max_timestamp = None
+        self.response_header_size_sum = 0
+        self.response_size_sum = 0
+
+    def update(self, log_dataframe: pd.DataFrame) -> None:
+        """
+        Add the log entries of a (cleaned) dataframe to the accumulated aggregates.
+        """
+        if len(log_dataframe) == 0:
+            return
+        columns = LogColumns(log_dataframe)
+        self.row_count += columns.row_count
+        if 'ip_counts' in self.primitives and 'client_ip' in log_dataframe:
+            self._add_ip_counts(PRIMITIVES['ip_counts'].compute(columns, None))
+        if 'timestamp_range' in self.primitives:
+            self._merge_timestamps(*PRIMITIVES['timestamp_range'].compute(columns, None))
+        if 'size_sums' in self.primitives:
+            response_header_size_sum, response_size_sum = PRIMITIVES['size_sums'].compute(columns, None)
+            self.response_header_size_sum += response_header_size_sum
+            self.response_size_sum += response_size_sum
+        if 'bucket_counts' in self.primitives:
+            self._merge_bucket_counts(PRIMITIVES['bucket_counts'].compute(columns, self.eps_bucket))
+        for dimension, group_totals in self.group_totals.items():
+            group_totals.add(PRIMITIVES[group_primitive(dimension)].compute(columns, None))
+        for size_quantiles in self.size_quantiles.values():
+            size_quantiles.add(columns)
+
+    def merge(self, other: 'LogStatisticsAccumulator') -> None:
+        """
+        Merge the aggregates of another accumulator into this one. The other accumulator is treated as holding log
+        entries that come after the entries of this accumulator.
+        """
+        if other.row_count == 0:
+            return
+        self.row_count += other.row_count
+        if 'ip_counts' in self.primitives:
+            self._merge_ip_statistics(other)
+        if 'timestamp_range' in self.primitives:
+            self._merge_timestamps(other.min_timestamp, other.max_timestamp)
+        if 'size_sums' in self.primitives:
+            self.response_header_size_sum += other.response_header_size_sum
+            self.response_size_sum += other.response_size_sum
+        if 'bucket_counts' in self.primitives:
+            self._merge_bucket_counts(other.bucket_counts)
+        for dimension, group_totals in self.group_totals.items():
+            group_totals.merge(other.group_totals[dimension])
+        for primitive, size_quantiles in self.size_quantiles.items():
+            size_quantiles.merge(other.size_quantiles[primitive])
+
+    def most_frequent_ip(self) -> str:
+        """
+        Returns the most frequent (Client) IP.
+        Note: There can be more than one IP with that property, in that case the one that appears first is chosen.
+        """
+        spilled_summary = self._spilled_ip_summary()
+        if spilled_summary is not None:
+            return spilled_summary.most_frequent
+        return self._sorted_ip_counts().index[0]
+
+    def least_frequent_ip(self) -> str:
+        """
+        Returns the least frequent (Client) IP.
+        Note: There can be more than one IP with that property, in that case the one that appears last is chosen.
+        """
+        spilled_summary = self._spilled_ip_summary()
+        if spilled_summary is not None:
+            return spilled_summary.least_frequent
+        return self._sorted_ip_counts().index[-1]
+
+    def distinct_ip_count(self) -> int:
+        """
+        Returns the number of distinct (Client) IPs.
+        """
+        self._raise_if_empty('ip_counts')
+        spilled_summary = self._spilled_ip_summary()
+        if spilled_summary is not None:
+            return spilled_summary.distinct_count
+        return len(self._combined_ip_counts())
+
+    def events_per_second(self) -> float:
+        """
+        Returns the average number of events per second.
+        """
+        self._raise_if_empty('timestamp_range')
+        time_span: timedelta = self.max_timestamp - self.min_timestamp
+        number_of_seconds = time_span // timedelta(seconds=1)
+        return self.row_count / number_of_seconds
+
+    def total_amount_of_bytes_exchanged(self) -> int:
+        """
+        Returns total amount of bytes exchanged by adding the sums of the positive header and response sizes.
+        See LogStatistics.total_amount_of_bytes_exchanged for details.
+        """
+        self._raise_if_empty('size_sums')
+        return int(self.response_header_size_sum + self.response_size_sum)
+
+    def eps_series(self, bucket: str) -> Dict:
+        """
+        Returns the traffic series per time bucket, see LogStatistics.eps_series.
+        """
+        self._raise_if_empty('bucket_counts')
+        if bucket != self.eps_bucket:
+            raise ValueError(f'Bucket counts have been accumulated for bucket {self.eps_bucket}, not {bucket}.')
+        return summarize_buckets(self.bucket_counts, bucket)
+
+    def group_breakdown(self, dimension: str, top: Optional[int] = None, top_by: str = 'requests') -> List[Dict]:
+        """
+        Returns the requests and bytes per key of a dimension, see LogStatistics.group_breakdown.
+        """
+        self._raise_if_empty(group_primitive(dimension))
+        return top_groups(self.group_totals[dimension].totals(), top, top_by)
+
+    def percentiles(self, by: Optional[str] = None) -> Dict:
+        """
+        Returns the estimated percentiles and the exact maximum of the elapsed time and the response size, see
+        LogStatistics.percentiles. Every estimate is within percentile_error of the exact percentile, relative to it.
+        """
+        self._raise_if_empty(percentile_primitive())
+        percentiles = self.size_quantiles[percentile_primitive()].percentiles()
+        if by is not None:
+            self._raise_if_empty(percentile_primitive(by))
+            percentiles[f'by_{by}'] = self.size_quantiles[percentile_primitive(by)].percentiles()
+        return percentiles
+
+    def error_bounds(self) -> Dict[str, Dict]:
+        """
+        Returns the maximum error of the estimated percentiles relative to the exact percentiles, if the percentiles are
+        accumulated.
+        """
+        self._raise_if_empty()
+        if percentile_primitive() not in self.primitives:
+            return {}
+        return {'percentiles': {'relative_error': self.percentile_error}}
+
+    def close(self) -> None:
+        """
+        Remove the IP counts that were spilled to disk, if any.
+        """
+        if self.spilled_ip_counts is not None:
+            self.spilled_ip_counts.close()
+
+    def _add_ip_counts(self, ip_counts: pd.Series) -> None:
+        self._merge_ip_counts(ip_counts)
+
+    def _merge_ip_statistics(self, other: 'LogStatisticsAccumulator') -> None:
+        self._merge_exact_ip_counts(other)
+
+    def _merge_exact_ip_counts(self, other: 'LogStatisticsAccumulator') -> None:
+        if other.spilled_ip_counts is not None:
+            # The counts of this accumulator come first, so they are spilled first.
+            self._spill_ip_counts()
+            self.spilled_ip_counts.merge(other.spilled_ip_counts)
+        self._merge_ip_counts(other._combined_ip_counts())
+
+    def _merge_ip_counts(self, ip_counts: pd.Series) -> None:
+        if len(ip_counts) == 0:
+            return
+        self._pending_ip_counts.append(ip_counts)
+        self._pending_ip_count_rows += len(ip_counts)
+        if self._pending_ip_count_rows > len(self.ip_counts):
+            self._combine_ip_counts()
+        if self.max_memory is not None:
+            # The size per IP is estimated from the latest counts, which are small compared to all counts.
+            self._ip_count_size = max(self._ip_count_size, ip_counts.memory_usage(deep=True) / len(ip_counts))
+            if (len(self.ip_counts) + self._pending_ip_count_rows) * self._ip_count_size > self.max_memory:
+                self._spill_ip_counts()
+
+    def _combined_ip_counts(self) -> pd.Series:
+        """
+        Returns the exact counts per IP in memory, in order of first appearance.
+        """
+        if self._pending_ip_counts:
+            self._combine_ip_counts()
+        return self.ip_counts
+
+    def _combine_ip_counts(self) -> None:
+        parts = [self.ip_counts, *self._pending_ip_counts] if len(self.ip_counts) > 0 else self._pending_ip_counts
+        if len(parts) > 1:
+            # Counts are never missing, so they are summed as plain int64. Grouped sums of the nullable Int64 dtype are
+            # slower and can leave a floating point overflow flag set, which a later to_datetime reports as an error.
+            combined = pd.concat([part.astype('int64') for part in parts]).groupby(level=0, sort=False).sum()
+        else:
+            combined = parts[0]
+        self.ip_counts = combined.astype('Int64')
+        self._pending_ip_counts = []
+        self._pending_ip_count_rows = 0
+
+    def _spill_ip_counts(self) -> None:
+        if self.spilled_ip_counts is None:
+            self.spilled_ip_counts = SpilledCounts()
+        self.spilled_ip_counts.add(self._combined_ip_counts())
+        self.ip_counts = pd.Series(dtype='Int64')
+
+    def _spilled_ip_summary(self) -> Optional[CountSummary]:
+        """
+        Returns the summary of the spilled IP counts, after spilling the counts in memory as well, or None if no IP
+        counts were spilled.
+        """
+        self._raise_if_empty('ip_counts')
+        if self.spilled_ip_counts is None:
+            return None
+        self._spill_ip_counts()
+        return self.spilled_ip_counts.summary()
+
+    def _merge_bucket_counts(self, bucket_counts: pd.DataFrame) -> None:
+        if len(self.bucket_counts) == 0:
+            self.bucket_counts = bucket_counts
+        else:
+            self.bucket_counts = self.bucket_counts.add(bucket_counts, fill_value=0).astype('int64')
+
+    def _merge_timestamps(self, min_timestamp: pd.Timestamp, max_timestamp: pd.Timestamp) -> None:
+        if self.min_timestamp is None or min_timestamp < self.min_timestamp:
+            self.min_timestamp = min_timestamp
+        if self.max_timestamp is None or max_timestamp > self.max_timestamp:
+            self.max_timestamp = max_timestamp
+
+    def _sorted_ip_counts(self) -> pd.Series:
+        self._raise_if_empty('ip_counts')
+        # Same sort as in LogStatistics, so ties resolve identically.
+        return self._combined_ip_counts().sort_values(ascending=False, kind='stable')
+
+    def _raise_if_empty(self, primitive: Optional[str] = None) -> None:
+        if self.row_count == 0:
+            raise ValueError('No log entries have been accumulated.')
+        if primitive is not None and primitive not in self.primitives:
+            raise ValueError(f'The primitive {primitive} has not been accumulated.')
+
+
+class ApproximateLogStatisticsAccumulator(LogStatisticsAccumulator):
+    """
+    LogStatisticsAccumulator that answers the IP statistics from sketches of bounded size instead of exact counts per
+    IP: the most frequent IP from a Space-Saving summary and the number of distinct IPs from a HyperLogLog sketch. Both
+    are fed with the IP counts of each chunk and are merged with the sketches of other accumulators. The other
+    statistics are those of LogStatisticsAccumulator.
+
+    The least frequent IP cannot be found in a summary of bounded size. If exact_ip_counts is true, exact counts per IP
+    are kept in addition for least_frequent_ip.
+
+    Parameters:
+        top_k_error: Maximum overestimation of the count of the most frequent IP, as a fraction of all log entries.
+        distinct_error: Relative standard error of the number of distinct IPs.
+        exact_ip_counts: If true, also keep exact counts per IP.
+        eps_bucket: See LogStatisticsAccumulator.
+        primitives: See LogStatisticsAccumulator.
+        max_memory: See LogStatisticsAccumulator. Only applies to the exact counts per IP.
+        percentile_error: See LogStatisticsAccumulator.
+    Raises:
+        ValueError: If a statistic is requested before any log entry has been accumulated, or if least_frequent_ip is
+        requested without exact_ip_counts.
+    """
+
+    def __init__(self, top_k_error: float = DEFAULT_TOP_K_ERROR, distinct_error: float = DEFAULT_DISTINCT_ERROR,
+                 exact_ip_counts: bool = False, eps_bucket: Optional[str] = None,
+                 primitives: Optional[Sequence[str]] = None, max_memory: Optional[int] = None,
+                 percentile_error: float = DEFAULT_PERCENTILE_ERROR):
+        super().__init__(eps_bucket, primitives, max_memory, percentile_error)
+        self.exact_ip_counts = exact_ip_counts
+        self.frequent_ips = SpaceSaving.for_error(top_k_error)
+        self.distinct_ips = HyperLogLog.for_error(distinct_error)
+
+    def most_frequent_ip(self) -> str:
+        """
+        Returns an IP whose count is at most error_bounds()['mfip']['max_count_error'] lower than that of the most
+        frequent (Client) IP.
+        """
+        self._raise_if_empty('ip_counts')
+        return self.frequent_ips.top()[0]
+
+    def least_frequent_ip(self) -> str:
+        if not self.exact_ip_counts:
+            raise ValueError('The least frequent IP requires exact IP counts.')
+        return super().least_frequent_ip()
+
+    def distinct_ip_count(self) -> int:
+        """
+        Returns the estimated number of distinct (Client) IPs.
+        """
+        self._raise_if_empty('ip_counts')
+        return self.distinct_ips.estimate()
+
+    def error_bounds(self) -> Dict[str, Dict]:
+        """
+        Returns the error bounds of the approximate statistics: for the most frequent IP its estimated count, by how
+        much the estimate may exceed the true count, and whether the IP is guaranteed to be the most frequent one; for
+        the number of distinct IPs the relative standard error of the estimate. The most frequent IP is left out if no
+        IPs have been counted, and both are left out if IPs are not accumulated at all. The error of the percentiles is
+        added like by LogStatisticsAccumulator.error_bounds.
+        """
+        error_bounds = super().error_bounds()
+        if 'ip_counts' not in self.primitives:
+            return error_bounds
+        if len(self.frequent_ips.counts) > 0:
+            _, count, count_error = self.frequent_ips.top()
+            error_bounds['mfip'] = {'count': count, 'max_count_error': count_error,
+                                    'guaranteed': bool(self.frequent_ips.is_top_guaranteed())}
+        error_bounds['distinct_ips'] = {'relative_standard_error': self.distinct_ips.relative_standard_error}
+        return error_bounds
+
+    def _add_ip_counts(self, ip_counts: pd.Series) -> None:
+        self.frequent_ips.update(ip_counts)
+        self.distinct_ips.update(ip_counts.index)
+        if self.exact_ip_counts:
+            self._merge_ip_counts(ip_counts)
+
+    def _merge_ip_statistics(self, other: 'ApproximateLogStatisticsAccumulator') -> None:
+        self.frequent_ips.merge(other.frequent_ips)
+        self.distinct_ips.merge(other.distinct_ips)
+        if self.exact_ip_counts:
+            self._merge_exact_ip_counts(other)
@@ -0,0 +1,233 @@
+import json
+import logging
+import os
+from typing import BinaryIO, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from analyzer.files import align_to_line_start, file_identity
+
+logger = logging.getLogger(__name__)
+
+# Lines are searched with this margin around the bounds of a time range, so timestamps that are rounded differently
+# when sampled and when parsed cannot fall out of the byte range. The rows in the margin are dropped by the row filter.
+TIME_RANGE_MARGIN_SECONDS = 1.0
+# Byte ranges of at most this size are scanned line by line instead of being searched further.
+SEARCH_SCAN_SIZE = 64 * 1024
+# Number of evenly spaced lines whose timestamps are sampled to check that a file is ordered.
+ORDER_SAMPLE_COUNT = 16
+INDEX_FORMAT_VERSION = 1
+INDEX_INTERVAL = 1024 * 1024
+INDEX_SUFFIX = '.tsidx'
+
+
+class TimeRange:
+    """
+    Half-open time range [since, until) of log entries. A bound that is None is unbounded.
+
+    Parameters:
+        since: Earliest timestamp of log entries in the range.
+        until: Timestamp after the last log entries in the range.
+    """
+
+    def __init__(self, since: Optional[pd.Timestamp] = None, until: Optional[pd.Timestamp] = None):
+        self.since = since
+        self.until = until
+
+    def __repr__(self) -> str:
+        return f'TimeRange(since={self.since!r}, until={self.until!r})'
+
+    def filter(self, dataframe: pd.DataFrame) -> pd.DataFrame:
+        """
+        Returns the log entries of a cleaned dataframe that lie in the range.
+        """
+        timestamps = dataframe['timestamp']
+        in_range = pd.Series(True, index=dataframe.index)
+        if self.since is not None:
+            in_range &= timestamps >= self.since
+        if self.until is not None:
+            in_range &= timestamps < self.until
+        return dataframe if in_range.all() else dataframe[in_range]
+
+    def find_byte_range(self, path: str, line_timestamp: Callable[[bytes], Optional[float]],
+                        use_index: bool = False) -> Optional[Tuple[int, int]]:
+        """
+        Returns the newline-aligned byte range [start, end) of an uncompressed log file that holds all log entries in
+        the range, found by a binary search over the timestamps of sampled lines. Returns None if the sampled
+        timestamps show that the file is not ordered by timestamp, so it has to be scanned completely.
+
+        Parameters:
+            path: Path of the log file.
+            line_timestamp: Returns the timestamp of a raw log line in seconds since the Unix epoch, or None if the
+            line has no valid timestamp.
+            use_index: If true, the search starts from the sparse TimeIndex stored next to the file, which is built
+            (or rebuilt if the file changed) and saved first if needed.
+        """
+        index = TimeIndex.for_file(path, line_timestamp) if use_index else None
+        file_size = os.path.getsize(path)
+        with open(path, 'rb') as file:
+            search = TimestampSearch(file, file_size, line_timestamp, [] if index is None else index.samples)
+            if index is None:
+                for sample in range(ORDER_SAMPLE_COUNT):
+                    search.sample(file_size * sample // ORDER_SAMPLE_COUNT)
+            start = 0 if self.since is None else search.find(_seconds(self.since) - TIME_RANGE_MARGIN_SECONDS)
+            end = file_size if self.until is None else search.find(_seconds(self.until) + TIME_RANGE_MARGIN_SECONDS)
+            if not search.is_ordered():
+                return None
+        return start, max(start, end)
+
+
+class LineSample(NamedTuple):
+    """
+    A sampled log line: the byte offsets of its start and end (after the newline) and its timestamp in seconds.
+    """
+    start: int
+    end: int
+    timestamp: float
+
+
+class TimestampSearch:
+    """
+    Binary search for the first log line at or after a timestamp in a file that is ordered by timestamp. Lines
+    without a valid timestamp (e.g., malformed lines) are skipped. All sampled lines are kept, so the order of the file
+    can be checked on them afterwards.
+
+    Parameters:
+        file: The log file, opened in binary mode.
+        file_size: Size of the file in bytes.
+        line_timestamp: See TimeRange.find_byte_range.
+        samples: Lines that are already known, e.g., from a TimeIndex. They narrow down the search.
+    """
+
+    def __init__(self, file: BinaryIO, file_size: int, line_timestamp: Callable[[bytes], Optional[float]],
+                 samples: Sequence[LineSample] = ()):
+        self.file = file
+        self.file_size = file_size
+        self.line_timestamp = line_timestamp
+        self.samples = list(samples)
+
+    def sample(self, offset: int) -> Optional[LineSample]:
+        """
+        Returns the first line with a valid timestamp that starts at or after offset, or None if there is none.
+        """
+        start = align_to_line_start(self.file, offset)
+        while start < self.file_size:
+            line = self.file.readline()
+            timestamp = self.line_timestamp(line)
+            if timestamp is not None:
+                sample = LineSample(start, start + len(line), timestamp)
+                self.samples.append(sample)
+                return sample
+            start += len(line)
+        return None
+
+    def find(self, timestamp: float) -> int:
+        """
+        Returns the offset of the first line with a timestamp at or after timestamp, or the file size if there is
+        none.
+        """
+        # Every line with a valid timestamp that starts before low is earlier than timestamp.
+        low, high = 0, self.file_size
+        for sample in self.samples:
+            if sample.timestamp < timestamp:
+                low = max(low, sample.end)
+            else:
+                high = min(high, sample.start)
+        while high - low > SEARCH_SCAN_SIZE:
+            middle = (low + high) // 2
+            sample = self.sample(middle)
+            if sample is None or sample.timestamp >= timestamp:
+                high = middle
+            else:
+                low = sample.end
+
+        start = align_to_line_start(self.file, low)
+        for line in iter(self.file.readline, b''):
+            line_timestamp = self.line_timestamp(line)
+            if line_timestamp is not None and line_timestamp >= timestamp:
+                return start
+            start += len(line)
+        return self.file_size
+
+    def is_ordered(self) -> bool:
+        """
+        Returns True if the timestamps of all sampled lines are in file order.
+        """
+        timestamps = [sample.timestamp for sample in sorted(set(self.samples))]
+        return all(earlier <= later for earlier, later in zip(timestamps, timestamps[1:]))
+
+
+class TimeIndex:
+    """
+    Sparse index of a log file from timestamps to byte offsets, stored next to the file (FILE.tsidx). It holds the
+    first line with a valid timestamp after every interval bytes, so a time range search only needs to look at a
+    single interval. The index belongs to the identity of the file and is rebuilt when the file changes.
+
+    Parameters:
+        identity: Identity of the indexed file, see file_identity.
+        samples: The indexed lines in file order.
+    """
+
+    def __init__(self, identity: Dict, samples: List[LineSample]):
+        self.identity = identity
+        self.samples = samples
+
+    @staticmethod
+    def index_path(path: str) -> str:
+        return path + INDEX_SUFFIX
+
+    @classmethod
+    def for_file(cls, path: str, line_timestamp: Callable[[bytes], Optional[float]]) -> 'TimeIndex':
+        """
+        Returns the stored index of a file, or builds and stores a new one if there is none for the current file.
+        """
+        identity = file_identity(path)
+        index = cls.load(path, identity)
+        if index is None:
+            index = cls.build(path, identity, line_timestamp)
+            try:
+                index.save(path)
+            except OSError as error:
+                logger.warning(f'Cannot store the time index of {path}: {error}')
+        return index
+
+    @classmethod
+    def build(cls, path: str, identity: Dict, line_timestamp: Callable[[bytes], Optional[float]],
+              interval: int = INDEX_INTERVAL) -> 'TimeIndex':
+        file_size = os.path.getsize(path)
+        with open(path, 'rb') as file:
+            search = TimestampSearch(file, file_size, line_timestamp)
+            offset = 0
+            while offset < file_size:
+                sample = search.sample(offset)
+                if sample is None:
+                    break
+                offset = max(sample.end, offset + interval)
+        logger.info(f'Built a time index of {len(search.samples)} lines for {path}')
+        return cls(identity, search.samples)
+
+    @classmethod
+    def load(cls, path: str, identity: Dict) -> Optional['TimeIndex']:
+        """
+        Returns the stored index of a file with the given identity, or None if there is no valid one.
+        """
+        try:
+            with open(cls.index_path(path)) as index_file:
+                stored = json.load(index_file)
+        except (OSError, ValueError):
+            return None
+        if stored.get('version') != INDEX_FORMAT_VERSION or stored.get('identity') != identity:
+            return None
+        return cls(identity, [LineSample(*sample) for sample in stored['samples']])
+
+    def save(self, path: str) -> None:
+        index_path = self.index_path(path)
+        temporary_path = f'{index_path}.tmp-{os.getpid()}'
+        with open(temporary_path, 'w') as index_file:
+            json.dump({'version': INDEX_FORMAT_VERSION, 'identity': self.identity,
+                       'samples': [list(sample) for sample in self.samples]}, index_file)
+        os.replace(temporary_path, index_path)
+
+
+def _seconds(timestamp: pd.Timestamp) -> float:
+    return (timestamp - pd.Timestamp(0)) / pd.Timedelta(seconds=1)
@@ -1,5 +1,7 @@
+import gzip
 import os
 import shutil
+import subprocess
 import sys
 
 import pytest
@@ -28,3 +30,56 @@ class TestMain:
         with open(tmp_file) as output_file:
             actual_output_content = output_file.read()
         assert actual_output_content == expected_output_content
+
+    @pytest.mark.parametrize('option', ['--top-k-error', '--distinct-error', '--percentile-error'])
+    @pytest.mark.parametrize('value', ['0', '-0.1', '1', 'nan', 'often'])
+    def test_log_analyzer_rejects_errors_outside_of_zero_to_one(self, option, value, capsys) -> None:
+        sys.argv = ['analyzer', FILE1, '--mfip', '--percentiles', '--approximate', option, value]
+
+        with pytest.raises(SystemExit) as exit_info:
+            main()
+
+        assert exit_info.value.code == 2
+        assert f"invalid error: '{value}'" in capsys.readouterr().err
+
+    @pytest.mark.parametrize('option, other_options', [('--chunk-size', ['--mfip', '--stream']),
+                                                       ('--top', ['--group-by', 'host'])])
+    @pytest.mark.parametrize('value', ['0', '-5', '1.5', 'many'])
+    def test_log_analyzer_rejects_values_that_are_not_positive_integers(self, option, other_options, value,
+                                                                        capsys) -> None:
+        sys.argv = ['analyzer', FILE1, *other_options, option, value]
+
+        with pytest.raises(SystemExit) as exit_info:
+            main()
+
+        assert exit_info.value.code == 2
+        assert f"invalid positive integer: '{value}'" in capsys.readouterr().err
+
+    def test_log_analyzer_rejects_sample_of_compressed_input_files(self, tmp_path, capsys) -> None:
+        path = tmp_path / 'access1.log.gz'
+        with open(FILE1, 'rb') as file:
+            path.write_bytes(gzip.compress(file.read()))
+        sys.argv = ['analyzer', str(path), '--eps', '--sample', '0.5']
+
+        with pytest.raises(SystemExit) as exit_info:
+            main()
+
+        assert exit_info.value.code == 2
+        assert '--sample requires regular, uncompressed input files' in capsys.readouterr().err
+
+    def test_importing_analyzer_does_not_import_pandas(self) -> None:
+        code = 'import sys, analyzer; print(any(module in sys.modules for module in ["pandas", "numpy"]))'
+
+        completed_process = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                           env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+
+        assert completed_process.stdout == 'False\n'
+
+    def test_log_analyzer_rejects_options_that_python_statistics_engine_does_not_support(self, capsys) -> None:
+        sys.argv = ['analyzer', FILE1, '--mfip', '--stream', '--statistics-engine', 'python']
+
+        with pytest.raises(SystemExit) as exit_info:
+            main()
+
+        assert exit_info.value.code == 2
+        assert 'The python statistics engine does not support --stream' in capsys.readouterr().err
@@ -1,5 +1,8 @@
+import json
+import os
 from io import StringIO
 
+import pandas as pd
 import pytest
 
 from analyzer.analysis import LogAnalyzer
@@ -89,3 +92,262 @@ class TestLogAnalyzer:
         self.log_analyzer.output.seek(0)
         actual_output_content = self.log_analyzer.output.read()
         assert expected_output_content == actual_output_content
+
+    def test_analyze_log_files_outputs_identical_results_in_stream_mode(self) -> None:
+        self.log_analyzer.mfip = True
+        self.log_analyzer.lfip = True
+        self.log_analyzer.eps = True
+        self.log_analyzer.bytes = True
+        input_contents = [file.getvalue() for file in self.log_analyzer.input_files]
+        self.log_analyzer.analyze_log_files()
+        expected_output_content = self.log_analyzer.output.getvalue()
+        self.log_analyzer.input_files = [StringIO(content) for content in input_contents]
+        self.log_analyzer.output = StringIO()
+        self.log_analyzer.output.name = 'TestName'
+        self.log_analyzer.stream = True
+        self.log_analyzer.chunk_size = 1
+
+        self.log_analyzer.analyze_log_files()
+
+        actual_output_content = self.log_analyzer.output.getvalue()
+        assert actual_output_content == expected_output_content
+
+    def test_analyze_log_files_writes_profile_report_with_profile_option(self, tmp_path) -> None:
+        self.log_analyzer.mfip = True
+        self.log_analyzer.profile = str(tmp_path / 'profile.json')
+
+        self.log_analyzer.analyze_log_files()
+
+        with open(tmp_path / 'profile.json', encoding='utf-8') as report_file:
+            report = json.load(report_file)
+        assert list(report['stages']) == ['read', 'clean', 'concat', 'aggregate', 'mfip', 'write']
+        assert report['stages']['clean']['rows_out'] == 3
+        assert 'mfip' in json.loads(self.log_analyzer.output.getvalue())
+
+    @pytest.mark.parametrize('workers', [1, 2])
+    def test_analyze_log_files_only_analyzes_time_range_of_log_file(self, tmp_path, workers) -> None:
+        path = tmp_path / 'access.log'
+        path.write_text(''.join(f'{1157689312 + second}.000 100 10.105.21.{second} TCP_MISS/200 200 GET '
+                                f'http://www.example.com/ - DIRECT/207.58.145.61 text/html\n' for second in range(10)))
+        self.log_analyzer.input_files = [open(path, encoding='utf-8')]
+        self.log_analyzer.distinct_ips = True
+        self.log_analyzer.lfip = True
+        self.log_analyzer.workers = workers
+        self.log_analyzer.since = pd.Timestamp(1157689312 + 3, unit='s')
+        self.log_analyzer.until = pd.Timestamp(1157689312 + 6, unit='s')
+
+        self.log_analyzer.analyze_log_files()
+
+        actual_output = json.loads(self.log_analyzer.output.getvalue())
+        assert actual_output == {'lfip': '10.105.21.5', 'distinct_ips': 3}
+
+    @pytest.mark.parametrize('workers', [1, 2])
+    def test_analyze_log_files_writes_rejected_lines_with_rejects_option(self, tmp_path, workers) -> None:
+        path = tmp_path / 'access.log'
+        path.write_text(''.join(f'{1157689312 + second}.000 100 10.105.21.{second} TCP_MISS/200 '
+                                f'{"ABC" if second == 4 else 200} GET http://www.example.com/ - DIRECT/207.58.145.61 '
+                                f'text/html\n' for second in range(10)))
+        self.log_analyzer.input_files = [open(path, encoding='utf-8')]
+        self.log_analyzer.bytes = True
+        self.log_analyzer.workers = workers
+        self.log_analyzer.since = pd.Timestamp(1157689312 + 3, unit='s')
+        self.log_analyzer.rejects = str(tmp_path / 'rejects.csv')
+
+        self.log_analyzer.analyze_log_files()
+
+        rejects = pd.read_csv(tmp_path / 'rejects.csv')
+        assert rejects.values.tolist() == [[str(path), 5, 'malformed_response_size']]
+        assert json.loads(self.log_analyzer.output.getvalue()) == {'bytes': 1800}
+
+    def test_analyze_log_files_raises_error_with_more_rejected_lines_than_max_reject_ratio(self) -> None:
+        self.log_analyzer.input_files.append(StringIO('1157689320.343 1357 10.105.21.199 TCP_REFRESH_HIT/304\n'))
+        self.log_analyzer.bytes = True
+        self.log_analyzer.max_reject_ratio = 0.2
+
+        with pytest.raises(ValueError, match='Rejected 1 of 4 log lines'):
+            self.log_analyzer.analyze_log_files()
+
+        assert self.log_analyzer.output.getvalue() == ''
+
+    def test_analyze_log_files_outputs_identical_results_with_spilled_ip_counts(self, tmp_path, monkeypatch) -> None:
+        monkeypatch.setattr('tempfile.tempdir', str(tmp_path))
+        self.log_analyzer.mfip = True
+        self.log_analyzer.lfip = True
+        self.log_analyzer.distinct_ips = True
+        self.log_analyzer.analyze_log_files()
+        expected_output_content = self.log_analyzer.output.getvalue()
+        for file in self.log_analyzer.input_files:
+            file.seek(0)
+        self.log_analyzer.output = StringIO()
+        self.log_analyzer.output.name = 'TestName'
+        self.log_analyzer.max_memory = 0
+        self.log_analyzer.chunk_size = 1
+
+        self.log_analyzer.analyze_log_files()
+
+        assert self.log_analyzer.output.getvalue() == expected_output_content
+        assert os.listdir(tmp_path) == []
+
+    def test_analyze_log_files_outputs_top_groups_with_group_by_option(self) -> None:
+        self.log_analyzer.group_by = ['request_method', 'host']
+        self.log_analyzer.top = 1
+
+        self.log_analyzer.analyze_log_files()
+
+        actual_output = json.loads(self.log_analyzer.output.getvalue())
+        assert actual_output == {'group_by': {
+            'request_method': [{'key': 'GET', 'requests': 2, 'bytes': 14617}],
+            'host': [{'key': 'www.goonernews.com', 'requests': 2, 'bytes': 14617}],
+        }}
+
+    @pytest.mark.parametrize('stream', [False, True])
+    def test_analyze_log_files_outputs_percentiles_with_percentiles_option(self, stream) -> None:
+        self.log_analyzer.percentiles = True
+        self.log_analyzer.percentiles_by = 'response_code'
+        self.log_analyzer.stream = stream
+
+        self.log_analyzer.analyze_log_files()
+
+        actual_output = json.loads(self.log_analyzer.output.getvalue())
+        assert list(actual_output['percentiles']['by_response_code']) == ['TCP_MISS/200', 'TCP_REFRESH_HIT/304']
+        assert actual_output['percentiles']['response_size']['max'] == 19763
+        assert actual_output['percentiles']['response_header_size'] == pytest.approx(
+            {'p50': 2864, 'p90': 2864, 'p99': 2864, 'p99.9': 2864, 'max': 5006}, rel=0.01 if stream else 0)
+        assert ('error_bounds' in actual_output) == stream
+
+    def test_analyze_log_files_outputs_error_bounds_in_approximate_mode(self) -> None:
+        self.log_analyzer.mfip = True
+        self.log_analyzer.distinct_ips = True
+        self.log_analyzer.approximate = True
+
+        self.log_analyzer.analyze_log_files()
+
+        actual_output = json.loads(self.log_analyzer.output.getvalue())
+        assert actual_output['mfip'] == '10.105.21.199'
+        assert actual_output['distinct_ips'] == 1
+        assert actual_output['error_bounds']['mfip'] == {'count': 3, 'max_count_error': 0, 'guaranteed': True}
+        assert 'relative_standard_error' in actual_output['error_bounds']['distinct_ips']
+
+    def test_analyze_log_files_marks_results_as_approximate_with_sample_option(self, tmp_path) -> None:
+        path = tmp_path / 'access.log'
+        path.write_text(self.log_analyzer.input_files[0].getvalue())
+        self.log_analyzer.input_files = [open(path)]
+        self.log_analyzer.bytes = True
+        self.log_analyzer.sample = 1.0
+        self.log_analyzer.sample_seed = 5
+
+        self.log_analyzer.analyze_log_files()
+
+        actual_output = json.loads(self.log_analyzer.output.getvalue())
+        assert actual_output['bytes'] == 5006 + 19763 + 2864 + 10182
+        assert actual_output['error_bounds'] == {'bytes': {'standard_error': 0.0,
+                                                           'confidence_interval': [actual_output['bytes']] * 2}}
+        assert actual_output['approximate']['seed'] == 5
+        assert actual_output['approximate']['sample_fraction'] == 1.0
+
+    def test_analyze_log_files_marks_ip_statistics_as_from_sample_with_sample_option(self, tmp_path, caplog) -> None:
+        path = tmp_path / 'access.log'
+        path.write_text(self.log_analyzer.input_files[0].getvalue())
+        self.log_analyzer.input_files = [open(path)]
+        self.log_analyzer.lfip = True
+        self.log_analyzer.distinct_ips = True
+        self.log_analyzer.sample = 1.0
+
+        self.log_analyzer.analyze_log_files()
+
+        actual_output = json.loads(self.log_analyzer.output.getvalue())
+        assert actual_output['error_bounds'] == {'lfip': {'from_sample': True},
+                                                 'distinct_ips': {'from_sample': True, 'lower_bound': True}}
+        assert actual_output['approximate']['from_sample'] == ['lfip', 'distinct_ips']
+        assert 'cannot be extrapolated from a sample' in caplog.text
+
+    def test_analyze_log_files_in_follow_mode_writes_snapshot_of_appended_lines(self, tmp_path, monkeypatch) -> None:
+        path = tmp_path / 'access.log'
+        path.write_text(self.log_analyzer.input_files[0].getvalue())
+        expected_log_analyzer = LogAnalyzer(input_files=[open(path)], output=StringIO(), mfip=True, lfip=False,
+                                            eps=True, bytes=True)
+        expected_log_analyzer.output.name = 'TestName'
+        expected_log_analyzer.analyze_log_files()
+
+        def stop_following(seconds: float) -> None:
+            raise KeyboardInterrupt
+
+        monkeypatch.setattr('time.sleep', stop_following)
+        self.log_analyzer.input_files = [open(path)]
+        self.log_analyzer.mfip = self.log_analyzer.eps = self.log_analyzer.bytes = True
+        self.log_analyzer.follow = True
+        self.log_analyzer.analyze_log_files()
+
+        assert self.log_analyzer.output.getvalue() == expected_log_analyzer.output.getvalue()
+
+    def test_analyze_log_files_outputs_identical_results_with_python_statistics_engine(self, tmp_path) -> None:
+        path = tmp_path / 'access.log'
+        path.write_text(''.join(file.getvalue() for file in self.log_analyzer.input_files) +
+                        '1157689321.000 100 10.105.21.198 TCP_MISS/200 ABC GET http://www.example.com/ - DIRECT/- -\n')
+        outputs = []
+        for statistics_engine in ['pandas', 'python']:
+            log_analyzer = LogAnalyzer(input_files=[open(path)], output=StringIO(), mfip=True, lfip=True, eps=True,
+                                       bytes=True, distinct_ips=True, group_by=['host', 'username'],
+                                       statistics_engine=statistics_engine,
+                                       rejects=str(tmp_path / f'{statistics_engine}.csv'))
+            log_analyzer.output.name = 'TestName'
+            log_analyzer.analyze_log_files()
+            outputs.append(log_analyzer.output.getvalue())
+
+        assert outputs[0] == outputs[1]
+        assert (tmp_path / 'pandas.csv').read_text() == (tmp_path / 'python.csv').read_text()
+
+    def test_analyze_log_files_raises_error_with_option_that_python_statistics_engine_does_not_support(self) -> None:
+        self.log_analyzer.eps = True
+        self.log_analyzer.approximate = True
+        self.log_analyzer.statistics_engine = 'python'
+
+        with pytest.raises(ValueError, match='--approximate'):
+            self.log_analyzer.analyze_log_files()
+
+    def test_python_engine_conflicts_include_stream_so_that_auto_statistics_engine_honours_it(self) -> None:
+        self.log_analyzer.stream = True
+
+        assert self.log_analyzer.python_engine_conflicts() == ['--stream']
+        self.log_analyzer.check_statistics_engine()
+
+    def test_analyze_log_files_uses_pandas_statistics_engine_with_fast_parser_engine(self, tmp_path, caplog) -> None:
+        path = tmp_path / 'access.log'
+        path.write_text(self.log_analyzer.input_files[0].getvalue())
+        self.log_analyzer.input_files = [open(path)]
+        self.log_analyzer.bytes = True
+        self.log_analyzer.engine = 'fast'
+
+        self.log_analyzer.analyze_log_files()
+
+        assert self.log_analyzer.python_engine_conflicts() == ['--engine']
+        assert 'python statistics engine' not in caplog.text
+        assert json.loads(self.log_analyzer.output.getvalue()) == {'bytes': 5006 + 19763 + 2864 + 10182}
+
+    def test_analyze_log_files_outputs_identical_results_for_input_formats(self, tmp_path) -> None:
+        squid_path = tmp_path / 'access.log'
+        squid_path.write_text(''.join(file.getvalue() for file in self.log_analyzer.input_files))
+        jsonl_path = tmp_path / 'access.jsonl'
+        records = [{'timestamp': float(fields[0]), 'response_header_size': int(fields[1]), 'client_ip': fields[2],
+                    'response_size': int(fields[4])}
+                   for fields in map(str.split, squid_path.read_text().splitlines()) if fields]
+        jsonl_path.write_text(''.join(json.dumps(record) + '\n' for record in records))
+        outputs = []
+        for path in [squid_path, jsonl_path]:
+            log_analyzer = LogAnalyzer(input_files=[open(path)], output=StringIO(), mfip=True, lfip=True, eps=True,
+                                       bytes=True)
+            log_analyzer.output.name = 'TestName'
+            log_analyzer.analyze_log_files()
+            outputs.append(log_analyzer.output.getvalue())
+
+        assert outputs[0] == outputs[1]
+
+    def test_analyze_log_files_raises_error_with_python_statistics_engine_for_jsonl_input(self, tmp_path) -> None:
+        path = tmp_path / 'access.jsonl'
+        path.write_text('{"timestamp": 1157689312.049, "response_header_size": 5006, "response_size": 19763}\n')
+        self.log_analyzer.input_files = [open(path)]
+        self.log_analyzer.mfip = True
+        self.log_analyzer.statistics_engine = 'python'
+
+        with pytest.raises(ValueError, match='squid input format'):
+            self.log_analyzer.analyze_log_files()
@@ -0,0 +1,101 @@
+import os
+from typing import List, Optional
+
+import pandas as pd
+import pytest
+
+from analyzer.cache import CachingParser, ParseCache
+from analyzer.parsing import CSVParser, create_parser
+
+
+class TestCachingParser:
+    file_content = """
+    1157689312.049   5006 10.105.21.199 TCP_MISS/200 19763 CONNECT login.yahoo.com:443 badeyek DIRECT/209.73.177.115 -
+    1157689320.327   2864 10.105.21.199 TCP_MISS/200 10182 GET http://www.goonernews.com/ badeyek DIRECT/207.58.145.61 text/html
+    1157689320.343   1357 10.105.21.198 TCP_REFRESH_HIT/304 214 GET http://www.goonernews.com/styles.css badeyek DIRECT/207.58.145.61 -
+    """
+    log_path: str
+    cache_dir: str
+
+    @pytest.fixture(autouse=True)
+    def setup_test(self, tmp_path) -> None:
+        self.log_path = str(tmp_path / 'access.log')
+        with open(self.log_path, 'w') as log_file:
+            log_file.write(self.file_content)
+        self.cache_dir = str(tmp_path / 'cache')
+
+    def _parser(self, max_size: int = 1024 * 1024, columns: Optional[List[str]] = None) -> CachingParser:
+        return CachingParser(CSVParser(timestamp_unit='s', separator=r'\s+', on_bad_lines='warn', columns=columns),
+                             ParseCache(self.cache_dir, max_size))
+
+    def test_parse_files_to_dataframe_returns_same_dataframe_from_cache(self) -> None:
+        with open(self.log_path) as file:
+            expected_dataframe = self._parser().parse_files_to_dataframe([file])
+
+        with open(self.log_path) as file:
+            actual_dataframe = self._parser().parse_files_to_dataframe([file])
+
+        assert len(os.listdir(self.cache_dir)) == 1
+        pd.testing.assert_frame_equal(actual_dataframe.reset_index(drop=True),
+                                      expected_dataframe.reset_index(drop=True))
+
+    def test_parse_files_to_dataframe_returns_same_dataframe_with_selected_columns_from_cache(self) -> None:
+        with open(self.log_path) as file:
+            expected_dataframe = self._parser(columns=['client_ip']).parse_files_to_dataframe([file])
+
+        with open(self.log_path) as file:
+            actual_dataframe = self._parser(columns=['client_ip']).parse_files_to_dataframe([file])
+
+        pd.testing.assert_frame_equal(actual_dataframe.reset_index(drop=True),
+                                      expected_dataframe.reset_index(drop=True))
+
+    def test_parse_files_to_dataframe_keeps_categorical_client_ips_of_several_cached_files(self, tmp_path) -> None:
+        other_log_path = str(tmp_path / 'other.log')
+        with open(other_log_path, 'w') as log_file:
+            log_file.write(self.file_content.replace('10.105.21.199', '10.105.21.200'))
+        for _ in range(2):
+            with open(self.log_path) as file, open(other_log_path) as other_file:
+                log_dataframe = self._parser(columns=['client_ip']).parse_files_to_dataframe([file, other_file])
+
+        assert len(os.listdir(self.cache_dir)) == 2
+        assert isinstance(log_dataframe['client_ip'].dtype, pd.CategoricalDtype)
+        assert log_dataframe['client_ip'].value_counts().to_dict() == {
+            '10.105.21.198': 2, '10.105.21.199': 2, '10.105.21.200': 2}
+
+    def test_parse_files_to_chunks_returns_cached_chunks_of_at_most_chunk_size(self) -> None:
+        with open(self.log_path) as file:
+            list(self._parser().parse_files_to_chunks([file], chunk_size=2))
+
+        with open(self.log_path) as file:
+            chunks = list(self._parser().parse_files_to_chunks([file], chunk_size=2))
+
+        assert [len(chunk) for chunk in chunks] == [2, 1]
+        assert chunks[1]['client_ip'].iloc[0] == '10.105.21.198'
+
+    def test_parse_files_to_dataframe_ignores_cache_entry_of_appended_file(self) -> None:
+        with open(self.log_path) as file:
+            self._parser().parse_files_to_dataframe([file])
+        with open(self.log_path, 'a') as log_file:
+            log_file.write('1157689321.000 1 10.105.21.197 TCP_MISS/200 1 GET http://a.b/ - DIRECT/1.2.3.4 -\n')
+
+        with open(self.log_path) as file:
+            dataframe = self._parser().parse_files_to_dataframe([file])
+
+        assert len(dataframe) == 4
+
+    def test_parse_files_to_dataframe_evicts_entries_beyond_max_size(self) -> None:
+        with open(self.log_path) as file:
+            self._parser(max_size=1).parse_files_to_dataframe([file])
+
+        assert os.listdir(self.cache_dir) == []
+
+    def test_parse_files_to_dataframe_keeps_cache_entries_of_input_formats_apart(self) -> None:
+        def parse(input_format: str) -> pd.DataFrame:
+            parser = create_parser(input_format, 'fast', 'warn', columns=['client_ip'])
+            with open(self.log_path) as file:
+                return CachingParser(parser, ParseCache(self.cache_dir)).parse_files_to_dataframe([file])
+
+        assert len(parse('squid')) == 3
+        assert len(parse('combined')) == 0
+        assert len(parse('auto')) == 3
+        assert len(os.listdir(self.cache_dir)) == 2
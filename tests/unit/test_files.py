@@ -0,0 +1,85 @@
+import bz2
+import gzip
+import lzma
+from io import StringIO
+
+import pytest
+
+from analyzer.files import (file_path, is_compressed, open_byte_range, open_log_file, peek_text,
+                            split_into_line_ranges)
+
+
+class TestFiles:
+    content = b'first line\nsecond line\nthird line\n'
+
+    def test_split_into_line_ranges_splits_at_line_starts(self, tmp_path) -> None:
+        path = tmp_path / 'access.log'
+        path.write_bytes(self.content)
+
+        ranges = split_into_line_ranges(str(path), range_size=5)
+
+        assert ranges == [(0, 11), (11, 23), (23, 34)]
+
+    def test_split_into_line_ranges_returns_single_range_for_small_file(self, tmp_path) -> None:
+        path = tmp_path / 'access.log'
+        path.write_bytes(self.content)
+
+        ranges = split_into_line_ranges(str(path), range_size=1024)
+
+        assert ranges == [(0, len(self.content))]
+
+    def test_open_byte_range_reads_only_the_range(self, tmp_path) -> None:
+        path = tmp_path / 'access.log'
+        path.write_bytes(self.content)
+
+        with open_byte_range(str(path), 11, 23) as file:
+            actual_content = file.read()
+
+        assert actual_content == b'second line\n'
+
+    def test_file_path_returns_none_for_in_memory_stream(self) -> None:
+        assert file_path(StringIO()) is None
+
+    @pytest.mark.parametrize('compress', [bz2.compress, lzma.compress])
+    def test_open_log_file_decompresses_compressed_file(self, tmp_path, compress) -> None:
+        path = tmp_path / 'access.log.compressed'
+        path.write_bytes(compress(self.content))
+
+        with open_log_file(str(path)) as file:
+            actual_content = file.read()
+
+        assert is_compressed(str(path))
+        assert actual_content == self.content.decode()
+
+    def test_open_log_file_reads_all_members_of_multi_member_gzip_file(self, tmp_path) -> None:
+        path = tmp_path / 'access.log.gz'
+        path.write_bytes(gzip.compress(self.content[:11]) + gzip.compress(self.content[11:]))
+
+        with open_log_file(str(path)) as file:
+            actual_content = file.read()
+
+        assert actual_content == self.content.decode()
+        assert file_path(file) == str(path)
+
+    def test_open_log_file_reads_uncompressed_file(self, tmp_path) -> None:
+        path = tmp_path / 'access.log'
+        path.write_bytes(self.content)
+
+        with open_log_file(str(path)) as file:
+            actual_content = file.read()
+
+        assert not is_compressed(str(path))
+        assert actual_content == self.content.decode()
+
+    @pytest.mark.parametrize('open_file', [lambda path: open(path), lambda path: open(path, 'rb'),
+                                           lambda path: open_byte_range(path, 0, 100), open_log_file])
+    def test_peek_text_returns_start_of_file_without_consuming_it(self, tmp_path, open_file) -> None:
+        path = tmp_path / 'access.log'
+        path.write_bytes(gzip.compress(self.content) if open_file is open_log_file else self.content)
+
+        with open_file(str(path)) as file:
+            sample = peek_text(file, 15)
+            actual_content = file.read()
+
+        assert sample == 'first line\nseco'
+        assert actual_content in (self.content, self.content.decode())
@@ -0,0 +1,52 @@
+import os
+
+from analyzer.follow import LogFollower
+
+
+class TestLogFollower:
+    def test_read_lines_returns_only_complete_appended_lines(self, tmp_path) -> None:
+        path = tmp_path / 'access.log'
+        path.write_bytes(b'first line\nsecond')
+        follower = LogFollower(str(path))
+
+        first_lines = follower.read_lines()
+        with open(path, 'ab') as file:
+            file.write(b' line\nthird line\n')
+        second_lines = follower.read_lines()
+
+        assert first_lines == b'first line\n'
+        assert second_lines == b'second line\nthird line\n'
+        assert follower.read_lines() == b''
+
+    def test_read_lines_follows_truncated_file_from_start(self, tmp_path) -> None:
+        path = tmp_path / 'access.log'
+        path.write_bytes(b'first line\nsecond line\n')
+        follower = LogFollower(str(path))
+        follower.read_lines()
+
+        with open(path, 'wb') as file:
+            file.write(b'new line\n')
+
+        assert follower.read_lines() == b'new line\n'
+
+    def test_read_lines_reads_rest_of_rotated_file_before_new_file(self, tmp_path) -> None:
+        path = tmp_path / 'access.log'
+        path.write_bytes(b'first line\n')
+        follower = LogFollower(str(path))
+        follower.read_lines()
+
+        with open(path, 'ab') as file:
+            file.write(b'last line')
+        os.rename(path, tmp_path / 'access.log.1')
+        path.write_bytes(b'new line\n')
+
+        assert follower.read_lines() == b'last line'
+        assert follower.read_lines() == b'new line\n'
+
+    def test_read_lines_returns_at_most_read_size_bytes_of_complete_lines(self, tmp_path) -> None:
+        path = tmp_path / 'access.log'
+        path.write_bytes(b'first line\nsecond line\n')
+        follower = LogFollower(str(path), read_size=16)
+
+        assert follower.read_lines() == b'first line\n'
+        assert follower.read_lines() == b'second line\n'
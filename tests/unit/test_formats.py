@@ -0,0 +1,30 @@
+import pytest
+
+from analyzer.formats import detect_input_format
+
+
+class TestFormats:
+    squid_line = ('1157689312.049   5006 10.105.21.199 TCP_MISS/200 19763 CONNECT login.yahoo.com:443 badeyek '
+                  'DIRECT/209.73.177.115 -\n')
+    combined_line = ('10.105.21.199 - badeyek [08/Sep/2006:04:21:52 +0000] "GET http://www.goonernews.com/ HTTP/1.1" '
+                     '200 10182 "-" "Mozilla/5.0"\n')
+    jsonl_line = '{"timestamp": 1157689312.049, "client_ip": "10.105.21.199", "response_size": 19763}\n'
+
+    @pytest.mark.parametrize('line, input_format', [(squid_line, 'squid'), (combined_line, 'combined'),
+                                                    (jsonl_line, 'jsonl')])
+    def test_detect_input_format_detects_format_of_lines(self, line, input_format) -> None:
+        assert detect_input_format('\n' + line * 3) == input_format
+
+    def test_detect_input_format_returns_format_that_most_lines_match(self) -> None:
+        sample = self.combined_line + 'garbage\n' + self.jsonl_line * 2
+
+        assert detect_input_format(sample) == 'jsonl'
+
+    def test_detect_input_format_ignores_cut_off_last_line(self) -> None:
+        sample = self.combined_line + self.jsonl_line * 2
+
+        assert detect_input_format(sample[:-10]) == 'combined'
+
+    @pytest.mark.parametrize('sample', ['', '\n\n', 'garbage\n'])
+    def test_detect_input_format_returns_squid_if_no_line_matches(self, sample) -> None:
+        assert detect_input_format(sample) == 'squid'
@@ -1,7 +1,10 @@
 import json
 from io import StringIO
 
-from analyzer.output import JSONWriter
+import pandas as pd
+import pytest
+
+from analyzer.output import TABLE_COLUMNS, CSVWriter, JSONWriter, NDJSONWriter, ParquetWriter
 
 
 class TestJSONWriter:
@@ -17,3 +20,60 @@ class TestJSONWriter:
         output.seek(0)  # returning to start of stream
         actual_output_content = output.read()
         assert actual_output_content == expected_output_content
+
+
+class TestStreamingWriters:
+    results = {'mfip': '10.105.21.199', 'eps': 1.5,
+               'eps_series': {'bucket': '1min', 'start': '2006-09-08T04:22:00', 'peak_eps': 0.05, 'events': [3, 1],
+                              'bytes': [300, 100]},
+               'group_by': {'host': [{'key': 'hi5.com', 'requests': 5, 'bytes': 83741},
+                                     {'key': 'www.goonernews.com', 'requests': 4, 'bytes': 5989}]}}
+
+    def test_ndjson_writer_writes_scalar_results_then_table_rows(self) -> None:
+        output = StringIO()
+        output.name = 'Test'
+
+        NDJSONWriter(output=output, results=self.results).write()
+
+        lines = [json.loads(line) for line in output.getvalue().splitlines()]
+        assert lines == [
+            {'mfip': '10.105.21.199', 'eps': 1.5,
+             'eps_series': {'bucket': '1min', 'start': '2006-09-08T04:22:00', 'peak_eps': 0.05}},
+            {'table': 'eps_series', 'key': '2006-09-08T04:22:00', 'requests': 3, 'bytes': 300},
+            {'table': 'eps_series', 'key': '2006-09-08T04:23:00', 'requests': 1, 'bytes': 100},
+            {'table': 'group_by.host', 'key': 'hi5.com', 'requests': 5, 'bytes': 83741},
+            {'table': 'group_by.host', 'key': 'www.goonernews.com', 'requests': 4, 'bytes': 5989},
+        ]
+
+    def test_ndjson_writer_writes_rows_in_batches(self, monkeypatch) -> None:
+        monkeypatch.setattr('analyzer.output.BATCH_SIZE', 2)
+        output = StringIO()
+        output.name = 'Test'
+        writes = []
+        monkeypatch.setattr(output, 'write', lambda text: writes.append(text) or len(text))
+
+        NDJSONWriter(output=output, results=self.results).write()
+
+        assert [text.count('\n') for text in writes] == [1, 2, 2]
+
+    def test_csv_writer_writes_scalar_results_then_table_rows(self) -> None:
+        output = StringIO()
+        output.name = 'Test'
+
+        CSVWriter(output=output, results={'bytes': 89940, 'group_by': self.results['group_by']}).write()
+
+        assert output.getvalue().splitlines() == ['table,key,requests,bytes', 'bytes,89940,,',
+                                                  'group_by.host,hi5.com,5,83741',
+                                                  'group_by.host,www.goonernews.com,4,5989']
+
+    def test_parquet_writer_writes_table_of_results(self, tmp_path) -> None:
+        pytest.importorskip('pyarrow')
+        with open(tmp_path / 'results.parquet', 'w') as output:
+            ParquetWriter(output=output, results=self.results).write()
+
+        table = pd.read_parquet(tmp_path / 'results.parquet')
+        assert list(table.columns) == TABLE_COLUMNS
+        assert table['table'].tolist() == ['mfip', 'eps', 'eps_series.bucket', 'eps_series.start',
+                                           'eps_series.peak_eps', 'eps_series', 'eps_series', 'group_by.host',
+                                           'group_by.host']
+        assert table['requests'].iloc[-2:].tolist() == [5, 4]
@@ -0,0 +1,44 @@
+import gzip
+import os
+
+from analyzer.parallel import ParallelAnalyzer, Shard, plan_shards
+from analyzer.parsing import CSVParser
+from analyzer.statistics import LogStatisticsAccumulator
+
+RESOURCE_DIRECTORY = os.path.join(os.path.dirname(__file__), '..', 'integration', 'resources')
+FILES = [os.path.join(RESOURCE_DIRECTORY, 'access1.log'), os.path.join(RESOURCE_DIRECTORY, 'access2.log')]
+
+
+class TestParallelAnalyzer:
+    def test_plan_shards_splits_large_files_into_byte_ranges(self) -> None:
+        shards = plan_shards(FILES, shard_size=512)
+
+        assert len(shards) > len(FILES)
+        assert shards[0].start == 0
+        assert shards[-1].end == os.path.getsize(FILES[1])
+
+    def test_plan_shards_keeps_compressed_file_in_single_shard(self, tmp_path) -> None:
+        path = str(tmp_path / 'access1.log.gz')
+        with open(FILES[0], 'rb') as file, gzip.open(path, 'wb') as compressed_file:
+            compressed_file.write(file.read())
+
+        shards = plan_shards([path], shard_size=512)
+
+        assert shards == [Shard(path, 0, os.path.getsize(path), compressed=True)]
+
+    def test_analyze_files_returns_same_statistics_as_single_process(self) -> None:
+        csv_parser = CSVParser(timestamp_unit='s', separator=r'\s+', on_bad_lines='warn')
+        expected_statistics = LogStatisticsAccumulator()
+        with open(FILES[0]) as file1, open(FILES[1]) as file2:
+            for chunk in csv_parser.parse_files_to_chunks([file1, file2], chunk_size=1000):
+                expected_statistics.update(chunk)
+        parallel_analyzer = ParallelAnalyzer(parser=csv_parser, workers=2, chunk_size=3, shard_size=512)
+
+        actual_statistics = parallel_analyzer.analyze_files(FILES)
+
+        assert actual_statistics.row_count == expected_statistics.row_count
+        assert actual_statistics.most_frequent_ip() == expected_statistics.most_frequent_ip()
+        assert actual_statistics.least_frequent_ip() == expected_statistics.least_frequent_ip()
+        assert actual_statistics.events_per_second() == expected_statistics.events_per_second()
+        assert (actual_statistics.total_amount_of_bytes_exchanged()
+                == expected_statistics.total_amount_of_bytes_exchanged())
@@ -1,9 +1,16 @@
+import json
+import sys
+import threading
 from io import StringIO
+from typing import Iterator
 
 import pandas as pd
+import pytest
 from pandas.core.dtypes.common import is_numeric_dtype
+from pandas.errors import ParserWarning
 
-from analyzer.parsing import CSVParser
+from analyzer.parsing import AutoParser, CombinedLogParser, CSVParser, FastSquidParser, JSONLinesParser, create_parser
+from analyzer.rejects import reject_log
 
 
 class TestCSVParser:
@@ -63,3 +70,326 @@ class TestCSVParser:
 
         assert len(dataframe) == 1
         assert dataframe.iloc[0]['username'] == 'TheOnlyEntryLeft'
+
+    def test_parse_files_to_chunks_yields_chunks_of_at_most_chunk_size(self) -> None:
+        csv_parser = CSVParser(timestamp_unit='s', separator=r'\s+', on_bad_lines='warn')
+        file1 = StringIO(self.file1_content)
+        file2 = StringIO(self.file2_content)
+
+        chunks = list(csv_parser.parse_files_to_chunks([file1, file2], chunk_size=1))
+
+        # The blank first and last lines of the files count towards the chunk size.
+        assert [len(chunk) for chunk in chunks] == [0, 1, 1, 0, 0, 1, 0]
+        assert type(chunks[1]['timestamp'].iloc[0]) is pd.Timestamp
+
+    def test_parse_files_to_dataframe_parses_only_selected_columns_in_compact_dtypes(self) -> None:
+        csv_parser = CSVParser(timestamp_unit='s', separator=r'\s+', on_bad_lines='warn', columns=['client_ip'])
+        file1 = StringIO(self.file1_content)
+        file2 = StringIO(self.file2_content)
+
+        dataframe = csv_parser.parse_files_to_dataframe([file1, file2])
+
+        assert list(dataframe.columns) == ['timestamp', 'response_header_size', 'client_ip', 'response_size']
+        assert isinstance(dataframe['client_ip'].dtype, pd.CategoricalDtype)
+        assert dataframe['response_header_size'].dtype == 'int16'
+        assert dataframe['response_size'].tolist() == [19763, 10182, 214]
+
+    def test_parse_files_to_dataframe_skips_lines_with_too_many_fields_with_selected_columns(self) -> None:
+        file_content = """
+        1157689312.049   5006 10.105.21.199 TCP_MISS/200 19763 CONNECT login.yahoo.com:443 badeyek DIRECT/209.73.177.115 -
+        1157689320.327   2864 10.105.21.198 TCP_MISS/200 10182 GET http://www.goonernews.com/ badeyek DIRECT/207.58.145.61 text/html surplus
+        """
+        csv_parser = CSVParser(timestamp_unit='s', separator=r'\s+', on_bad_lines='warn', columns=['client_ip'])
+
+        dataframe = csv_parser.parse_files_to_dataframe([StringIO(file_content)])
+
+        assert dataframe['client_ip'].tolist() == ['10.105.21.199']
+
+
+class TestFastSquidParser:
+    file_content = """
+    1157689312.049   5006 10.105.21.199 TCP_MISS/200 19763 CONNECT login.yahoo.com:443 badeyek DIRECT/209.73.177.115 -
+    1157689320.327   2864 10.105.21.199 TCP_MISS/200 10182 GET http://www.goonernews.com/ badeyek DIRECT/207.58.145.61 text/html
+    1157689320.343   1357 10.105.21.199 TCP_REFRESH_HIT/304 214 GET http://www.goonernews.com/styles.css badeyek DIRECT/207.58.145.61 -
+    """
+    malformed_file_content = """
+    1157689312.049   ABC 10.105.21.199 TCP_MISS/200 19763 CONNECT login.yahoo.com:443 badeyek DIRECT/209.73.177.115 -
+    1157689320.327   2864 10.105.21.199 TCP_MISS/200 ABC GET http://www.goonernews.com/ badeyek DIRECT/207.58.145.61 text/html
+    1157689320.ABC   2864 10.105.21.199 TCP_MISS/200 10182 GET http://www.goonernews.com/ badeyek DIRECT/207.58.145.61 text/html
+    1157689320.327   2864 10.105.21.199 TCP_MISS/200
+    1157689320.327   1111 10.105.21.199 TCP_MISS/200 10182 GET http://www.goonernews.com/ TheOnlyEntryLeft DIRECT/207.58.145.61 text/html
+    """
+
+    def test_parse_files_to_dataframe_returns_same_dataframe_as_csv_parser(self) -> None:
+        csv_parser = CSVParser(timestamp_unit='s', separator=r'\s+', on_bad_lines='warn')
+        fast_parser = FastSquidParser(timestamp_unit='s', on_bad_lines='warn')
+        expected_dataframe = csv_parser.parse_files_to_dataframe([StringIO(self.file_content)])
+
+        actual_dataframe = fast_parser.parse_files_to_dataframe([StringIO(self.file_content)])
+
+        pd.testing.assert_frame_equal(actual_dataframe, expected_dataframe)
+
+    def test_parse_files_to_dataframe_drops_malformed_entries_like_csv_parser(self) -> None:
+        csv_parser = CSVParser(timestamp_unit='s', separator=r'\s+', on_bad_lines='warn')
+        fast_parser = FastSquidParser(timestamp_unit='s', on_bad_lines='warn')
+        expected_dataframe = csv_parser.parse_files_to_dataframe([StringIO(self.malformed_file_content)])
+
+        actual_dataframe = fast_parser.parse_files_to_dataframe([StringIO(self.malformed_file_content)])
+
+        assert len(actual_dataframe) == 1
+        pd.testing.assert_frame_equal(actual_dataframe, expected_dataframe)
+
+    def test_parse_files_to_chunks_yields_chunks_of_at_most_chunk_size(self) -> None:
+        fast_parser = FastSquidParser(timestamp_unit='s', on_bad_lines='warn')
+
+        chunks = list(fast_parser.parse_files_to_chunks([StringIO(self.file_content)], chunk_size=2))
+
+        # The blank first and last lines count towards the chunk size.
+        assert [len(chunk) for chunk in chunks] == [1, 2, 0]
+        assert type(chunks[0]['timestamp'].iloc[0]) is pd.Timestamp
+
+    def test_parse_files_to_dataframe_with_selected_columns_returns_same_dataframe_as_csv_parser(self) -> None:
+        csv_parser = CSVParser(timestamp_unit='s', separator=r'\s+', on_bad_lines='warn', columns=['client_ip'])
+        fast_parser = FastSquidParser(timestamp_unit='s', on_bad_lines='warn', columns=['client_ip'])
+        expected_dataframe = csv_parser.parse_files_to_dataframe([StringIO(self.malformed_file_content)])
+
+        actual_dataframe = fast_parser.parse_files_to_dataframe([StringIO(self.malformed_file_content)])
+
+        pd.testing.assert_frame_equal(actual_dataframe, expected_dataframe)
+
+
+class TestJSONLinesParser:
+    file_content = (
+        '{"timestamp": 1157689312.049, "response_header_size": 5006, "client_ip": "10.105.21.199", '
+        '"response_code": "TCP_MISS/200", "response_size": 19763, "request_method": "CONNECT", '
+        '"url": "login.yahoo.com:443", "username": "badeyek", "access_destination_ip": "DIRECT/209.73.177.115", '
+        '"response_type": "-"}\n'
+        '\n'
+        '{"timestamp": 1157689320.327, "response_header_size": "2864", "client_ip": "10.105.21.199", '
+        '"response_code": "TCP_MISS/200", "response_size": 10182, "request_method": "GET", '
+        '"url": "http://www.goonernews.com/", "username": "badeyek", "access_destination_ip": "DIRECT/207.58.145.61", '
+        '"response_type": "text/html", "referer": "-"}\n'
+        '{"response_header_size": 1357, "client_ip": "10.105.21.199", "timestamp": 1157689320.343, '
+        '"response_code": "TCP_REFRESH_HIT/304", "response_size": 214, "request_method": "GET", '
+        '"url": "http://www.goonernews.com/styles.css", "username": "badeyek", '
+        '"access_destination_ip": "DIRECT/207.58.145.61", "response_type": "-"}\n'
+    )
+
+    @pytest.mark.parametrize('columns', [None, ['client_ip']])
+    def test_parse_files_to_dataframe_returns_same_dataframe_as_csv_parser(self, columns) -> None:
+        csv_parser = CSVParser(timestamp_unit='s', separator=r'\s+', on_bad_lines='warn', columns=columns)
+        jsonl_parser = JSONLinesParser(timestamp_unit='s', on_bad_lines='warn', columns=columns)
+        expected_dataframe = csv_parser.parse_files_to_dataframe([StringIO(TestFastSquidParser.file_content)])
+
+        actual_dataframe = jsonl_parser.parse_files_to_dataframe([StringIO(self.file_content)])
+
+        pd.testing.assert_frame_equal(actual_dataframe.reset_index(drop=True),
+                                      expected_dataframe.reset_index(drop=True))
+
+    def test_parse_files_to_chunks_yields_chunks_of_at_most_chunk_size(self) -> None:
+        jsonl_parser = JSONLinesParser(timestamp_unit='s', on_bad_lines='warn')
+
+        chunks = list(jsonl_parser.parse_files_to_chunks([StringIO(self.file_content)], chunk_size=2))
+
+        # The blank line counts towards the chunk size.
+        assert [len(chunk) for chunk in chunks] == [1, 2]
+        assert chunks[1].index.tolist() == [2, 3]
+
+    def test_parse_files_to_dataframe_converts_other_values_of_string_fields_to_strings(self) -> None:
+        jsonl_parser = JSONLinesParser(timestamp_unit='ms', on_bad_lines='warn')
+        file_content = ('{"timestamp": 1157689312049, "response_header_size": 0, "client_ip": 10, '
+                        '"response_size": 5, "username": null}\n')
+
+        dataframe = jsonl_parser.parse_files_to_dataframe([StringIO(file_content)])
+
+        assert dataframe['timestamp'].tolist() == [pd.Timestamp('2006-09-08 04:21:52.049')]
+        assert dataframe[['client_ip', 'username', 'url']].values.tolist() == [['10', '', '']]
+
+
+    def test_parse_files_to_dataframe_only_drops_malformed_lines_of_a_chunk(self, monkeypatch) -> None:
+        jsonl_parser = JSONLinesParser(timestamp_unit='s', on_bad_lines='warn', columns=['client_ip'])
+        lines = [f'{{"timestamp": {1157689312 + index}, "response_header_size": 0, "client_ip": "10.0.0.{index}", '
+                 f'"response_size": 5}}\n' for index in range(64)]
+        lines[10] = '{"timestamp": 1157689312, "client_ip": }\n'
+        lines[40] = '[1, 2]\n'
+        decoded_texts = []
+        json_loads = json.loads
+        monkeypatch.setattr(json, 'loads', lambda text: decoded_texts.append(text) or json_loads(text))
+
+        dataframe = jsonl_parser.parse_files_to_dataframe([StringIO(''.join(lines))])
+
+        assert dataframe['client_ip'].tolist() == [f'10.0.0.{index}' for index in range(64) if index not in (10, 40)]
+        # All lines, the lines that look like JSON objects, the lines before and after the malformed one, and the
+        # malformed line on its own
+        assert len(decoded_texts) == 5
+
+class TestCombinedLogParser:
+    file_content = (
+        '10.105.21.199 - badeyek [08/Sep/2006:04:21:52 +0000] "CONNECT login.yahoo.com:443 HTTP/1.1" 200 19763\n'
+        '10.105.21.199 - - [08/Sep/2006:06:22:00 +0200] "GET http://www.goonernews.com/ HTTP/1.1" 200 - '
+        '"http://www.goonernews.com/" "Mozilla/5.0 (X11; Linux x86_64)"\n'
+        '\n'
+        '10.105.21.198 - badeyek [08/Sep/2006:04:22:00 +0000] "-" 408 0 "-" "-"\n'
+    )
+
+    def test_parse_files_to_dataframe_maps_fields_to_columns(self) -> None:
+        combined_parser = CombinedLogParser(timestamp_unit='s', on_bad_lines='warn')
+
+        dataframe = combined_parser.parse_files_to_dataframe([StringIO(self.file_content)])
+
+        assert dataframe['timestamp'].tolist() == [pd.Timestamp('2006-09-08 04:21:52'),
+                                                   pd.Timestamp('2006-09-08 04:22:00'),
+                                                   pd.Timestamp('2006-09-08 04:22:00')]
+        assert dataframe[['client_ip', 'response_code', 'request_method', 'url', 'username']].values.tolist() == [
+            ['10.105.21.199', '200', 'CONNECT', 'login.yahoo.com:443', 'badeyek'],
+            ['10.105.21.199', '200', 'GET', 'http://www.goonernews.com/', '-'],
+            ['10.105.21.198', '408', '-', '-', 'badeyek'],
+        ]
+        assert dataframe['response_header_size'].tolist() == [0, 0, 0]
+        assert dataframe['response_size'].tolist() == [19763, 0, 0]
+        assert set(dataframe['access_destination_ip']) == set(dataframe['response_type']) == {'-'}
+
+    @pytest.mark.parametrize('columns', [None, ['client_ip', 'url']])
+    def test_parse_files_to_dataframe_returns_same_dataframe_without_pyarrow(self, columns, monkeypatch) -> None:
+        combined_parser = CombinedLogParser(timestamp_unit='s', on_bad_lines='warn', columns=columns)
+        expected_dataframe = combined_parser.parse_files_to_dataframe([StringIO(self.file_content)])
+        monkeypatch.setitem(sys.modules, 'pyarrow', None)
+
+        actual_dataframe = combined_parser.parse_files_to_dataframe([StringIO(self.file_content)])
+
+        pd.testing.assert_frame_equal(actual_dataframe, expected_dataframe)
+
+    def test_line_timestamp_returns_time_of_line(self) -> None:
+        combined_parser = CombinedLogParser(timestamp_unit='s', on_bad_lines='warn')
+        lines = self.file_content.encode().splitlines()
+
+        assert [combined_parser.line_timestamp(line) for line in lines] == [1157689312, 1157689320, None, 1157689320]
+
+
+class TestAutoParser:
+
+    def test_parse_files_to_dataframe_parses_every_file_in_its_format(self) -> None:
+        file_contents = [TestFastSquidParser.file_content, TestCombinedLogParser.file_content,
+                         TestJSONLinesParser.file_content]
+        parsers = [FastSquidParser(timestamp_unit='s', on_bad_lines='warn', columns=['client_ip']),
+                   CombinedLogParser(timestamp_unit='s', on_bad_lines='warn', columns=['client_ip']),
+                   JSONLinesParser(timestamp_unit='s', on_bad_lines='warn', columns=['client_ip'])]
+        auto_parser = AutoParser(engine='fast', timestamp_unit='s', on_bad_lines='warn', columns=['client_ip'])
+        expected_dataframe = pd.concat([parser.parse_files_to_dataframe([StringIO(file_content)])
+                                        for parser, file_content in zip(parsers, file_contents)])
+
+        actual_dataframe = auto_parser.parse_files_to_dataframe([StringIO(file_content)
+                                                                 for file_content in file_contents])
+
+        assert isinstance(actual_dataframe['client_ip'].dtype, pd.CategoricalDtype)
+        pd.testing.assert_frame_equal(actual_dataframe.astype({'client_ip': object}), expected_dataframe)
+
+    def test_create_parser_raises_error_for_unknown_input_format(self) -> None:
+        with pytest.raises(ValueError, match='Unknown input format'):
+            create_parser('xml', 'pandas', on_bad_lines='warn')
+
+
+class TestRejectedLines:
+    # The line with 11 fields starts the second chunk of two lines, the line with 12 fields is skipped by pandas.
+    file_content = """
+    1157689312.049   5006 10.105.21.199 TCP_MISS/200 19763 CONNECT login.yahoo.com:443 badeyek DIRECT/209.73.177.115 -
+    1157689320.327   2864 10.105.21.199 TCP_MISS/200 10182 GET http://www.goonernews.com/ badeyek DIRECT/207.58.145.61 text/html surplus
+    1157689320.327   2864 10.105.21.199 TCP_MISS/200 10182 GET http://www.goonernews.com/ badeyek DIRECT/207.58.145.61 text/html sur plus
+    1157689320.327   2864 10.105.21.199 TCP_MISS/200
+    1157689320.ABC   2864 10.105.21.199 TCP_MISS/200 10182 GET http://www.goonernews.com/ badeyek DIRECT/207.58.145.61 text/html
+    1157689320.343   1357 10.105.21.199 TCP_REFRESH_HIT/304 214 GET http://www.goonernews.com/styles.css badeyek DIRECT/207.58.145.61 -
+    """
+
+    @pytest.fixture(autouse=True)
+    def enable_reject_log(self, tmp_path) -> Iterator[None]:
+        self.rejects_path = tmp_path / 'rejects.csv'
+        reject_log.enable(str(self.rejects_path))
+        yield
+        reject_log.disable()
+
+    @pytest.mark.parametrize('parser', [
+        CSVParser(timestamp_unit='s', separator=r'\s+', on_bad_lines='warn'),
+        CSVParser(timestamp_unit='s', separator=r'\s+', on_bad_lines='warn', columns=['client_ip']),
+        FastSquidParser(timestamp_unit='s', on_bad_lines='warn'),
+    ])
+    @pytest.mark.parametrize('chunk_size', [None, 2])
+    def test_parse_files_writes_rejected_lines_with_line_numbers_and_reasons(self, parser, chunk_size) -> None:
+        with pytest.warns(ParserWarning, match='Skipping line'):
+            if chunk_size is None:
+                row_count = len(parser.parse_files_to_dataframe([StringIO(self.file_content)]))
+            else:
+                row_count = sum(len(chunk) for chunk in parser.parse_files_to_chunks([StringIO(self.file_content)],
+                                                                                    chunk_size))
+        reject_log.disable()
+
+        rejects = pd.read_csv(self.rejects_path)
+        assert row_count == 2
+        assert rejects.values.tolist() == [['<stream>', 3, 'too_many_fields'], ['<stream>', 4, 'too_many_fields'],
+                                           ['<stream>', 5, 'missing_fields'], ['<stream>', 6, 'malformed_timestamp']]
+        assert (reject_log.line_count, reject_log.reject_count) == (6, 4)
+
+    def test_parse_files_to_chunks_reads_files_of_several_threads_concurrently(self) -> None:
+        read_started, other_read_done = threading.Event(), threading.Event()
+        waits = []
+
+        class BlockingStringIO(StringIO):
+            def read(self, *args) -> str:
+                read_started.set()
+                waits.append(other_read_done.wait(timeout=5))
+                return super().read(*args)
+
+        def parse(file: StringIO) -> int:
+            parser = CSVParser(timestamp_unit='s', separator=r'\s+', on_bad_lines='skip')
+            return sum(len(chunk) for chunk in parser.parse_files_to_chunks([file], chunk_size=2))
+
+        row_counts = []
+        thread = threading.Thread(target=lambda: row_counts.append(parse(BlockingStringIO(self.file_content))))
+        thread.start()
+        read_started.wait(timeout=5)
+        row_counts.append(parse(StringIO(self.file_content)))
+        other_read_done.set()
+        thread.join()
+
+        assert row_counts == [2, 2]
+        assert waits[0]
+
+    @pytest.mark.parametrize('input_format, file_content', [
+        ('jsonl', '{"timestamp": 1157689312.049, "response_header_size": 5006, "response_size": 19763}\n'
+                  '\n'
+                  'not a JSON object\n'
+                  '{"timestamp": 1157689320.327, "response_header_size": 2864}\n'
+                  '{"timestamp": "1157689320.ABC", "response_header_size": 2864, "response_size": 10182}\n'
+                  '{"timestamp": 1157689320.343, "response_header_size": 1357, "response_size": "ABC"}\n'),
+        ('combined', '10.105.21.199 - - [08/Sep/2006:04:21:52 +0000] "GET / HTTP/1.1" 200 19763\n'
+                     '\n'
+                     '1157689320.327 2864 10.105.21.199 TCP_MISS/200 10182 GET http://www.goonernews.com/\n'
+                     '10.105.21.199 - - [08/Sep/2006:04:22:00 +0000] "GET / HTTP/1.1" 200\n'
+                     '10.105.21.199 - - [99/Sep/2006:04:22:00 +0000] "GET / HTTP/1.1" 200 10182\n'
+                     '10.105.21.199 - - [08/Sep/2006:04:22:00 +0000] "GET / HTTP/1.1" 200 ABC\n'),
+    ])
+    @pytest.mark.parametrize('chunk_size', [None, 2])
+    def test_parse_files_writes_rejected_lines_of_other_input_formats(self, input_format, file_content,
+                                                                      chunk_size) -> None:
+        parser = create_parser(input_format, 'pandas', on_bad_lines='warn')
+
+        if chunk_size is None:
+            row_count = len(parser.parse_files_to_dataframe([StringIO(file_content)]))
+        else:
+            row_count = sum(len(chunk) for chunk in parser.parse_files_to_chunks([StringIO(file_content)], chunk_size))
+        reject_log.disable()
+
+        rejects = pd.read_csv(self.rejects_path)
+        assert row_count == 1
+        assert rejects.values.tolist() == [['<stream>', 3, 'missing_fields'], ['<stream>', 4, 'missing_fields'],
+                                           ['<stream>', 5, 'malformed_timestamp'],
+                                           ['<stream>', 6, 'malformed_response_size']]
+        assert (reject_log.line_count, reject_log.reject_count) == (5, 4)
+
+    def test_parse_files_to_dataframe_raises_error_with_more_rejected_lines_than_max_reject_ratio(self) -> None:
+        reject_log.enable(max_ratio=0.5)
+        csv_parser = CSVParser(timestamp_unit='s', separator=r'\s+', on_bad_lines='skip')
+        dataframe = csv_parser.parse_files_to_dataframe([StringIO(self.file_content)])
+
+        with pytest.raises(ValueError, match=r'Rejected 4 of 6 log lines \(66.67%\)'):
+            reject_log.check()
+        assert len(dataframe) == 2
@@ -0,0 +1,86 @@
+from io import StringIO
+from typing import Iterator
+
+import pytest
+from pandas.errors import ParserWarning
+
+from analyzer.parsing import CSVParser, FastSquidParser
+from analyzer.profiling import DISABLED_STAGE, Profiler, profiler
+
+
+class TestProfiler:
+
+    def test_disabled_profiler_records_nothing(self) -> None:
+        disabled_profiler = Profiler()
+
+        with disabled_profiler.stage('read', rows_in=10) as stage:
+            stage.record(rows_out=10)
+        disabled_profiler.count_dropped_lines('missing_fields', 1)
+
+        assert stage is DISABLED_STAGE
+        assert disabled_profiler.report()['stages'] == {}
+        assert disabled_profiler.report()['dropped_lines'] == {}
+
+    def test_stage_sums_metrics_over_runs(self) -> None:
+        enabled_profiler = Profiler(enabled=True)
+
+        for _ in range(2):
+            with enabled_profiler.stage('clean', rows_in=10) as stage:
+                stage.record(rows_out=8, bytes_read=100)
+
+        metrics = enabled_profiler.report()['stages']['clean']
+        assert metrics['calls'] == 2
+        assert metrics['rows_in'] == 20
+        assert metrics['rows_out'] == 16
+        assert metrics['bytes_read'] == 200
+        assert metrics['wall_seconds'] >= 0
+
+    def test_merge_adds_metrics_of_other_profiler(self) -> None:
+        profiler1 = Profiler(enabled=True)
+        with profiler1.stage('read') as stage:
+            stage.record(rows_out=3)
+        profiler1.count_dropped_lines('missing_fields', 1)
+        profiler2 = Profiler(enabled=True)
+        with profiler2.stage('read') as stage:
+            stage.record(rows_out=2)
+        profiler2.count_dropped_lines('missing_fields', 2)
+
+        profiler1.merge(profiler2)
+
+        assert profiler1.report()['stages']['read']['rows_out'] == 5
+        assert profiler1.report()['dropped_lines'] == {'missing_fields': 3}
+
+
+class TestParserProfiling:
+    file_content = """
+    1157689312.049   ABC 10.105.21.199 TCP_MISS/200 19763 CONNECT login.yahoo.com:443 badeyek DIRECT/209.73.177.115 -
+    1157689320.327   2864 10.105.21.199 TCP_MISS/200 ABC GET http://www.goonernews.com/ badeyek DIRECT/207.58.145.61 text/html
+    1157689320.ABC   2864 10.105.21.199 TCP_MISS/200 10182 GET http://www.goonernews.com/ badeyek DIRECT/207.58.145.61 text/html
+    1157689320.327   2864 10.105.21.199 TCP_MISS/200
+    1157689320.327   2864 10.105.21.199 TCP_MISS/200 10182 GET http://www.goonernews.com/ badeyek DIRECT/207.58.145.61 text/html surplus
+    1157689320.327   1111 10.105.21.199 TCP_MISS/200 10182 GET http://www.goonernews.com/ TheOnlyEntryLeft DIRECT/207.58.145.61 text/html
+    """
+
+    @pytest.fixture(autouse=True)
+    def enable_profiler(self) -> Iterator[None]:
+        profiler.enable()
+        yield
+        profiler.disable()
+
+    @pytest.mark.parametrize('parser', [
+        CSVParser(timestamp_unit='s', separator=r'\s+', on_bad_lines='warn'),
+        CSVParser(timestamp_unit='s', separator=r'\s+', on_bad_lines='warn', columns=['client_ip']),
+        FastSquidParser(timestamp_unit='s', on_bad_lines='warn'),
+    ])
+    def test_parse_files_to_dataframe_counts_dropped_lines_by_reason(self, parser) -> None:
+        with pytest.warns(ParserWarning, match='Skipping line'):
+            dataframe = parser.parse_files_to_dataframe([StringIO(self.file_content)])
+
+        report = profiler.report()
+        assert len(dataframe) == 1
+        assert report['dropped_lines'] == {'too_many_fields': 1, 'missing_fields': 1, 'malformed_timestamp': 1,
+                                           'malformed_response_header_size': 1, 'malformed_response_size': 1}
+        # Blank lines are read as rows as well, so rows map to line numbers.
+        assert report['stages']['read']['rows_out'] == 8
+        assert report['stages']['clean']['rows_in'] == 8
+        assert report['stages']['clean']['rows_out'] == 1
@@ -0,0 +1,92 @@
+from io import StringIO
+
+import pandas as pd
+import pytest
+
+from analyzer.pure import PythonLogStatistics, parse_number, split_fields, timestamp_nanoseconds
+
+
+class TestPure:
+
+    def test_split_fields_splits_line_at_spaces_and_tabs(self) -> None:
+        assert split_fields('  1157689312.049   5006\t10.105.21.199 -\n', iter([])) == [
+            '1157689312.049', '5006', '10.105.21.199', '-']
+
+    def test_split_fields_reads_quoted_field_across_lines(self) -> None:
+        lines = iter(['continued"" field" 200\n', '1157689313.000 100\n'])
+
+        fields = split_fields('1157689312.000 "quoted\n', lines)
+
+        assert fields == ['1157689312.000', 'quoted\ncontinued" field', '200']
+        assert next(lines) == '1157689313.000 100\n'
+
+    def test_split_fields_raises_error_for_unclosed_quoted_field(self) -> None:
+        with pytest.raises(ValueError, match='EOF inside a quoted field'):
+            split_fields('1157689312.000 "quoted\n', iter([]))
+
+    @pytest.mark.parametrize('field', ['200', '-5', '+3', '1.5', '.5', '1e2', '-INF', 'abc', '1_000', '0x5', 'nan'])
+    def test_parse_number_parses_numbers_like_pandas(self, field) -> None:
+        expected_number = pd.to_numeric(pd.Series([field]), errors='coerce')[0]
+
+        actual_number = parse_number(field)
+
+        if pd.isna(expected_number):
+            assert actual_number is None
+        else:
+            assert actual_number == expected_number
+
+    @pytest.mark.parametrize('timestamp', [1157689312, 1157689312.049, 1157689312.999999999, -1.5])
+    def test_timestamp_nanoseconds_rounds_like_pandas(self, timestamp) -> None:
+        assert timestamp_nanoseconds(timestamp) == pd.to_datetime(timestamp, unit='s').value
+
+    def test_timestamp_nanoseconds_raises_error_for_out_of_bounds_timestamp(self) -> None:
+        with pytest.raises(ValueError, match='out of bounds'):
+            timestamp_nanoseconds(1e12)
+
+
+class TestPythonLogStatistics:
+
+    @pytest.fixture(autouse=True)
+    def setup_test(self) -> None:
+        self.log_statistics = PythonLogStatistics(['ip_counts', 'timestamp_range', 'size_sums', 'group_totals:host',
+                                                   'size_quantiles', 'size_quantiles:request_method'])
+        self.log_statistics.update(StringIO(
+            '1157689312.000 100 10.105.21.199 TCP_MISS/200 200 CONNECT login.yahoo.com:443 badeyek DIRECT/1.2.3.4 -\n'
+            '\n'
+            '1157689312.150 100 10.105.21.198 TCP_MISS/200 300 GET http://www.example.com/ - DIRECT/1.2.3.4 text/html\n'
+            '1157689312.500 100 10.105.21.197 TCP_MISS/200 ABC GET http://www.example.com/ - DIRECT/1.2.3.4 text/html\n'
+            '1157689314.000 -1 10.105.21.199 TCP_MISS/200 100 CONNECT login.yahoo.com:443 badeyek\n'))
+
+    def test_update_skips_blank_and_malformed_lines(self) -> None:
+        assert self.log_statistics.row_count == 3
+
+    def test_statistics_resolve_ties_by_first_appearance(self) -> None:
+        assert self.log_statistics.most_frequent_ip() == '10.105.21.199'
+        assert self.log_statistics.least_frequent_ip() == '10.105.21.198'
+        assert self.log_statistics.distinct_ip_count() == 2
+
+    def test_statistics_ignore_negative_sizes(self) -> None:
+        assert self.log_statistics.events_per_second() == 1.5
+        assert self.log_statistics.total_amount_of_bytes_exchanged() == 800
+
+    def test_group_breakdown_orders_keys_with_equal_metric_by_other_metric(self) -> None:
+        assert self.log_statistics.group_breakdown('host', top_by='bytes') == [
+            {'key': 'login.yahoo.com', 'requests': 2, 'bytes': 400},
+            {'key': 'www.example.com', 'requests': 1, 'bytes': 400},
+        ]
+
+    def test_percentiles_ignore_negative_values(self) -> None:
+        assert self.log_statistics.percentiles('request_method') == {
+            'response_header_size': {'p50': 100, 'p90': 100, 'p99': 100, 'p99.9': 100, 'max': 100},
+            'response_size': {'p50': 200, 'p90': 200, 'p99': 200, 'p99.9': 200, 'max': 300},
+            'by_request_method': {
+                'CONNECT': {'response_header_size': {'p50': 100, 'p90': 100, 'p99': 100, 'p99.9': 100, 'max': 100},
+                            'response_size': {'p50': 100, 'p90': 100, 'p99': 100, 'p99.9': 100, 'max': 200}},
+                'GET': {'response_header_size': {'p50': 100, 'p90': 100, 'p99': 100, 'p99.9': 100, 'max': 100},
+                        'response_size': {'p50': 300, 'p90': 300, 'p99': 300, 'p99.9': 300, 'max': 300}},
+            },
+        }
+
+    def test_statistics_raise_error_for_primitive_that_has_not_been_accumulated(self) -> None:
+        with pytest.raises(ValueError, match='has not been accumulated'):
+            self.log_statistics.group_breakdown('client_ip')
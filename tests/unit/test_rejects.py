@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analyzer.rejects import MIN_LINES_FOR_REJECT_RATIO, LineSource, RejectLog
+
+
+class TestRejectLog:
+
+    def test_disabled_reject_log_ignores_rejected_lines(self) -> None:
+        disabled_reject_log = RejectLog()
+
+        disabled_reject_log.add(LineSource('access.log'), 10, [1, 2], ['missing_fields', 'missing_fields'])
+
+        assert (disabled_reject_log.line_count, disabled_reject_log.reject_count) == (0, 0)
+        assert disabled_reject_log.rejects == []
+
+    def test_add_writes_line_numbers_relative_to_start_of_file(self, tmp_path) -> None:
+        log_path = tmp_path / 'access.log'
+        log_path.write_text('line 1\nline 2\nline 3\nline 4\n')
+        rejects_path = tmp_path / 'rejects.csv'
+        enabled_reject_log = RejectLog()
+        enabled_reject_log.enable(str(rejects_path))
+
+        enabled_reject_log.add(LineSource(str(log_path), str(log_path), 0), 2, [2], ['missing_fields'])
+        enabled_reject_log.add(LineSource(str(log_path), str(log_path), 14), 2, [1], ['malformed_timestamp'])
+        enabled_reject_log.disable()
+
+        rejects = pd.read_csv(rejects_path)
+        assert rejects.values.tolist() == [[str(log_path), 2, 'missing_fields'],
+                                           [str(log_path), 3, 'malformed_timestamp']]
+
+    def test_merge_adds_counts_and_collected_lines_of_other_reject_log(self) -> None:
+        worker_reject_log = RejectLog()
+        worker_reject_log.enable(collect=True)
+        worker_reject_log.add(LineSource('access.log'), 10, np.array([3]), np.array(['too_many_fields']))
+        parent_reject_log = RejectLog()
+        parent_reject_log.enable(collect=True)
+
+        parent_reject_log.merge(worker_reject_log)
+
+        assert (parent_reject_log.line_count, parent_reject_log.reject_count) == (10, 1)
+        source, lines, reasons = parent_reject_log.rejects[0]
+        assert (source.name, lines.tolist(), reasons.tolist()) == ('access.log', [3], ['too_many_fields'])
+
+    def test_add_raises_error_only_after_min_lines_with_more_rejected_lines_than_max_ratio(self) -> None:
+        enabled_reject_log = RejectLog()
+        enabled_reject_log.enable(max_ratio=0.1)
+
+        enabled_reject_log.add(LineSource('access.log'), 10, [1, 2], ['missing_fields', 'missing_fields'])
+        with pytest.raises(ValueError, match='more than the maximum reject ratio of 10.00%'):
+            enabled_reject_log.add(LineSource('access.log'), MIN_LINES_FOR_REJECT_RATIO, list(range(3, 200)),
+                                   ['missing_fields'] * 197)
@@ -0,0 +1,52 @@
+import pytest
+
+from analyzer.parsing import CSVParser
+from analyzer.sampling import LogSample
+from analyzer.statistics import LogStatistics
+
+
+class TestLogSample:
+    parser = CSVParser(timestamp_unit='s', separator=r'\s+', on_bad_lines='warn', columns=['client_ip'])
+
+    @pytest.fixture
+    def log_path(self, tmp_path, monkeypatch) -> str:
+        # Many small blocks, so blocks start and end within lines
+        monkeypatch.setattr('analyzer.sampling.MIN_SAMPLE_BLOCK_SIZE', 1000)
+        path = tmp_path / 'access.log'
+        path.write_text(''.join(f'{1157689312 + second // 10}.{second % 10}00 100 10.105.21.{second % 7} '
+                                f'TCP_MISS/200 {second % 13 * 100} GET http://www.example.com/ - DIRECT/- text/html\n'
+                                for second in range(5000)))
+        return str(path)
+
+    def test_parse_with_whole_sample_returns_exact_statistics(self, log_path) -> None:
+        with open(log_path) as file:
+            expected_statistics = LogStatistics(self.parser.parse_files_to_dataframe([file]))
+
+        log_statistics = LogSample([log_path], fraction=1.0, seed=1).parse(self.parser)
+
+        assert len(log_statistics.log_dataframe) == 5000
+        assert log_statistics.events_per_second() == expected_statistics.events_per_second()
+        assert log_statistics.total_amount_of_bytes_exchanged() == \
+               expected_statistics.total_amount_of_bytes_exchanged()
+        assert log_statistics.error_bounds()['bytes']['standard_error'] == 0
+
+    def test_parse_estimates_statistics_within_confidence_intervals(self, log_path) -> None:
+        log_sample = LogSample([log_path], fraction=0.2, seed=1)
+
+        log_statistics = log_sample.parse(self.parser)
+
+        assert len(log_statistics.log_dataframe) < 2000
+        eps_low, eps_high = log_statistics.error_bounds()['eps']['confidence_interval']
+        bytes_low, bytes_high = log_statistics.error_bounds()['bytes']['confidence_interval']
+        assert eps_low <= log_statistics.events_per_second() <= eps_high
+        assert eps_low <= 5000 / 499 <= eps_high
+        assert bytes_low <= 5000 * 100 + sum(second % 13 * 100 for second in range(5000)) <= bytes_high
+        assert log_statistics.description()['seed'] == 1
+
+    def test_sample_is_deterministic_with_seed(self, log_path) -> None:
+        assert LogSample([log_path], 0.1, seed=7).blocks == LogSample([log_path], 0.1, seed=7).blocks
+        assert LogSample([log_path], 0.1, seed=7).blocks != LogSample([log_path], 0.1, seed=8).blocks
+
+    def test_sample_raises_value_error_for_invalid_fraction(self, log_path) -> None:
+        with pytest.raises(ValueError):
+            LogSample([log_path], fraction=0)
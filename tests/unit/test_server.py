@@ -0,0 +1,197 @@
+import json
+import os
+import socket
+import threading
+import urllib.request
+from io import StringIO
+
+import pandas as pd
+import pytest
+
+from analyzer.analysis import LogAnalyzer
+from analyzer.server import DatasetCache, create_server, dataset_parser, run_query
+from analyzer.timerange import TimeRange
+
+
+def log_lines(first_second: int, count: int) -> str:
+    return ''.join(f'{1157689312 + second}.000 100 10.105.21.{second % 7} TCP_MISS/200 {second * 10} GET '
+                   f'http://www.example{second % 3}.com/ - DIRECT/207.58.145.61 text/html\n'
+                   for second in range(first_second, first_second + count))
+
+
+class TestDatasetCache:
+    @pytest.fixture
+    def log_path(self, tmp_path) -> str:
+        path = tmp_path / 'access.log'
+        path.write_text(log_lines(0, 10))
+        return str(path)
+
+    def test_get_parses_only_appended_lines_on_refresh(self, log_path, monkeypatch) -> None:
+        dataset_cache = DatasetCache(dataset_parser())
+        dataset, = dataset_cache.get([log_path])
+        parsed_ranges = []
+        parse_range = type(dataset)._parse_range
+        monkeypatch.setattr(type(dataset), '_parse_range', lambda self, parser, start, end: (
+            parsed_ranges.append((start, end)) or parse_range(self, parser, start, end)))
+        size = os.path.getsize(log_path)
+        complete_size = size + len(log_lines(10, 5))
+
+        with open(log_path, 'a') as file:
+            file.write(log_lines(10, 5) + '1157689999.000 100 10.105.21.1')
+        dataset_cache.get([log_path])
+
+        assert parsed_ranges == [(size, complete_size), (complete_size, os.path.getsize(log_path))]
+        # The incomplete last line is dropped as malformed, like by the CLI.
+        assert dataset.row_count == 15
+
+    def test_get_parses_rewritten_file_completely(self, log_path) -> None:
+        dataset_cache = DatasetCache(dataset_parser())
+        dataset_cache.get([log_path])
+
+        with open(log_path, 'w') as file:
+            file.write(log_lines(100, 20))
+        dataset, = dataset_cache.get([log_path])
+
+        assert dataset.row_count == 20
+        assert dataset.log_statistics.log_dataframe['timestamp'].min().timestamp() == 1157689312 + 100
+
+    def test_get_evicts_least_recently_queried_datasets_beyond_memory_budget(self, tmp_path) -> None:
+        paths = []
+        for name in ['first.log', 'second.log', 'third.log']:
+            (tmp_path / name).write_text(log_lines(0, 10))
+            paths.append(str(tmp_path / name))
+        dataset_cache = DatasetCache(dataset_parser())
+        dataset, = dataset_cache.get(paths[:1])
+        dataset_cache.memory_budget = 2 * dataset.memory_usage
+
+        dataset_cache.get(paths[1:2])
+        dataset_cache.get(paths[:1])
+        dataset_cache.get(paths[2:])
+
+        assert [dataset['path'] for dataset in dataset_cache.describe()] == [paths[0], paths[2]]
+
+
+    def test_snapshot_keeps_combined_snapshot_until_a_dataset_is_refreshed(self, tmp_path) -> None:
+        paths = [str(tmp_path / 'first.log'), str(tmp_path / 'second.log')]
+        for first_second, path in zip([0, 10], paths):
+            with open(path, 'w') as file:
+                file.write(log_lines(first_second, 10))
+        dataset_cache = DatasetCache(dataset_parser())
+        time_range = TimeRange(since=pd.Timestamp(1157689312 + 5, unit='s'))
+
+        snapshot = dataset_cache.snapshot(dataset_cache.get(paths))
+        filtered_snapshot = dataset_cache.snapshot(dataset_cache.get(paths), time_range)
+        repeated_snapshots = [dataset_cache.snapshot(dataset_cache.get(paths)),
+                              dataset_cache.snapshot(dataset_cache.get(paths), time_range)]
+        with open(paths[1], 'a') as file:
+            file.write(log_lines(20, 5))
+        refreshed_snapshot = dataset_cache.snapshot(dataset_cache.get(paths))
+
+        assert dataset_cache.snapshot(dataset_cache.get(paths[:1])) is dataset_cache.get(paths[:1])[0].log_statistics
+        assert len(snapshot.log_dataframe) == 20
+        assert len(filtered_snapshot.log_dataframe) == 15
+        assert repeated_snapshots[0] is snapshot
+        assert repeated_snapshots[1] is filtered_snapshot
+        assert len(refreshed_snapshot.log_dataframe) == 25
+        assert dataset_cache.snapshot(dataset_cache.get(paths)) is refreshed_snapshot
+
+    def test_get_raises_permission_error_for_files_outside_roots(self, log_path, tmp_path) -> None:
+        root = tmp_path / 'logs'
+        root.mkdir()
+        (root / 'access.log').write_text(log_lines(0, 10))
+        dataset_cache = DatasetCache(dataset_parser(), roots=[str(root)])
+
+        dataset, = dataset_cache.get([str(root / 'access.log')])
+        with pytest.raises(PermissionError):
+            dataset_cache.get([log_path])
+        with pytest.raises(PermissionError):
+            dataset_cache.get([str(root / '..' / 'access.log')])
+
+        assert dataset.row_count == 10
+
+class TestRunQuery:
+    def test_run_query_returns_results_of_cli(self, tmp_path) -> None:
+        paths = [tmp_path / 'first.log', tmp_path / 'second.log']
+        paths[0].write_text(log_lines(0, 30))
+        paths[1].write_text(log_lines(30, 20))
+        output = StringIO()
+        output.name = 'TestName'
+        LogAnalyzer(input_files=[open(path) for path in paths], output=output, mfip=True, lfip=True, eps=True,
+                    bytes=True, eps_series='10s', group_by=['host'], top=2, percentiles=True,
+                    percentiles_by='response_code', since=pd.Timestamp(1157689312 + 5, unit='s')).analyze_log_files()
+
+        results = run_query(DatasetCache(dataset_parser()), {
+            'files': [str(path) for path in paths], 'mfip': True, 'lfip': True, 'eps': True, 'bytes': True,
+            'eps_series': '10s', 'group_by': ['host'], 'top': 2, 'percentiles': True, 'percentiles_by': 'response_code',
+            'since': 1157689312 + 5})
+
+        assert json.dumps(results) == output.getvalue()
+
+    @pytest.mark.parametrize('query', [{'files': []}, {'files': ['access.log'], 'unknown': True},
+                                       {'files': ['access.log'], 'eps_series': 'often'},
+                                       {'files': ['access.log'], 'group_by': ['unknown']},
+                                       {'files': ['access.log'], 'group_by': 'host'},
+                                       {'files': ['access.log'], 'group_by': ['response_code'], 'top': 'x'},
+                                       {'files': ['access.log'], 'group_by': ['response_code'], 'top': -1},
+                                       {'files': ['access.log'], 'group_by': ['response_code'], 'top': True},
+                                       {'files': ['access.log'], 'percentiles': True, 'percentiles_by': 'client_ip'}])
+    def test_run_query_raises_value_error_for_invalid_query(self, query) -> None:
+        with pytest.raises(ValueError):
+            run_query(DatasetCache(dataset_parser()), query)
+
+
+class TestServer:
+    @pytest.fixture
+    def log_path(self, tmp_path) -> str:
+        path = tmp_path / 'access.log'
+        path.write_text(log_lines(0, 10))
+        return str(path)
+
+    @staticmethod
+    def serve(server) -> None:
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+    def test_server_answers_queries_over_http(self, log_path) -> None:
+        server = create_server(DatasetCache(dataset_parser()), port=0)
+        self.serve(server)
+        url = f'http://127.0.0.1:{server.server_address[1]}'
+        try:
+            request = urllib.request.Request(f'{url}/query', data=json.dumps({'files': [log_path], 'mfip': True,
+                                                                              'distinct_ips': True}).encode())
+            with urllib.request.urlopen(request) as response:
+                results = json.load(response)
+            with urllib.request.urlopen(f'{url}/datasets') as response:
+                datasets = json.load(response)
+            with pytest.raises(urllib.error.HTTPError) as error:
+                urllib.request.urlopen(urllib.request.Request(f'{url}/query', data=b'{"files": ["missing.log"]}'))
+            with pytest.raises(urllib.error.HTTPError) as invalid_query_error:
+                urllib.request.urlopen(urllib.request.Request(f'{url}/query', data=json.dumps({
+                    'files': [log_path], 'group_by': ['response_code'], 'top': 'x'}).encode()))
+            invalid_query_response = json.load(invalid_query_error.value)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        assert results == {'mfip': '10.105.21.0', 'distinct_ips': 7}
+        assert [dataset['rows'] for dataset in datasets] == [10]
+        assert error.value.code == 404
+        assert invalid_query_error.value.code == 400
+        assert invalid_query_response == {'error': 'top must be a positive integer'}
+
+    def test_server_answers_queries_over_unix_socket(self, log_path, tmp_path) -> None:
+        socket_path = str(tmp_path / 'analyzer.sock')
+        server = create_server(DatasetCache(dataset_parser()), socket_path=socket_path)
+        self.serve(server)
+        body = json.dumps({'files': [log_path], 'bytes': True}).encode()
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.connect(socket_path)
+                client.sendall(b'POST /query HTTP/1.0\r\nContent-Length: %d\r\n\r\n' % len(body) + body)
+                response = b''.join(iter(lambda: client.recv(4096), b''))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        assert response.startswith(b'HTTP/1.0 200')
+        assert json.loads(response.split(b'\r\n\r\n', 1)[1]) == {'bytes': 1450}
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analyzer.sketches import HyperLogLog, QuantileSketch, SpaceSaving
+
+
+class TestSpaceSaving:
+    values = pd.Series(['a'] * 50 + ['b'] * 30 + ['c'] * 10 + [f'rare{index}' for index in range(40)])
+
+    def test_update_keeps_bounded_counters_with_error_bounds(self) -> None:
+        exact_counts = self.values.value_counts()
+        summary = SpaceSaving(capacity=5)
+
+        for start in range(0, len(self.values), 16):
+            summary.update(self.values[start:start + 16].value_counts(sort=False))
+
+        assert len(summary.counts) == 5
+        assert summary.top()[0] == 'a'
+        assert summary.floor <= summary.total / summary.capacity
+        for value, count in summary.counts.items():
+            assert count - summary.errors[value] <= exact_counts[value] <= count
+
+    def test_merge_combines_summaries_of_different_parts(self) -> None:
+        summary1 = SpaceSaving(capacity=5)
+        summary1.update(self.values[:60].value_counts(sort=False))
+        summary2 = SpaceSaving(capacity=5)
+        summary2.update(self.values[60:].value_counts(sort=False))
+
+        summary1.merge(summary2)
+
+        value, count, count_error = summary1.top()
+        assert value == 'a'
+        assert count - count_error <= 50 <= count
+        assert summary1.is_top_guaranteed()
+        assert summary1.total == len(self.values)
+
+    def test_from_bytes_restores_serialized_summary(self) -> None:
+        summary = SpaceSaving(capacity=5)
+        summary.update(self.values.value_counts(sort=False))
+
+        restored_summary = SpaceSaving.from_bytes(summary.to_bytes())
+
+        pd.testing.assert_series_equal(restored_summary.counts, summary.counts)
+        pd.testing.assert_series_equal(restored_summary.errors, summary.errors)
+        assert (restored_summary.floor, restored_summary.total) == (summary.floor, summary.total)
+
+
+class TestHyperLogLog:
+    values = [f'10.{index // 65536}.{index // 256 % 256}.{index % 256}' for index in range(100_000)]
+
+    def test_estimate_is_within_error_of_distinct_count(self) -> None:
+        sketch = HyperLogLog.for_error(0.01)
+
+        sketch.update(self.values)
+        sketch.update(self.values[:1000])
+
+        assert sketch.estimate() == pytest.approx(len(self.values), rel=3 * sketch.relative_standard_error)
+
+    def test_merge_counts_values_of_both_sketches_once(self) -> None:
+        sketch1 = HyperLogLog(precision=12)
+        sketch1.update(self.values[:60_000])
+        sketch2 = HyperLogLog(precision=12)
+        sketch2.update(self.values[40_000:])
+
+        sketch1.merge(sketch2)
+
+        assert sketch1.estimate() == pytest.approx(len(self.values), rel=3 * sketch1.relative_standard_error)
+
+    def test_merge_raises_value_error_for_different_precision(self) -> None:
+        with pytest.raises(ValueError):
+            HyperLogLog(precision=12).merge(HyperLogLog(precision=14))
+
+    def test_from_bytes_restores_serialized_sketch(self) -> None:
+        sketch = HyperLogLog(precision=12)
+        sketch.update(self.values)
+
+        restored_sketch = HyperLogLog.from_bytes(sketch.to_bytes())
+
+        assert restored_sketch.estimate() == sketch.estimate()
+        assert len(sketch.to_bytes()) < len(sketch.registers)
+
+
+class TestQuantileSketch:
+    values = np.concatenate([np.zeros(1000, dtype='int64'),
+                             np.random.default_rng(0).lognormal(8, 3, 99_000).astype('int64'), [-1, -1]])
+    ranks = [0, 1000, 50_000, 90_000, 99_000, 99_899, 99_999]
+
+    def test_values_at_ranks_are_within_relative_error_of_exact_values(self) -> None:
+        sketch = QuantileSketch(relative_error=0.01)
+
+        sketch.update(self.values)
+
+        exact_values = np.sort(self.values[self.values >= 0])[self.ranks]
+        assert sketch.count == 100_000
+        for value, exact_value in zip(sketch.values_at_ranks(self.ranks), exact_values):
+            assert isinstance(value, int)
+            assert abs(value - exact_value) <= 0.01 * exact_value + 0.5
+
+    def test_merge_is_identical_to_sketch_of_all_values(self) -> None:
+        sketch = QuantileSketch(relative_error=0.01)
+        sketch.update(self.values)
+        merged_sketch = QuantileSketch(relative_error=0.01)
+        for part in np.array_split(self.values[::-1], 7):
+            part_sketch = QuantileSketch(relative_error=0.01)
+            part_sketch.update(part)
+            merged_sketch.merge(part_sketch)
+
+        assert merged_sketch.values_at_ranks(self.ranks) == sketch.values_at_ranks(self.ranks)
+        assert (merged_sketch.min, merged_sketch.max) == (sketch.min, sketch.max) == (0, self.values.max())
+
+    def test_merge_raises_value_error_for_different_relative_error(self) -> None:
+        with pytest.raises(ValueError):
+            QuantileSketch(relative_error=0.01).merge(QuantileSketch(relative_error=0.02))
+
+    def test_values_at_ranks_raises_value_error_without_values(self) -> None:
+        sketch = QuantileSketch(relative_error=0.01)
+        sketch.update(np.array([-1.0, np.nan, np.inf]))
+
+        with pytest.raises(ValueError):
+            sketch.values_at_ranks([0])
+
+    def test_from_bytes_restores_serialized_sketch(self) -> None:
+        sketch = QuantileSketch(relative_error=0.01)
+        sketch.update(self.values / 10)
+
+        restored_sketch = QuantileSketch.from_bytes(sketch.to_bytes())
+
+        assert restored_sketch.values_at_ranks(self.ranks) == sketch.values_at_ranks(self.ranks)
+        assert not restored_sketch.is_integer
@@ -0,0 +1,60 @@
+import os
+import pickle
+
+import pandas as pd
+import pytest
+
+from analyzer.spill import SpilledCounts
+
+
+class TestSpilledCounts:
+
+    @pytest.fixture(autouse=True)
+    def setup_test(self, tmp_path) -> None:
+        self.spilled_counts = SpilledCounts(partitions=4, directory=str(tmp_path))
+
+    def test_summary_merges_counts_of_all_spills_exactly(self) -> None:
+        self.spilled_counts.add(pd.Series([1, 3], index=['10.0.0.1', '10.0.0.2']))
+        self.spilled_counts.add(pd.Series([3, 1, 2], index=['10.0.0.3', '10.0.0.4', '10.0.0.1']))
+
+        summary = self.spilled_counts.summary()
+
+        assert summary.distinct_count == 4
+        # 10.0.0.1, 10.0.0.2 and 10.0.0.3 appear 3 times, and 10.0.0.1 appeared first.
+        assert summary.most_frequent == '10.0.0.1'
+        assert summary.least_frequent == '10.0.0.4'
+
+    def test_summary_resolves_ties_by_first_appearance_like_stable_sort(self) -> None:
+        counts = pd.Series([2, 1, 2, 1], index=['10.0.0.1', '10.0.0.2', '10.0.0.3', '10.0.0.4'])
+        self.spilled_counts.add(counts)
+
+        summary = self.spilled_counts.summary()
+
+        sorted_counts = counts.sort_values(ascending=False, kind='stable')
+        assert (summary.most_frequent, summary.least_frequent) == (sorted_counts.index[0], sorted_counts.index[-1])
+
+    def test_pickled_counts_hand_over_their_files(self) -> None:
+        self.spilled_counts.add(pd.Series([1], index=['10.0.0.1']))
+
+        unpickled_counts = pickle.loads(pickle.dumps(self.spilled_counts))
+        del self.spilled_counts
+
+        assert unpickled_counts.summary().most_frequent == '10.0.0.1'
+        unpickled_counts.close()
+        assert not os.path.exists(unpickled_counts.path)
+
+    def test_merge_adds_counts_of_other_and_removes_its_files(self, tmp_path) -> None:
+        other_counts = SpilledCounts(partitions=4, directory=str(tmp_path))
+        self.spilled_counts.add(pd.Series([1], index=['10.0.0.1']))
+        other_counts.add(pd.Series([1, 2], index=['10.0.0.2', '10.0.0.1']))
+
+        self.spilled_counts.merge(other_counts)
+
+        assert not os.path.exists(other_counts.path)
+        assert self.spilled_counts.summary() == (2, '10.0.0.1', '10.0.0.2')
+        self.spilled_counts.close()
+        assert os.listdir(tmp_path) == []
+
+    def test_summary_raises_value_error_without_counts(self) -> None:
+        with pytest.raises(ValueError):
+            self.spilled_counts.summary()
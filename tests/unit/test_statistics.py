@@ -1,9 +1,12 @@
 import math
 
+import numpy as np
 import pandas as pd
 import pytest
 
-from analyzer.statistics import LogStatistics
+from analyzer.engine import StatisticsPlan
+from analyzer.statistics import (ApproximateLogStatisticsAccumulator, LogStatistics, LogStatisticsAccumulator,
+                                 count_ips)
 
 
 class TestStatistics:
@@ -52,6 +55,28 @@ class TestStatistics:
 
         assert math.isclose(actual_events_per_second, expected_events_per_second, rel_tol=1e-09, abs_tol=1e-09)
 
+    def test_events_per_second_includes_whole_days_of_time_span(self) -> None:
+        self.test_dataframe['timestamp'] += pd.Series(pd.to_timedelta([0, 0, 2], unit='D'))
+        log_statistics = LogStatistics(self.test_dataframe)
+        expected_events_per_second = 3 / (2 * 86400 + 1)
+
+        actual_events_per_second = log_statistics.events_per_second()
+
+        assert math.isclose(actual_events_per_second, expected_events_per_second, rel_tol=1e-09, abs_tol=1e-09)
+
+    def test_eps_series_returns_events_and_bytes_per_bucket_including_empty_buckets(self) -> None:
+        self.test_dataframe['timestamp'] += pd.Series(pd.to_timedelta([0, 0, 2], unit='s'))
+        log_statistics = LogStatistics(self.test_dataframe)
+
+        eps_series = log_statistics.eps_series('1s')
+
+        assert eps_series['start'] == '2006-09-08T04:21:52'
+        assert eps_series['events'] == [2, 0, 0, 1]
+        assert eps_series['bytes'] == [700, 0, 0, 200]
+        assert eps_series['peak_eps'] == 2.0
+        assert eps_series['peak_start'] == '2006-09-08T04:21:52'
+        assert eps_series['p50_eps'] == 0.5
+
     def test_total_amount_of_bytes_exchanged_returns_total_amount_of_bytes_exchanged(self) -> None:
         log_statistics = LogStatistics(self.test_dataframe)
         expected_amount_of_bytes = 900
@@ -71,8 +96,273 @@ class TestStatistics:
 
         assert actual_amount_of_bytes == expected_amount_of_bytes
 
+    def test_percentiles_returns_lower_percentiles_of_values_that_are_not_negative(self) -> None:
+        self.test_dataframe.loc[2, 'response_header_size'] = -1
+        log_statistics = LogStatistics(self.test_dataframe)
+
+        assert log_statistics.percentiles('request_method') == {
+            'response_header_size': {'p50': 100, 'p90': 100, 'p99': 100, 'p99.9': 100, 'max': 100},
+            'response_size': {'p50': 200, 'p90': 200, 'p99': 200, 'p99.9': 200, 'max': 300},
+            'by_request_method': {'CONNECT': {
+                'response_header_size': {'p50': 100, 'p90': 100, 'p99': 100, 'p99.9': 100, 'max': 100},
+                'response_size': {'p50': 200, 'p90': 200, 'p99': 200, 'p99.9': 200, 'max': 300}}},
+        }
+
     def test_class_cannot_be_instantiated_with_empty_dataframe(self) -> None:
         empty_dataframe = pd.DataFrame()
 
         with pytest.raises(ValueError):
             LogStatistics(empty_dataframe)
+
+
+class TestLogStatisticsAccumulator:
+    test_dataframe: pd.DataFrame
+
+    @pytest.fixture(autouse=True)
+    def setup_test(self) -> None:
+        self.test_dataframe = pd.DataFrame({
+            'timestamp': pd.to_datetime(pd.Series([1157689312.0, 1157689312.15, 1157689313.0, 1157689314.0]), unit='s'),
+            'response_header_size': pd.Series([100, 100, 100, -1], dtype='Int64'),
+            'client_ip': pd.Series(['10.105.21.197', '10.105.21.199', '10.105.21.199', '10.105.21.198'],
+                                   dtype=pd.StringDtype()),
+            'response_size': pd.Series([200, -1, 100, 100], dtype='Int64'),
+        })
+
+    def test_update_in_chunks_matches_log_statistics(self) -> None:
+        log_statistics = LogStatistics(self.test_dataframe)
+        accumulator = LogStatisticsAccumulator()
+
+        accumulator.update(self.test_dataframe.iloc[:1])
+        accumulator.update(self.test_dataframe.iloc[1:3])
+        accumulator.update(self.test_dataframe.iloc[3:])
+
+        assert accumulator.row_count == 4
+        assert accumulator.most_frequent_ip() == log_statistics.most_frequent_ip()
+        assert accumulator.least_frequent_ip() == log_statistics.least_frequent_ip()
+        assert accumulator.events_per_second() == log_statistics.events_per_second()
+        assert accumulator.total_amount_of_bytes_exchanged() == log_statistics.total_amount_of_bytes_exchanged()
+
+    def test_ip_counts_of_many_chunks_are_combined_in_order_of_first_appearance(self) -> None:
+        client_ips = pd.Series([f'10.0.0.{index % 7}' for index in range(50)] + ['10.0.0.9', '10.0.0.8'])
+        log_dataframe = pd.DataFrame({'timestamp': pd.to_datetime(range(len(client_ips)), unit='s'),
+                                      'client_ip': client_ips, 'response_header_size': 1, 'response_size': 1})
+        accumulator = LogStatisticsAccumulator()
+
+        for start in range(0, len(log_dataframe), 3):
+            accumulator.update(log_dataframe.iloc[start:start + 3])
+
+        assert accumulator.most_frequent_ip() == '10.0.0.0'
+        pd.testing.assert_series_equal(accumulator._combined_ip_counts(),
+                                       client_ips.value_counts(sort=False).astype('Int64'), check_names=False)
+
+    def test_spilled_ip_counts_of_merged_accumulators_match_log_statistics(self) -> None:
+        log_statistics = LogStatistics(self.test_dataframe)
+        accumulator1 = LogStatisticsAccumulator(max_memory=0)
+        accumulator1.update(self.test_dataframe.iloc[:2])
+        accumulator2 = LogStatisticsAccumulator(max_memory=0)
+        accumulator2.update(self.test_dataframe.iloc[2:3])
+        accumulator2.update(self.test_dataframe.iloc[3:])
+
+        accumulator1.merge(accumulator2)
+
+        assert accumulator1.spilled_ip_counts.spill_count == 3
+        assert accumulator1.most_frequent_ip() == log_statistics.most_frequent_ip()
+        assert accumulator1.least_frequent_ip() == log_statistics.least_frequent_ip()
+        assert accumulator1.distinct_ip_count() == log_statistics.distinct_ip_count()
+        accumulator1.close()
+
+    def test_eps_series_of_merged_accumulators_matches_log_statistics(self) -> None:
+        log_statistics = LogStatistics(self.test_dataframe)
+        accumulator1 = LogStatisticsAccumulator(eps_bucket='1s')
+        accumulator1.update(self.test_dataframe.iloc[:2])
+        accumulator2 = LogStatisticsAccumulator(eps_bucket='1s')
+        accumulator2.update(self.test_dataframe.iloc[2:])
+
+        accumulator1.merge(accumulator2)
+
+        assert accumulator1.eps_series('1s') == log_statistics.eps_series('1s')
+        with pytest.raises(ValueError):
+            accumulator1.eps_series('1min')
+
+    def test_merge_combines_accumulators(self) -> None:
+        accumulator1 = LogStatisticsAccumulator()
+        accumulator1.update(self.test_dataframe.iloc[:2])
+        accumulator2 = LogStatisticsAccumulator()
+        accumulator2.update(self.test_dataframe.iloc[2:])
+
+        accumulator1.merge(accumulator2)
+
+        assert accumulator1.row_count == 4
+        assert accumulator1.most_frequent_ip() == '10.105.21.199'
+        assert accumulator1.total_amount_of_bytes_exchanged() == 700
+
+    def test_statistics_raise_value_error_without_log_entries(self) -> None:
+        accumulator = LogStatisticsAccumulator()
+
+        with pytest.raises(ValueError):
+            accumulator.most_frequent_ip()
+
+    def test_group_breakdown_of_merged_accumulators_matches_log_statistics(self) -> None:
+        log_statistics = LogStatistics(self.test_dataframe)
+        plan = StatisticsPlan(['group_by'], group_by=['client_ip'])
+        accumulator1 = LogStatisticsAccumulator(primitives=plan.primitives)
+        accumulator1.update(self.test_dataframe.iloc[:2])
+        accumulator2 = LogStatisticsAccumulator(primitives=plan.primitives)
+        accumulator2.update(self.test_dataframe.iloc[2:])
+
+        accumulator1.merge(accumulator2)
+
+        assert accumulator1.group_breakdown('client_ip') == log_statistics.group_breakdown('client_ip') == [
+            {'key': '10.105.21.199', 'requests': 2, 'bytes': 300},
+            {'key': '10.105.21.197', 'requests': 1, 'bytes': 300},
+            {'key': '10.105.21.198', 'requests': 1, 'bytes': 100},
+        ]
+
+    def test_percentiles_of_merged_accumulators_are_within_error_of_log_statistics(self) -> None:
+        rng = np.random.default_rng(0)
+        log_dataframe = pd.DataFrame({
+            'response_header_size': rng.lognormal(6, 2, 10_000).astype('int64'),
+            'response_code': pd.Series(rng.choice(['TCP_MISS/200', 'TCP_HIT/304'], 10_000), dtype='category'),
+            'response_size': np.where(rng.random(10_000) < 0.1, -1, rng.lognormal(8, 3, 10_000).astype('int64')),
+        })
+        plan = StatisticsPlan(['percentiles'], percentiles_by='response_code')
+        accumulator = LogStatisticsAccumulator(primitives=plan.primitives, percentile_error=0.01)
+        for chunk_start in range(0, len(log_dataframe), 3000):
+            chunk_accumulator = LogStatisticsAccumulator(primitives=plan.primitives, percentile_error=0.01)
+            chunk_accumulator.update(log_dataframe.iloc[chunk_start:chunk_start + 3000])
+            accumulator.merge(chunk_accumulator)
+
+        exact_percentiles = LogStatistics(log_dataframe).percentiles('response_code')
+        estimated_percentiles = accumulator.percentiles('response_code')
+
+        sizes = log_dataframe['response_size'][log_dataframe['response_size'] >= 0]
+        assert list(exact_percentiles['response_size'].values()) == [
+            *np.percentile(sizes, [50, 90, 99, 99.9], method='lower'), sizes.max()]
+        assert list(estimated_percentiles['by_response_code']) == ['TCP_HIT/304', 'TCP_MISS/200']
+        exact_summaries = [exact_percentiles, *exact_percentiles.pop('by_response_code').values()]
+        estimated_summaries = [estimated_percentiles, *estimated_percentiles.pop('by_response_code').values()]
+        for exact_summary, estimated_summary in zip(exact_summaries, estimated_summaries):
+            for column in ['response_header_size', 'response_size']:
+                for name, exact_value in exact_summary[column].items():
+                    assert abs(estimated_summary[column][name] - exact_value) <= 0.01 * exact_value + 0.5
+        assert accumulator.error_bounds() == {'percentiles': {'relative_error': 0.01}}
+
+    def test_accumulator_only_answers_statistics_of_its_primitives(self) -> None:
+        plan = StatisticsPlan(['mfip', 'bytes'])
+        accumulator = LogStatisticsAccumulator(primitives=plan.primitives)
+
+        accumulator.update(self.test_dataframe)
+
+        assert plan.compute('mfip', accumulator) == '10.105.21.199'
+        assert plan.compute('bytes', accumulator) == 700
+        assert accumulator.min_timestamp is None
+        with pytest.raises(ValueError):
+            accumulator.events_per_second()
+
+
+class TestApproximateLogStatisticsAccumulator:
+    test_dataframe: pd.DataFrame
+
+    @pytest.fixture(autouse=True)
+    def setup_test(self) -> None:
+        self.test_dataframe = pd.DataFrame({
+            'timestamp': pd.to_datetime(pd.Series([1157689312.0, 1157689312.15, 1157689313.0, 1157689314.0]), unit='s'),
+            'response_header_size': pd.Series([100, 100, 100, -1], dtype='Int64'),
+            'client_ip': pd.Series(['10.105.21.197', '10.105.21.199', '10.105.21.199', '10.105.21.198'],
+                                   dtype=pd.StringDtype()),
+            'response_size': pd.Series([200, -1, 100, 100], dtype='Int64'),
+        })
+
+    def test_merged_accumulators_match_log_statistics(self) -> None:
+        log_statistics = LogStatistics(self.test_dataframe)
+        accumulator1 = ApproximateLogStatisticsAccumulator(exact_ip_counts=True)
+        accumulator1.update(self.test_dataframe.iloc[:2])
+        accumulator2 = ApproximateLogStatisticsAccumulator(exact_ip_counts=True)
+        accumulator2.update(self.test_dataframe.iloc[2:])
+
+        accumulator1.merge(accumulator2)
+
+        assert accumulator1.most_frequent_ip() == log_statistics.most_frequent_ip()
+        assert accumulator1.least_frequent_ip() == log_statistics.least_frequent_ip()
+        assert accumulator1.distinct_ip_count() == log_statistics.distinct_ip_count() == 3
+        assert accumulator1.error_bounds()['mfip'] == {'count': 2, 'max_count_error': 0, 'guaranteed': True}
+
+    def test_error_bounds_are_empty_without_ip_counts(self) -> None:
+        accumulator = ApproximateLogStatisticsAccumulator(primitives=StatisticsPlan(['bytes']).primitives)
+        accumulator.update(self.test_dataframe)
+
+        assert accumulator.error_bounds() == {}
+
+    def test_least_frequent_ip_raises_value_error_without_exact_ip_counts(self) -> None:
+        accumulator = ApproximateLogStatisticsAccumulator()
+        accumulator.update(self.test_dataframe)
+
+        with pytest.raises(ValueError):
+            accumulator.least_frequent_ip()
+
+
+class TestStatisticsPlan:
+
+    def test_statistics_share_primitives_and_columns(self) -> None:
+        plan = StatisticsPlan(['mfip', 'lfip', 'distinct_ips', 'eps', 'eps_series'], eps_bucket='1min')
+
+        assert plan.primitives == ['ip_counts', 'row_count', 'timestamp_range', 'bucket_counts']
+        assert plan.columns == ['client_ip', 'timestamp', 'response_header_size', 'response_size']
+
+    def test_group_by_plans_primitive_and_column_per_dimension(self) -> None:
+        plan = StatisticsPlan(['bytes', 'group_by'], group_by=['host', 'client_ip', 'host'])
+
+        assert plan.primitives == ['size_sums', 'group_totals:host', 'group_totals:client_ip']
+        assert plan.columns == ['response_header_size', 'response_size', 'url', 'client_ip']
+
+    def test_plan_raises_value_error_for_unknown_statistic_or_missing_bucket(self) -> None:
+        with pytest.raises(ValueError):
+            StatisticsPlan(['median'])
+        with pytest.raises(ValueError):
+            StatisticsPlan(['eps_series'])
+        with pytest.raises(ValueError):
+            StatisticsPlan(['group_by'], group_by=['referrer'])
+        with pytest.raises(ValueError):
+            StatisticsPlan(['percentiles'], percentiles_by='client_ip')
+
+    def test_percentiles_by_plans_primitive_and_column_of_dimension(self) -> None:
+        plan = StatisticsPlan(['percentiles'], percentiles_by='response_code')
+
+        assert plan.primitives == ['size_quantiles', 'size_quantiles:response_code']
+        assert plan.columns == ['response_header_size', 'response_size', 'response_code']
+
+    def test_log_statistics_compute_shared_primitive_once(self, monkeypatch) -> None:
+        log_dataframe = pd.DataFrame({'client_ip': pd.Series(['10.105.21.199', '10.105.21.198', '10.105.21.199'],
+                                                             dtype=pd.StringDtype())})
+        plan = StatisticsPlan(['mfip', 'lfip', 'distinct_ips'])
+        log_statistics = LogStatistics(log_dataframe)
+        calls = []
+        monkeypatch.setattr('analyzer.statistics.count_ips', lambda client_ips: calls.append(1) or count_ips(client_ips))
+
+        log_statistics.aggregate(plan.primitives)
+        results = [plan.compute(statistic, log_statistics) for statistic in plan.statistics]
+
+        assert results == ['10.105.21.199', '10.105.21.198', 2]
+        assert len(calls) == 1
+
+
+def test_group_breakdown_by_host_orders_top_hosts_by_bytes() -> None:
+    log_dataframe = pd.DataFrame({
+        'url': pd.Series(['http://www.example.com/a', 'login.yahoo.com:443', 'https://user@www.example.com/b', '-'],
+                         dtype='category'),
+        'response_header_size': [100, 100, 100, 100],
+        'response_size': [100, 1000, -1, 50],
+    })
+
+    group_breakdown = LogStatistics(log_dataframe).group_breakdown('host', top=2, top_by='bytes')
+
+    assert group_breakdown == [{'key': 'login.yahoo.com', 'requests': 1, 'bytes': 1100},
+                               {'key': 'www.example.com', 'requests': 2, 'bytes': 300}]
+
+
+def test_count_ips_of_categorical_matches_value_counts() -> None:
+    client_ips = pd.Series(['10.105.21.199', '10.105.21.197', '10.105.21.199', '10.105.21.198'], dtype=pd.StringDtype())
+
+    ip_counts = count_ips(client_ips.astype('category'))
+
+    pd.testing.assert_series_equal(ip_counts, client_ips.value_counts(sort=False), check_index_type=False)
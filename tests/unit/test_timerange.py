@@ -0,0 +1,72 @@
+import os
+
+import pandas as pd
+import pytest
+
+from analyzer.parsing import CSVParser
+from analyzer.timerange import TimeIndex, TimeRange
+
+
+class TestTimeRange:
+    parser = CSVParser(timestamp_unit='s', separator=r'\s+', on_bad_lines='warn')
+
+    @pytest.fixture
+    def log_path(self, tmp_path) -> str:
+        lines = [f'{1157689312 + second}.000 100 10.105.21.{second % 7} TCP_MISS/200 200 GET http://www.example.com/ '
+                 f'- DIRECT/207.58.145.61 text/html\n' for second in range(200)]
+        lines.insert(50, 'malformed line\n')
+        path = tmp_path / 'access.log'
+        path.write_text(''.join(lines))
+        return str(path)
+
+    def test_filter_keeps_log_entries_from_since_until_before_until(self) -> None:
+        dataframe = pd.DataFrame({'timestamp': pd.to_datetime(pd.Series([1.0, 2.0, 3.0]), unit='s')})
+        time_range = TimeRange(since=pd.Timestamp(2, unit='s'), until=pd.Timestamp(3, unit='s'))
+
+        assert time_range.filter(dataframe)['timestamp'].tolist() == [pd.Timestamp(2, unit='s')]
+
+    @pytest.mark.parametrize('use_index', [False, True])
+    def test_find_byte_range_returns_lines_of_time_range(self, log_path, use_index, monkeypatch) -> None:
+        # Search the file instead of scanning it
+        monkeypatch.setattr('analyzer.timerange.SEARCH_SCAN_SIZE', 100)
+        monkeypatch.setattr('analyzer.timerange.INDEX_INTERVAL', 1000)
+        time_range = TimeRange(since=pd.Timestamp(1157689312 + 100, unit='s'),
+                               until=pd.Timestamp(1157689312 + 150, unit='s'))
+
+        start, end = time_range.find_byte_range(log_path, self.parser.line_timestamp, use_index)
+
+        with open(log_path, 'rb') as file:
+            file.seek(start)
+            lines = file.read(end - start).decode().splitlines()
+        # The range includes a margin of one second before since and up to one second after until
+        assert lines[0].startswith(f'{1157689312 + 99}.000')
+        assert lines[-1].startswith(f'{1157689312 + 150}.000')
+        assert os.path.exists(TimeIndex.index_path(log_path)) == use_index
+
+    def test_find_byte_range_returns_whole_file_after_since(self, tmp_path) -> None:
+        path = tmp_path / 'access.log'
+        path.write_text(''.join(f'{1157689312 + second}.000 100 10.105.21.1 TCP_MISS/200 200 GET '
+                                f'http://www.example.com/ - DIRECT/207.58.145.61 text/html\n' for second in range(3)))
+        time_range = TimeRange(since=pd.Timestamp(1157689312 - 100, unit='s'))
+
+        assert time_range.find_byte_range(str(path), self.parser.line_timestamp) == (0, os.path.getsize(path))
+
+    def test_find_byte_range_returns_none_for_unordered_file(self, log_path) -> None:
+        with open(log_path) as file:
+            lines = file.readlines()
+        with open(log_path, 'w') as file:
+            file.writelines(lines[100:] + lines[:100])
+        time_range = TimeRange(since=pd.Timestamp(1157689312 + 100, unit='s'))
+
+        assert time_range.find_byte_range(log_path, self.parser.line_timestamp) is None
+
+    def test_time_index_is_rebuilt_when_file_changes(self, log_path) -> None:
+        index = TimeIndex.for_file(log_path, self.parser.line_timestamp)
+        assert TimeIndex.load(log_path, index.identity).samples == index.samples
+
+        with open(log_path, 'a') as file:
+            file.write('1157689999.000 100 10.105.21.1 TCP_MISS/200 200 GET http://www.example.com/ - DIRECT/- -\n')
+        rebuilt_index = TimeIndex.for_file(log_path, self.parser.line_timestamp)
+
+        assert rebuilt_index.identity != index.identity
+        assert TimeIndex.load(log_path, index.identity) is None